@@ -12,6 +12,13 @@ SUPABASE_USER = os.getenv("SUPABASE_USER")
 SUPABASE_PASSWORD = os.getenv("SUPABASE_PASSWORD")
 SUPABASE_PORT = os.getenv("SUPABASE_PORT", "6543")
 DATABASE_URL = f"postgresql://{SUPABASE_USER}:{SUPABASE_PASSWORD}@{SUPABASE_URL}:{SUPABASE_PORT}/postgres"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{SUPABASE_USER}:{SUPABASE_PASSWORD}@{SUPABASE_URL}:{SUPABASE_PORT}/postgres"
+
+# Async pool untuk query konsultasi (read-only, dengan statement timeout)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # detik menunggu koneksi bebas
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
 
 # API Keys
 GEMINI_API_KEYS = [
@@ -26,10 +33,110 @@ GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 GEMINI_TEMPERATURE = float(os.getenv("GEMINI_TEMPERATURE", "0"))
 GEMINI_MAX_TOKENS = int(os.getenv("GEMINI_MAX_TOKENS", "2048"))
 
+# Gemini HTTP Client Configuration
+GEMINI_HTTP_TIMEOUT = float(os.getenv("GEMINI_HTTP_TIMEOUT", "60"))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "100"))
+GEMINI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GEMINI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+GEMINI_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "30"))
+
+# Gemini API Key Scheduler (kuota per key)
+GEMINI_KEY_RPM = float(os.getenv("GEMINI_KEY_RPM", "15"))
+GEMINI_KEY_BURST = float(os.getenv("GEMINI_KEY_BURST", "5"))
+GEMINI_KEY_COOLDOWN_SECONDS = float(os.getenv("GEMINI_KEY_COOLDOWN_SECONDS", "30"))
+GEMINI_KEY_FAILURE_THRESHOLD = int(os.getenv("GEMINI_KEY_FAILURE_THRESHOLD", "5"))
+GEMINI_KEY_DISABLE_SECONDS = float(os.getenv("GEMINI_KEY_DISABLE_SECONDS", "300"))
+GEMINI_KEY_ACQUIRE_TIMEOUT = float(os.getenv("GEMINI_KEY_ACQUIRE_TIMEOUT", "30"))
+
+# Structured extraction (responseSchema): batas output per panggilan.
+# Model dengan "thinking" (2.5) menghitung token berpikir di sini juga: naikkan.
+EXTRACT_MAX_OUTPUT_TOKENS = int(os.getenv("EXTRACT_MAX_OUTPUT_TOKENS", "128"))  # teks / suara, satu transaksi
+RECEIPT_MAX_OUTPUT_TOKENS = int(os.getenv("RECEIPT_MAX_OUTPUT_TOKENS", "2048"))  # struk, ~60 token per item
+
+# Receipt (image) Pipeline
+# true = klasifikasi + ekstraksi dalam satu panggilan vision, false = dua langkah
+RECEIPT_FUSED_CALL = os.getenv("RECEIPT_FUSED_CALL", "true").lower() == "true"
+
+# Receipt Image Preprocessing
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "auto")  # "auto", "always" atau "never"
+IMAGE_GRAYSCALE_MAX_SATURATION = int(os.getenv("IMAGE_GRAYSCALE_MAX_SATURATION", "25"))  # 0-255
+
+# Receipt Vision Result Cache
+VISION_CACHE_ENABLED = os.getenv("VISION_CACHE_ENABLED", "true").lower() == "true"
+VISION_CACHE_MAX_ITEMS = int(os.getenv("VISION_CACHE_MAX_ITEMS", "500"))
+VISION_CACHE_TTL = int(os.getenv("VISION_CACHE_TTL", str(60 * 60 * 24 * 7)))  # 7 hari
+
+# Text Extraction Cache
+TEXT_CACHE_ENABLED = os.getenv("TEXT_CACHE_ENABLED", "true").lower() == "true"
+TEXT_CACHE_MAX_ITEMS = int(os.getenv("TEXT_CACHE_MAX_ITEMS", "2000"))
+TEXT_CACHE_TTL = int(os.getenv("TEXT_CACHE_TTL", str(60 * 60 * 24 * 30)))  # 30 hari
+
+# Rule-based parser (fast path sebelum Gemini)
+RULE_PARSER_ENABLED = os.getenv("RULE_PARSER_ENABLED", "true").lower() == "true"
+RULE_PARSER_MIN_CONFIDENCE = float(os.getenv("RULE_PARSER_MIN_CONFIDENCE", "0.8"))
+
+# Batch text extraction (/api/process-text/batch)
+TEXT_BATCH_MAX_ITEMS = int(os.getenv("TEXT_BATCH_MAX_ITEMS", "500"))  # per request
+TEXT_BATCH_MAX_ITEMS_PER_PROMPT = int(os.getenv("TEXT_BATCH_MAX_ITEMS_PER_PROMPT", "50"))
+TEXT_BATCH_PROMPT_TOKENS = int(os.getenv("TEXT_BATCH_PROMPT_TOKENS", "4000"))
+TEXT_BATCH_OUTPUT_TOKENS = int(os.getenv("TEXT_BATCH_OUTPUT_TOKENS", "6000"))
+TEXT_BATCH_CONCURRENCY = int(os.getenv("TEXT_BATCH_CONCURRENCY", "4"))
+
+# Batch embeddings (/api/generate_embeddings)
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "1000"))  # per request
+EMBEDDING_BATCH_CONCURRENCY = int(os.getenv("EMBEDDING_BATCH_CONCURRENCY", "4"))
+
+# Embedding Cache (vektor float32, key = model + teks ternormalisasi)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ITEMS = int(os.getenv("EMBEDDING_CACHE_MAX_ITEMS", "10000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(60 * 60 * 24 * 90)))  # 90 hari
+
+# Vector Index (similarity search embedding transaksi per user)
+VECTOR_INDEX_MAX_USERS = int(os.getenv("VECTOR_INDEX_MAX_USERS", "200"))
+VECTOR_INDEX_TTL = int(os.getenv("VECTOR_INDEX_TTL", "3600"))  # reload dari DB tiap 1 jam
+VECTOR_INDEX_MAX_K = int(os.getenv("VECTOR_INDEX_MAX_K", "50"))
+
+# Embedding kNN Categorizer
+CATEGORIZER_ENABLED = os.getenv("CATEGORIZER_ENABLED", "true").lower() == "true"
+CATEGORIZER_K = int(os.getenv("CATEGORIZER_K", "7"))
+CATEGORIZER_MIN_SIMILARITY = float(os.getenv("CATEGORIZER_MIN_SIMILARITY", "0.75"))
+CATEGORIZER_MIN_CONFIDENCE = float(os.getenv("CATEGORIZER_MIN_CONFIDENCE", "0.6"))
+
+# Local Intent Classifier (dilatih dari ai_dataset type='intent')
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "data/intent_model.joblib")
+INTENT_MODEL_MIN_CONFIDENCE = float(os.getenv("INTENT_MODEL_MIN_CONFIDENCE", "0.75"))
+INTENT_MODEL_MIN_SAMPLES = int(os.getenv("INTENT_MODEL_MIN_SAMPLES", "20"))
+
+# Consult SQL templates (pertanyaan -> SQL berparameter, LLM hanya untuk bentuk baru)
+SQL_TEMPLATE_LEARNING_ENABLED = os.getenv("SQL_TEMPLATE_LEARNING_ENABLED", "true").lower() == "true"
+SQL_TEMPLATE_CACHE_MAX_ITEMS = int(os.getenv("SQL_TEMPLATE_CACHE_MAX_ITEMS", "1000"))
+SQL_TEMPLATE_TTL = int(os.getenv("SQL_TEMPLATE_TTL", str(60 * 60 * 24 * 30)))  # 30 hari
+# Pakai tabel transaction_monthly_rollups (migration supabase) untuk pertanyaan per bulan penuh
+CONSULT_USE_ROLLUPS = os.getenv("CONSULT_USE_ROLLUPS", "true").lower() == "true"
+
+# Consultation answer cache (invalidasi lewat versi data per user: datav:{user})
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))  # 1 hari
+
+# Conversation Memory (konsultasi)
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "5"))  # pasangan tanya-jawab terakhir
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "1500"))
+MEMORY_TTL = int(os.getenv("MEMORY_TTL", "86400"))  # 1 hari
+MEMORY_SUMMARY_ENABLED = os.getenv("MEMORY_SUMMARY_ENABLED", "false").lower() == "true"
+
+# Whisper (speech-to-text) Configuration
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "base")
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE", "")  # kosong = deteksi otomatis
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "1"))
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "true").lower() == "true"
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "true").lower() == "true"
+
 # Redis Configuration
 USE_REDIS_MEMORY = os.getenv("USE_REDIS_MEMORY", "true").lower() == "true"
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))  # per pool (teks dan biner)
 
 # Logging Configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO" if ENV == "production" else "DEBUG")
@@ -1,6 +1,13 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
-from config.config import DATABASE_URL
+from config.config import (
+    DATABASE_URL,
+    ASYNC_DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT
+)
 
 engine = create_engine(
     DATABASE_URL,
@@ -11,6 +18,18 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine async (asyncpg) untuk query di route async: tidak memblokir event loop.
+# Supabase pooler (pgbouncer, transaction mode) tidak mendukung prepared statement cache
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    connect_args={"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -1,89 +1,174 @@
-from langchain.agents import initialize_agent, Tool
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import SystemMessage
-from langchain_agent.tools import get_financial_tools
-from langchain_agent.memory import get_memory
+from langchain_agent.memory import get_memory, make_llm_summarizer
+from langchain_agent.pool import agent_pool
 from langchain_agent.prompt import get_system_prompt
+from langchain_agent.streaming import FinalAnswerStream
 from langchain_agent.config import USE_REDIS_MEMORY
+from logic.key_scheduler import scheduler
+from logic import answer_cache
+from logic.sql_templates import parse_question
 from config.config import (
     GEMINI_API_KEYS,
-    GEMINI_MODEL,
-    GEMINI_TEMPERATURE,
-    GEMINI_MAX_TOKENS,
+    MEMORY_SUMMARY_ENABLED,
     ENV,
     LOG_LEVEL
 )
+from typing import AsyncIterator
 import logging
 
 # Setup logging
 logging.basicConfig(level=getattr(logging, LOG_LEVEL))
 logger = logging.getLogger(__name__)
 
-def create_llm(api_key: str) -> ChatGoogleGenerativeAI:
-    """Create LLM instance with given API key"""
-    return ChatGoogleGenerativeAI(
-        model=GEMINI_MODEL,
-        google_api_key=api_key,
-        temperature=GEMINI_TEMPERATURE,
-        max_output_tokens=GEMINI_MAX_TOKENS,
-        convert_system_message_to_human=True
+def _failure_status(error: Exception):
+    """HTTP status (429/500/503) dari error Gemini yang layak dicoba dengan key lain."""
+    status = getattr(error, "code", None)  # google.api_core: kode HTTP
+    if status not in (429, 500, 503):
+        status = next((code for code in (429, 500, 503) if str(code) in str(error)), None)
+    return status
+
+async def _prepare_consultation(message: str, phone_number: str) -> dict:
+    """Memory user, dan jawaban dari cache bila pertanyaannya mandiri dan sudah pernah dijawab."""
+    # Memory dari Redis (window N giliran terakhir) atau buffer biasa; system prompt
+    # hanya ditambahkan saat load, tidak ikut disimpan
+    memory = get_memory(
+        mode="redis" if USE_REDIS_MEMORY else "buffer",
+        phone_number=phone_number,
+        system_prompt=get_system_prompt(phone_number)
     )
 
-# Ambil tools keuangan
-tools = get_financial_tools()
+    # Hanya pertanyaan mandiri ("total makan bulan ini?") yang di-cache: jawaban
+    # pertanyaan lanjutan ("berapa itu?") bergantung pada isi percakapan
+    parsed = parse_question(message)
+    cacheable = parsed["kind"] is not None and any(
+        slot in parsed["params"] for slot in ("start_date", "category", "keyword")
+    )
+    cached, version = None, None
+    if cacheable:
+        cached, version = await answer_cache.get(phone_number, message)
+        if cached is not None:
+            await memory.asave_context({"input": message}, {"output": cached})
+    return {"memory": memory, "cacheable": cacheable, "cached": cached, "version": version}
+
+def _executor(memory, api_key: str):
+    # Agent untuk key ini sudah disiapkan saat startup. Memory dimuat dan
+    # disimpan sendiri (async) karena AgentExecutor menyimpan memory secara sync
+    if MEMORY_SUMMARY_ENABLED and hasattr(memory, "summarizer"):
+        # Giliran yang keluar dari window diringkas dengan LLM key yang sama
+        memory.summarizer = make_llm_summarizer(agent_pool.agent(api_key).llm_chain.llm)
+    return agent_pool.executor(api_key)
+
+async def _finish_consultation(state: dict, message: str, phone_number: str, result: str) -> None:
+    logger.info(f"Successfully processed consultation for {phone_number}")
+    # Dipanggil di luar try: gagal simpan memory bukan kesalahan API key
+    await state["memory"].asave_context({"input": message}, {"output": result})
+    if state["cacheable"]:
+        await answer_cache.set(phone_number, message, state["version"], result)
 
 # Fungsi utama konsultasi
 async def run_financial_consultation(message: str, phone_number: str) -> str:
     logger.info(f"Processing consultation for {phone_number} in {ENV} environment")
-    
-    # Load memory dari Redis atau buffer biasa
-    memory = get_memory(
-        mode="redis" if USE_REDIS_MEMORY else "buffer",
-        phone_number=phone_number
-    )
 
-    # Clear memory untuk memulai percakapan baru
-    memory.clear()
+    state = await _prepare_consultation(message, phone_number)
+    if state["cached"] is not None:
+        return state["cached"]
+
+    history = await state["memory"].aload_memory_variables({"input": message})
 
     last_error = None
-    for api_key in GEMINI_API_KEYS:
+    for _ in range(max(1, len(GEMINI_API_KEYS))):
+        api_key = await scheduler.acquire()
         try:
             logger.info(f"Attempting consultation with API key: {api_key[:8]}...")
-            
-            # Buat LLM dengan API key saat ini
-            llm = create_llm(api_key)
-            
-            # Buat agent dengan memory yang sudah diinisialisasi
-            agent = initialize_agent(
-                tools=tools,
-                llm=llm,
-                agent="chat-conversational-react-description",
-                memory=memory,
-                verbose=ENV == "development"  # Hanya tampilkan verbose di development
-            )
-
-            # Tambah sistem prompt (pesan awal)
-            system_prompt = get_system_prompt(phone_number)
-            memory.save_context(
-                {"input": ""},  # Empty input for system message
-                {"output": system_prompt}
-            )
-
-            # Jalankan agent
-            result = agent.run(message)
-            logger.info(f"Successfully processed consultation for {phone_number}")
-            return result
-            
+            agent = _executor(state["memory"], api_key)
+
+            # Jalankan agent (async: tidak memblokir event loop)
+            result = (await agent.ainvoke({"input": message, **history}))["output"]
         except Exception as e:
             last_error = e
-            if "429" in str(e) or "500" in str(e) or "503" in str(e):  # Rate limit or server error
+            status = _failure_status(e)
+            if status is not None:  # Rate limit or server error
+                scheduler.report_failure(api_key, status)
                 logger.warning(f"API key {api_key[:8]}... failed with error: {str(e)}, trying next key...")
                 continue
             else:
+                scheduler.report_success(api_key)
                 logger.error(f"Unexpected error with API key {api_key[:8]}...: {str(e)}")
                 continue
-    
+
+        scheduler.report_success(api_key)
+        await _finish_consultation(state, message, phone_number, result)
+        return result
+
     # If we get here, all API keys failed
     error_msg = f"All Gemini API keys failed. Last error: {str(last_error)}"
     logger.error(error_msg)
     raise Exception(error_msg)
+
+async def stream_financial_consultation(message: str, phone_number: str) -> AsyncIterator[dict]:
+    """
+    Same consultation as run_financial_consultation, yielded as events while
+    the agent runs: {"event": "token", "text"}, {"event": "tool_start", "tool",
+    "input"}, {"event": "tool_end", "tool", "output"} and finally
+    {"event": "done", "reply", "cached"} (reply is the full, authoritative answer).
+    """
+    logger.info(f"Streaming consultation for {phone_number} in {ENV} environment")
+
+    state = await _prepare_consultation(message, phone_number)
+    if state["cached"] is not None:
+        yield {"event": "token", "text": state["cached"]}
+        yield {"event": "done", "reply": state["cached"], "cached": True}
+        return
+
+    history = await state["memory"].aload_memory_variables({"input": message})
+
+    last_error = None
+    for _ in range(max(1, len(GEMINI_API_KEYS))):
+        api_key = await scheduler.acquire()
+        answers = {}  # run_id LLM -> FinalAnswerStream
+        streamed = ""
+        result = None
+        try:
+            logger.info(f"Attempting streaming consultation with API key: {api_key[:8]}...")
+            agent = _executor(state["memory"], api_key)
+
+            async for event in agent.astream_events({"input": message, **history}, version="v1"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    text = answers.setdefault(event["run_id"], FinalAnswerStream()).feed(event["data"]["chunk"].content)
+                    if text:
+                        streamed += text
+                        yield {"event": "token", "text": text}
+                elif kind == "on_tool_start":
+                    yield {"event": "tool_start", "tool": event["name"], "input": event["data"].get("input")}
+                elif kind == "on_tool_end":
+                    yield {"event": "tool_end", "tool": event["name"], "output": str(event["data"].get("output"))}
+                elif kind == "on_chain_end" and event["name"] == "AgentExecutor":
+                    result = (event["data"].get("output") or {}).get("output")
+            if result is None:
+                raise Exception("Agent stream ended without a final answer")
+        except Exception as e:
+            last_error = e
+            status = _failure_status(e)
+            if status is not None:
+                scheduler.report_failure(api_key, status)
+            else:
+                scheduler.report_success(api_key)
+            if streamed:
+                # Token sudah terkirim ke user: tidak bisa diulang dengan key lain
+                logger.error(f"Streaming consultation failed mid-answer with API key {api_key[:8]}...: {str(e)}")
+                yield {"event": "error", "detail": f"Error during consultation: {str(e)}"}
+                return
+            logger.warning(f"API key {api_key[:8]}... failed with error: {str(e)}, trying next key...")
+            continue
+
+        scheduler.report_success(api_key)
+        if result.startswith(streamed) and result != streamed:
+            # Jawaban tidak berbentuk action_input string (mis. parser fallback): kirim sisanya
+            yield {"event": "token", "text": result[len(streamed):]}
+        await _finish_consultation(state, message, phone_number, result)
+        yield {"event": "done", "reply": result, "cached": False}
+        return
+
+    error_msg = f"All Gemini API keys failed. Last error: {str(last_error)}"
+    logger.error(error_msg)
+    yield {"event": "error", "detail": error_msg}
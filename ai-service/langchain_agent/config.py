@@ -4,6 +4,4 @@ from dotenv import load_dotenv
 load_dotenv()
 
 LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
-REDIS_HOST = os.getenv("REDIS_HOST", "redis")
-REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 USE_REDIS_MEMORY = os.getenv("USE_REDIS_MEMORY", "true").lower() == "true"
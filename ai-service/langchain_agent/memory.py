@@ -1,89 +1,193 @@
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 from langchain.schema import BaseMemory
-from langchain.schema import SystemMessage, HumanMessage, AIMessage
-import redis
+from langchain.schema import BaseMessage, SystemMessage, HumanMessage, AIMessage
+from config.config import MEMORY_MAX_TURNS, MEMORY_MAX_TOKENS, MEMORY_TTL
+from utils.redis_client import get_redis, get_sync_redis
+from utils.tokens import estimate_tokens
+import asyncio
 import json
-from typing import Dict, List, Any, Optional
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_TYPES = {"system": SystemMessage, "human": HumanMessage, "ai": AIMessage}
+
+CONTEXT_ACK = "Baik, saya mengerti."
+
+def context_messages(system_prompt: Optional[str] = None, summary: Optional[str] = None) -> List[BaseMessage]:
+    """
+    System prompt and summary as a leading human/AI pair: the agent prompt already
+    opens with its own SystemMessage and Gemini rejects any further ones.
+    """
+    parts = [part for part in (system_prompt, summary and f"Ringkasan percakapan sebelumnya: {summary}") if part]
+    if not parts:
+        return []
+    return [HumanMessage(content="\n\n".join(parts)), AIMessage(content=CONTEXT_ACK)]
+
+def fit_token_budget(messages: List[BaseMessage], max_tokens: int) -> List[BaseMessage]:
+    """Keep the newest messages whose estimated size fits `max_tokens`, whole turns only."""
+    kept, used = [], 0
+    for index in range(len(messages) - 1, -1, -1):
+        used += estimate_tokens(messages[index].content)
+        if used > max_tokens:
+            break
+        kept.append(messages[index])
+    # Jangan mulai window dengan jawaban AI tanpa pertanyaannya
+    if len(kept) % 2 == 1:
+        kept.pop()
+    return list(reversed(kept))
+
 
 class RedisConversationMemory(BaseMemory):
-    """Memory implementation that stores conversation history in Redis"""
-    
-    def __init__(self, phone_number: str):
-        """Initialize memory with phone number"""
-        self.phone_number = phone_number
-        self._redis = redis.Redis(host='localhost', port=6379, decode_responses=True)
-        self._chat_memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
+    """
+    Windowed conversation memory in Redis. Only the last `max_turns`
+    turns are stored (LTRIM) and loaded, further cut to `max_tokens`.
+    Turns that fall out of the window can be folded into a rolling
+    summary by an optional async `summarizer(previous_summary, messages)`.
+    Nothing is buffered in-process, so each load reflects Redis.
+    The async methods (used by the agent) run on the shared redis.asyncio
+    pool, the sync ones on a blocking client.
+    """
+
+    phone_number: str
+    redis_client: Any = None
+    sync_redis_client: Any = None
+    system_prompt: Optional[str] = None
+    memory_key: str = "chat_history"
+    input_key: str = "input"
+    output_key: str = "output"
+    max_turns: int = MEMORY_MAX_TURNS
+    max_tokens: int = MEMORY_MAX_TOKENS
+    ttl: int = MEMORY_TTL
+    summarizer: Optional[Callable[[str, List[BaseMessage]], Awaitable[str]]] = None
 
     @property
-    def redis(self) -> redis.Redis:
-        """Get Redis connection"""
-        if self._redis is None:
-            self._redis = redis.Redis(host='localhost', port=6379, decode_responses=True)
-        return self._redis
+    def key(self) -> str:
+        return f"memory:{self.phone_number}"
 
     @property
-    def chat_memory(self) -> ConversationBufferMemory:
-        """Get chat memory instance"""
-        if self._chat_memory is None:
-            self._chat_memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True
-            )
-        return self._chat_memory
+    def summary_key(self) -> str:
+        return f"memory:{self.phone_number}:summary"
+
+    @property
+    def client(self):
+        return self.redis_client if self.redis_client is not None else get_redis()
+
+    @property
+    def sync_client(self):
+        return self.sync_redis_client if self.sync_redis_client is not None else get_sync_redis()
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def _messages(self, raw_items: List[str]) -> List[BaseMessage]:
+        messages = []
+        for item in raw_items:
+            msg = json.loads(item)
+            message_type = _MESSAGE_TYPES.get(msg.get("role"))
+            if message_type:
+                messages.append(message_type(content=msg["content"]))
+        return messages
+
+    def _queue_load(self, pipe) -> None:
+        pipe.lrange(self.key, -2 * self.max_turns, -1)
+        pipe.get(self.summary_key)
+
+    def _loaded(self, history: List[str], summary: Optional[str]) -> Dict[str, Any]:
+        messages = fit_token_budget(self._messages(history), self.max_tokens)
+        return {self.memory_key: context_messages(self.system_prompt, summary) + messages}
+
+    def _queue_save(self, pipe, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        turn = [
+            json.dumps({"role": "human", "content": inputs.get(self.input_key, "")}),
+            json.dumps({"role": "ai", "content": outputs.get(self.output_key, "")})
+        ]
+        max_messages = 2 * self.max_turns
+        pipe.rpush(self.key, *turn)
+        if self.summarizer:
+            # Ambil yang akan terbuang dulu, untuk diringkas
+            pipe.lrange(self.key, 0, -max_messages - 1)
+        pipe.ltrim(self.key, -max_messages, -1)
+        pipe.expire(self.key, self.ttl)
 
     def load_memory_variables(self, inputs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Load memory variables from Redis"""
-        history = self.redis.lrange(f"memory:{self.phone_number}", 0, -1)
-        messages = [json.loads(item) for item in history]
-        
-        # Convert messages to LangChain message types
-        for msg in messages:
-            if msg["role"] == "system":
-                self.chat_memory.chat_memory.add_message(SystemMessage(content=msg["content"]))
-            elif msg["role"] == "human":
-                self.chat_memory.chat_memory.add_message(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "ai":
-                self.chat_memory.chat_memory.add_message(AIMessage(content=msg["content"]))
-        
-        return self.chat_memory.load_memory_variables(inputs)
+        """Sync `aload_memory_variables` on the blocking client."""
+        with self.sync_client.pipeline(transaction=False) as pipe:
+            self._queue_load(pipe)
+            history, summary = pipe.execute()
+        return self._loaded(history, summary)
 
     def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
-        """Save context to Redis"""
-        # Save to Redis
-        if "input" in inputs:
-            self.redis.rpush(f"memory:{self.phone_number}", json.dumps({
-                "role": "human",
-                "content": inputs["input"]
-            }))
-        
-        if "output" in outputs:
-            self.redis.rpush(f"memory:{self.phone_number}", json.dumps({
-                "role": "ai",
-                "content": outputs["output"]
-            }))
-        
-        # Also save to chat_memory for compatibility
-        self.chat_memory.save_context(inputs, outputs)
-        
-        # Set TTL
-        self.redis.expire(f"memory:{self.phone_number}", 86400)  # 1 hari TTL
+        """Sync `asave_context` on the blocking client."""
+        with self.sync_client.pipeline(transaction=True) as pipe:
+            self._queue_save(pipe, inputs, outputs)
+            results = pipe.execute()
+
+        evicted = results[1] if self.summarizer else []
+        if evicted:
+            try:
+                previous = self.sync_client.get(self.summary_key) or ""
+                # Summarizer selalu async; di jalur sync tidak ada event loop yang berjalan
+                summary = asyncio.run(self.summarizer(previous, self._messages(evicted)))
+                self.sync_client.set(self.summary_key, summary, ex=self.ttl)
+            except Exception as e:
+                logger.warning({"event": "memory_summary_failed", "phone_number": self.phone_number, "error": str(e)})
 
     def clear(self) -> None:
-        """Clear memory"""
-        self.redis.delete(f"memory:{self.phone_number}")
-        self.chat_memory.clear()
+        self.sync_client.delete(self.key, self.summary_key)
 
-    @property
-    def memory_variables(self) -> List[str]:
-        """Return memory variables"""
-        return self.chat_memory.memory_variables
+    async def aload_memory_variables(self, inputs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Load only the window (last `max_turns` turns) plus the summary, in one round trip."""
+        async with self.client.pipeline(transaction=False) as pipe:
+            self._queue_load(pipe)
+            history, summary = await pipe.execute()
+        return self._loaded(history, summary)
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """Append one turn, trim to the window and refresh the TTL in a single pipeline."""
+        async with self.client.pipeline(transaction=True) as pipe:
+            self._queue_save(pipe, inputs, outputs)
+            results = await pipe.execute()
+
+        evicted = results[1] if self.summarizer else []
+        if evicted:
+            await self._update_summary(self._messages(evicted))
+
+    async def _update_summary(self, evicted: List[BaseMessage]) -> None:
+        try:
+            previous = await self.client.get(self.summary_key) or ""
+            summary = await self.summarizer(previous, evicted)
+            await self.client.set(self.summary_key, summary, ex=self.ttl)
+        except Exception as e:
+            # Ringkasan hanya pelengkap: percakapan tetap jalan tanpa ringkasan baru
+            logger.warning({"event": "memory_summary_failed", "phone_number": self.phone_number, "error": str(e)})
+
+    async def aclear(self) -> None:
+        await self.client.delete(self.key, self.summary_key)
+
+
+def make_llm_summarizer(llm) -> Callable[[str, List[BaseMessage]], Awaitable[str]]:
+    """Summarizer that asks `llm` to fold evicted turns into the running summary."""
+    async def summarize(previous: str, messages: List[BaseMessage]) -> str:
+        conversation = "\n".join(
+            f"{'User' if isinstance(message, HumanMessage) else 'Asisten'}: {message.content}"
+            for message in messages
+        )
+        prompt = (
+            "Perbarui ringkasan percakapan keuangan berikut secara singkat (maksimal 5 kalimat), "
+            "pertahankan angka dan fakta penting.\n\n"
+            f"Ringkasan saat ini: {previous or '-'}\n\nPercakapan baru:\n{conversation}\n\nRingkasan baru:"
+        )
+        return (await llm.ainvoke(prompt)).content.strip()
+    return summarize
 
 # Untuk fallback atau pengembangan cepat
-def get_memory(mode="buffer", phone_number=None):
+def get_memory(mode="buffer", phone_number=None, system_prompt=None, summarizer=None):
     if mode == "redis" and phone_number:
-        return RedisConversationMemory(phone_number=phone_number)
-    else:
-        return ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        return RedisConversationMemory(phone_number=phone_number, system_prompt=system_prompt, summarizer=summarizer)
+    # +1: pasangan system prompt ikut dihitung sebagai satu giliran
+    memory = ConversationBufferWindowMemory(memory_key="chat_history", return_messages=True, k=MEMORY_MAX_TURNS + 1)
+    memory.chat_memory.messages.extend(context_messages(system_prompt))
+    return memory
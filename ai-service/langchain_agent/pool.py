@@ -0,0 +1,80 @@
+from langchain.agents import AgentExecutor, ConversationalChatAgent
+from langchain_google_genai import ChatGoogleGenerativeAI
+import google.ai.generativelanguage as glm
+from langchain_agent.tools import get_financial_tools
+from config.config import (
+    GEMINI_API_KEYS,
+    GEMINI_MODEL,
+    GEMINI_TEMPERATURE,
+    GEMINI_MAX_TOKENS,
+    ENV
+)
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def create_llm(api_key: str) -> ChatGoogleGenerativeAI:
+    """Create LLM instance with given API key"""
+    llm = ChatGoogleGenerativeAI(
+        model=GEMINI_MODEL,
+        google_api_key=api_key,
+        temperature=GEMINI_TEMPERATURE,
+        max_output_tokens=GEMINI_MAX_TOKENS,
+        convert_system_message_to_human=True
+    )
+    # genai.configure() bersifat global (key terakhir menang): pasang client gRPC
+    # milik key ini sendiri agar setiap LLM benar-benar memakai key-nya
+    llm.client._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    llm.client._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+    return llm
+
+
+class AgentPool:
+    """
+    One LLM client and one prepared conversational agent (prompt templates,
+    output parser, tools) per Gemini API key, built once at startup.
+    Each request only wraps the shared agent in a lightweight AgentExecutor
+    with that user's memory.
+    """
+
+    def __init__(self):
+        self.tools = get_financial_tools()
+        self._agents = {}
+
+    def startup(self, api_keys: list = None) -> None:
+        """Build the agents (dipanggil di app lifespan, di dalam event loop)."""
+        start = time.perf_counter()
+        for api_key in api_keys or GEMINI_API_KEYS:
+            self.agent(api_key)
+        logger.info({
+            "event": "agent_pool_started",
+            "agents": len(self._agents),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+        })
+
+    def shutdown(self) -> None:
+        self._agents.clear()
+
+    def agent(self, api_key: str) -> ConversationalChatAgent:
+        agent = self._agents.get(api_key)
+        if agent is None:
+            # Key baru / di luar lifespan (script, test): bangun sekali lalu simpan
+            agent = ConversationalChatAgent.from_llm_and_tools(llm=create_llm(api_key), tools=self.tools)
+            self._agents[api_key] = agent
+        return agent
+
+    def executor(self, api_key: str, memory=None) -> AgentExecutor:
+        """
+        Per-request executor around the shared agent of `api_key`. Without
+        `memory`, the caller passes "chat_history" in the input itself.
+        """
+        return AgentExecutor.from_agent_and_tools(
+            agent=self.agent(api_key),
+            tools=self.tools,
+            memory=memory,
+            verbose=ENV == "development"  # Hanya tampilkan verbose di development
+        )
+
+
+agent_pool = AgentPool()
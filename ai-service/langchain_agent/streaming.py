@@ -0,0 +1,71 @@
+"""
+Incremental extraction of the user-facing reply from a streamed agent step.
+
+ConversationalChatAgent answers with a JSON blob
+(```json {"action": "Final Answer", "action_input": "..."} ```), so the raw
+LLM tokens are not something to show the user. FinalAnswerStream is fed the
+tokens of one LLM call and returns only the decoded text of `action_input`,
+as soon as it is known the step is the final answer.
+"""
+import json
+import re
+
+_FINAL_ANSWER = re.compile(r'"action"\s*:\s*"Final Answer"\s*,\s*"action_input"\s*:\s*"')
+_UNICODE_ESCAPE = re.compile(r"u[0-9a-fA-F]{4}")
+
+
+class FinalAnswerStream:
+    def __init__(self):
+        self.buffer = ""
+        self.position = None  # indeks awal teks action_input yang belum dikirim
+        self.finished = False
+        self.emitted = ""
+
+    def feed(self, token: str) -> str:
+        """Add one streamed token; returns the new part of the answer ("" if none)."""
+        self.buffer += token
+        if self.finished:
+            return ""
+        if self.position is None:
+            match = _FINAL_ANSWER.search(self.buffer)
+            if match is None:
+                return ""
+            self.position = match.end()
+
+        text = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if char == '"':
+                self.finished = True
+                break
+            if char != "\\":
+                text.append(char)
+                self.position += 1
+                continue
+            # Escape JSON: tunggu token berikutnya bila belum lengkap
+            escape = self.buffer[self.position + 1:self.position + 6]
+            if not escape:
+                break
+            if escape[0] == "u":
+                if not _UNICODE_ESCAPE.match(escape):
+                    if len(escape) < 5:
+                        break
+                    escape = escape[0]  # escape rusak: lewati apa adanya
+                elif 0xD800 <= int(escape[1:5], 16) <= 0xDBFF:
+                    # Surrogate pair (emoji): didekode bersama pasangannya
+                    escape = self.buffer[self.position + 1:self.position + 12]
+                    if len(escape) < 11:
+                        break
+                else:
+                    escape = escape[:5]
+            else:
+                escape = escape[0]
+            try:
+                text.append(json.loads(f'"\\{escape}"'))
+            except ValueError:
+                text.append(escape)
+            self.position += 1 + len(escape)
+
+        chunk = "".join(text)
+        self.emitted += chunk
+        return chunk
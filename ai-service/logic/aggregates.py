@@ -0,0 +1,141 @@
+"""
+Running per-user monthly aggregates next to the `keuangan:{phone}:{YYYY-MM}`
+transaction lists, so the agent tools never have to scan a whole month.
+
+One hash per user and month, `agg:{phone}:{YYYY-MM}`:
+    total:{type}              jumlah amount per type (expense/income)
+    count:{type}              jumlah transaksi per type
+    cat:{type}:{category}     jumlah amount per kategori
+    day:{type}:{YYYY-MM-DD}   jumlah amount per hari
+
+Rebuild from the existing lists:
+    python -m logic.aggregates rebuild [--phone 0812...]
+"""
+import argparse
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+import redis
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_TTL = 60 * 60 * 24 * 90  # simpan selama 3 bulan, sama dengan list transaksi
+
+def transaction_key(phone_number: str, bulan: str) -> str:
+    return f"keuangan:{phone_number}:{bulan}"
+
+def aggregate_key(phone_number: str, bulan: str) -> str:
+    return f"agg:{phone_number}:{bulan}"
+
+def transaction_type(data: dict) -> str:
+    # Transaksi dari struk/teks tidak selalu punya "type": anggap pengeluaran
+    return data.get("type") or "expense"
+
+def transaction_amount(data: dict) -> float:
+    try:
+        return float(data.get("amount") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def increments(data: dict, today: str = None) -> dict:
+    """Hash field -> increment for one transaction."""
+    tipe = transaction_type(data)
+    amount = transaction_amount(data)
+    day = data.get("date") or today or datetime.now().strftime("%Y-%m-%d")
+    category = data.get("category") or "Lainnya"  # sama dengan daftar kategori
+    return {
+        f"total:{tipe}": amount,
+        f"count:{tipe}": 1,
+        f"cat:{tipe}:{category}": amount,
+        f"day:{tipe}:{day}": amount,
+    }
+
+def queue_increments(pipe, phone_number: str, bulan: str, data: dict) -> None:
+    """Queue the aggregate update for one transaction on a (MULTI) pipeline."""
+    key = aggregate_key(phone_number, bulan)
+    for field, value in increments(data).items():
+        if field.startswith("count:"):
+            pipe.hincrby(key, field, int(value))
+        else:
+            pipe.hincrbyfloat(key, field, value)
+    pipe.expire(key, TRANSACTION_TTL)
+
+def parse_aggregates(raw: dict) -> dict:
+    """HGETALL result -> {"total": {type: x}, "count": {...}, "category": {type: {cat: x}}, "day": {type: {day: x}}}."""
+    result = {"total": {}, "count": {}, "category": defaultdict(dict), "day": defaultdict(dict)}
+    for field, value in raw.items():
+        kind, _, rest = field.partition(":")
+        if kind == "total":
+            result["total"][rest] = float(value)
+        elif kind == "count":
+            result["count"][rest] = int(value)
+        elif kind in ("cat", "day"):
+            tipe, _, name = rest.partition(":")
+            result["category" if kind == "cat" else "day"][tipe][name] = float(value)
+    return result
+
+async def get_month(client, phone_number: str, bulan: str) -> dict:
+    """Aggregates of one month in a single HGETALL (bounded by categories + days, not transactions)."""
+    return parse_aggregates(await client.hgetall(aggregate_key(phone_number, bulan)))
+
+async def get_months(client, phone_number: str, months: list) -> list:
+    """Aggregates of several months in one pipelined round trip."""
+    async with client.pipeline(transaction=False) as pipe:
+        for bulan in months:
+            pipe.hgetall(aggregate_key(phone_number, bulan))
+        return [parse_aggregates(raw) for raw in await pipe.execute()]
+
+def rebuild_month(client, phone_number: str, bulan: str) -> int:
+    """Recompute one month's hash from its transaction list. Returns the number of transactions."""
+    list_key = transaction_key(phone_number, bulan)
+    agg_key = aggregate_key(phone_number, bulan)
+    with client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                # WATCH: ulangi kalau ada transaksi baru masuk selama rebuild
+                pipe.watch(list_key)
+                items = [json.loads(item) for item in pipe.lrange(list_key, 0, -1) if item]
+                totals = defaultdict(float)
+                for item in items:
+                    for field, value in increments(item).items():
+                        totals[field] += value
+                ttl = pipe.ttl(list_key)
+                pipe.multi()
+                pipe.delete(agg_key)
+                if totals:
+                    pipe.hset(agg_key, mapping={
+                        field: int(value) if field.startswith("count:") else value
+                        for field, value in totals.items()
+                    })
+                    pipe.expire(agg_key, ttl if ttl and ttl > 0 else TRANSACTION_TTL)
+                pipe.execute()
+                return len(items)
+            except redis.WatchError:
+                continue
+
+def rebuild_all(client, phone_number: str = None) -> dict:
+    """Rebuild every month (of one user, or everyone). Returns {list key: transactions}."""
+    pattern = transaction_key(phone_number or "*", "*")
+    rebuilt = {}
+    for key in client.scan_iter(match=pattern, count=500):
+        _, phone, bulan = key.split(":", 2)
+        rebuilt[key] = rebuild_month(client, phone, bulan)
+        logger.info({"event": "aggregates_rebuilt", "key": key, "transactions": rebuilt[key]})
+    return rebuilt
+
+def main(argv=None) -> None:
+    from config.config import REDIS_HOST, REDIS_PORT
+
+    parser = argparse.ArgumentParser(prog="python -m logic.aggregates")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild = subcommands.add_parser("rebuild", help="rebuild agg:* hashes from keuangan:* lists")
+    rebuild.add_argument("--phone", help="only this phone number")
+    args = parser.parse_args(argv)
+
+    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    rebuilt = rebuild_all(client, args.phone)
+    print(f"Rebuilt {len(rebuilt)} month(s), {sum(rebuilt.values())} transaction(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Cache of consultation answers, invalidated by a per-user data version.
+
+Every transaction write bumps `datav:{user}` (INCR). Answers live in one
+hash per user, `answers:{user}`, with the field derived from the date
+bucket (today) and the normalized question, and the value storing the
+data version the answer was computed against. A read fetches the version
+and the entry in one pipeline; an entry from an older version is a miss,
+so any write invalidates all of the user's answers without scanning keys.
+"""
+import hashlib
+import json
+import logging
+import re
+from datetime import date
+from config.config import ANSWER_CACHE_ENABLED, ANSWER_CACHE_TTL
+from logic.text_normalize import normalize_text
+from utils import metrics
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_TTL = 60 * 60 * 24 * 90  # sama dengan list transaksi
+
+def data_version_key(user: str) -> str:
+    return f"datav:{user}"
+
+def answers_key(user: str) -> str:
+    return f"answers:{user}"
+
+def normalize_question(question: str) -> str:
+    normalized = re.sub(r"[^\w\s]", " ", normalize_text(question))
+    return re.sub(r"\s+", " ", normalized).strip()
+
+def answer_field(question: str, today: date = None) -> str:
+    # Bucket tanggal: "bulan ini" / "hari ini" berubah arti setiap hari
+    bucket = (today or date.today()).isoformat()
+    return hashlib.sha1(f"{bucket}|{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+def queue_data_version_bump(pipe, user: str) -> None:
+    """Queue the invalidation of `user`'s answers on a (MULTI) pipeline with the write itself."""
+    pipe.incr(data_version_key(user))
+    pipe.expire(data_version_key(user), DATA_VERSION_TTL)
+    # Jawaban lama tidak akan pernah valid lagi: buang sekalian agar hash tetap kecil
+    pipe.delete(answers_key(user))
+
+async def get(user: str, question: str, today: date = None) -> tuple:
+    """
+    (answer or None, data version). Pass the version back to `set`, so an
+    answer computed while a write landed is stored under the old version.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None, None
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.get(data_version_key(user))
+            pipe.hget(answers_key(user), answer_field(question, today))
+            version, raw = await pipe.execute()
+    except Exception as e:
+        logger.warning({"event": "answer_cache_get_failed", "user": user, "error": str(e)})
+        return None, None
+
+    version = int(version or 0)
+    if raw is not None:
+        entry = json.loads(raw)
+        if entry["version"] == version:
+            metrics.increment("answer_cache.hits")
+            return entry["answer"], version
+        metrics.increment("answer_cache.stale")
+    metrics.increment("answer_cache.misses")
+    return None, version
+
+async def set(user: str, question: str, version, answer, today: date = None) -> None:
+    """Store `answer` (JSON serializable) computed against data `version`."""
+    if not ANSWER_CACHE_ENABLED or version is None:
+        return
+    entry = json.dumps({"version": version, "answer": answer})
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.hset(answers_key(user), answer_field(question, today), entry)
+            pipe.expire(answers_key(user), ANSWER_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning({"event": "answer_cache_set_failed", "user": user, "error": str(e)})
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import whisper
+from whisper.audio import SAMPLE_RATE
+from config.config import (
+    WHISPER_MODEL_SIZE,
+    WHISPER_LANGUAGE,
+    WHISPER_WORKERS,
+    WHISPER_WARMUP
+)
+
+logger = logging.getLogger(__name__)
+
+def decode_audio(audio_bytes: bytes) -> np.ndarray:
+    """
+    Decode any ffmpeg-readable audio (ogg/opus dari WhatsApp, mp3, wav)
+    into mono float32 at 16 kHz, straight from memory without a temp file.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE),
+        "pipe:1"
+    ]
+    try:
+        out = subprocess.run(cmd, input=audio_bytes, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore')}") from e
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+class WhisperModelHolder:
+    """
+    Holds one Whisper model for the whole process.
+    Inference runs in a dedicated executor so the event loop stays free.
+    """
+
+    def __init__(self, model_size: str = WHISPER_MODEL_SIZE, workers: int = WHISPER_WORKERS):
+        self.model_size = model_size
+        self._model = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whisper")
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    self._model = whisper.load_model(self.model_size)
+                    logger.info({
+                        "event": "whisper_model_loaded",
+                        "model_size": self.model_size,
+                        "duration_ms": round((time.perf_counter() - started) * 1000)
+                    })
+        return self._model
+
+    def _load_and_warm(self, warmup: bool) -> None:
+        model = self._get_model()
+        if warmup:
+            # Satu detik hening, cukup untuk memanaskan kernel & cache tokenizer
+            model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), fp16=False)
+            logger.info({"event": "whisper_model_warmed", "model_size": self.model_size})
+
+    def _transcribe(self, audio_bytes: bytes) -> str:
+        audio = decode_audio(audio_bytes)
+        options = {"fp16": False}
+        if WHISPER_LANGUAGE:
+            options["language"] = WHISPER_LANGUAGE
+        result = self._get_model().transcribe(audio, **options)
+        return result["text"].strip()
+
+    async def load(self, warmup: bool = WHISPER_WARMUP) -> None:
+        """Load (and optionally warm) the model without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._load_and_warm, warmup)
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._transcribe, audio_bytes)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+whisper_model = WhisperModelHolder()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from collections import defaultdict
+from config.config import CATEGORIZER_K, CATEGORIZER_MIN_SIMILARITY, CATEGORIZER_MIN_CONFIDENCE
+from logic.embedding import generate_embeddings
+from logic.vector_index import VectorIndex, registry
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Contoh deskripsi per kategori default; kategori custom memakai namanya sendiri sebagai seed
+SEED_PHRASES = {
+    "Makanan": ["makan siang", "beli kopi", "nasi goreng", "jajan bakso", "gofood ayam geprek", "sarapan bubur"],
+    "Transportasi": ["isi bensin", "bayar parkir", "naik gojek", "tiket kereta", "tol dalam kota", "grab car ke kantor"],
+    "Belanja": ["belanja bulanan indomaret", "beli baju", "sabun dan sampo", "belanja sayur di pasar", "checkout shopee"],
+    "Tagihan": ["bayar listrik", "token pln", "tagihan internet indihome", "beli pulsa", "bayar kos", "iuran bpjs"],
+    "Hiburan": ["nonton bioskop", "langganan netflix", "top up game", "karaoke", "tiket konser"],
+    "Kesehatan": ["beli obat di apotek", "periksa dokter", "vitamin", "cek gigi", "rawat jalan klinik"],
+    "Pendidikan": ["beli buku", "bayar spp", "kursus online", "uang kuliah", "alat tulis sekolah"],
+}
+
+class SeedIndex:
+    """Embeddings of the seed phrases, built on first use (embeddings come from the cache after that)."""
+
+    def __init__(self):
+        self.index = VectorIndex()
+        self._lock = asyncio.Lock()
+
+    async def ensure(self, categories: list) -> None:
+        seeds = []
+        for category in categories:
+            if category == "Lainnya":
+                continue
+            for phrase in SEED_PHRASES.get(category, []) + [category.lower()]:
+                seed_id = f"{category}:{phrase}"
+                if seed_id not in self.index:
+                    seeds.append((seed_id, phrase, category))
+        if not seeds:
+            return
+        async with self._lock:
+            seeds = [seed for seed in seeds if seed[0] not in self.index]
+            if not seeds:
+                return
+            vectors = await generate_embeddings([phrase for _, phrase, _ in seeds])
+            embedded = [(seed, vector) for seed, vector in zip(seeds, vectors) if not isinstance(vector, Exception)]
+            if embedded:
+                self.index.add(
+                    [seed_id for (seed_id, _, _), _ in embedded],
+                    [vector for _, vector in embedded],
+                    [{"category": category, "description": phrase} for (_, phrase, category), _ in embedded]
+                )
+
+seed_index = SeedIndex()
+
+def vote(matches: list, categories: list, k: int = CATEGORIZER_K):
+    """
+    Similarity-weighted vote among the k nearest neighbours whose category is allowed.
+    Returns (category, confidence); confidence is the winner's share of the vote,
+    0 when even the best neighbour is not similar enough.
+    """
+    allowed = set(categories)
+    neighbours = [(score, meta.get("category")) for _, score, meta in matches if meta.get("category") in allowed][:k]
+    if not neighbours or neighbours[0][0] < CATEGORIZER_MIN_SIMILARITY:
+        return None, 0.0
+    weights = defaultdict(float)
+    for score, category in neighbours:
+        if score >= CATEGORIZER_MIN_SIMILARITY:
+            weights[category] += score
+    category = max(weights, key=weights.get)
+    return category, weights[category] / sum(weights.values())
+
+async def categorize_many(descriptions: list, categories: list, user_id: str = None, k: int = CATEGORIZER_K) -> list:
+    """
+    Pick a category for each description without an LLM: vote among the
+    user's most similar past transactions, or among the seed phrases when
+    the user has no confident neighbours. Returns one
+    {"category", "confidence", "source"} per description; "category" is
+    None when nothing is confident enough (the caller asks Gemini then).
+    """
+    vectors = await generate_embeddings(descriptions)
+    valid = [index for index, vector in enumerate(vectors) if not isinstance(vector, Exception)]
+    results = [{"category": None, "confidence": 0.0, "source": None} for _ in descriptions]
+    if not valid:
+        return results
+    queries = [vectors[index] for index in valid]
+
+    user_matches = [[] for _ in valid]
+    if user_id:
+        try:
+            user_matches = await registry.search_many(user_id, queries, k * 2)
+        except Exception as e:
+            logger.warning({"event": "categorizer_user_index_failed", "user_id": user_id, "error": str(e)})
+
+    await seed_index.ensure(categories)
+    # Ambil lebih banyak kandidat: seed kategori yang tidak diminta dibuang saat voting
+    seed_matches = seed_index.index.search_many(queries, k * 4) if len(seed_index.index) else [[] for _ in valid]
+
+    for position, index in enumerate(valid):
+        category, confidence = vote(user_matches[position], categories, k)
+        source = "history"
+        if confidence < CATEGORIZER_MIN_CONFIDENCE:
+            category, confidence = vote(seed_matches[position], categories, k)
+            source = "seed"
+        if confidence >= CATEGORIZER_MIN_CONFIDENCE:
+            results[index] = {"category": category, "confidence": round(confidence, 3), "source": source}
+            metrics.increment(f"categorizer.{source}_hits")
+        else:
+            metrics.increment("categorizer.uncertain")
+    return results
+
+async def categorize(description: str, categories: list, user_id: str = None) -> dict:
+    return (await categorize_many([description], categories, user_id))[0]
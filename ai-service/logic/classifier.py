@@ -1,16 +1,15 @@
-from logic.gemini import call_gemini
-import base64
-import requests
-from config.config import GEMINI_API_KEYS
+from logic.gemini import call_gemini, build_vision_payload
+from logic import gemini_client
+from logic.key_scheduler import call_with_key
+from logic.intent_model import intent_model
+from config.config import INTENT_MODEL_MIN_CONFIDENCE
+from utils import metrics
+import httpx
 import logging
-import os
 
 logger = logging.getLogger(__name__)
 
-GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
-GEMINI_VISION_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
-
-def classify_message_intent(text: str) -> str:
+async def classify_message_intent(text: str) -> str:
     prompt = f"""
 Classify the following text:
 
@@ -37,7 +36,7 @@ Examples:
     logger.info(f"Classifying message: {text}")
     logger.info(f"Using prompt: {prompt}")
     
-    result = call_gemini(prompt).strip().upper()
+    result = (await call_gemini(prompt)).strip().upper()
     logger.info(f"Raw classification result: {result}")
     
     if result not in {"TRANSACTION", "CONSULTATION", "NONE"}:
@@ -48,10 +47,11 @@ Examples:
     return result
 
 
-def classify_intent(text: str) -> dict:
+async def classify_intent(text: str) -> dict:
     """
     Intent classifier with English-standard intent names.
-    Combines heuristics + LLM (Gemini).
+    Combines heuristics, the local trained model and, for low-confidence
+    messages only, the LLM (Gemini).
     """
     lowered = text.lower().strip()
     
@@ -61,8 +61,16 @@ def classify_intent(text: str) -> dict:
     elif "lihat" in lowered or "tampilkan" in lowered:
         return {"intent": "view_transaction", "confidence": 0.9}
 
+    # Model lokal (TF-IDF char n-gram), dilatih dari ai_dataset
+    intent, confidence = intent_model.predict(text)
+    if intent and confidence >= INTENT_MODEL_MIN_CONFIDENCE:
+        metrics.increment("intent_model.hits")
+        logger.info({"event": "intent_model_hit", "intent": intent, "confidence": confidence})
+        return {"intent": intent, "confidence": round(confidence, 3)}
+    metrics.increment("intent_model.fallbacks")
+
     # LLM fallback
-    label = classify_message_intent(text)  # TRANSACTION / CONSULTATION / NONE
+    label = await classify_message_intent(text)  # TRANSACTION / CONSULTATION / NONE
     mapping = {
         "TRANSACTION": ("add_transaction", 0.9),
         "CONSULTATION": ("consultation", 0.9),
@@ -72,20 +80,18 @@ def classify_intent(text: str) -> dict:
     return {"intent": intent, "confidence": confidence}
 
 
-def is_transaction(text: str) -> bool:
+async def is_transaction(text: str) -> bool:
     """
     Check if the text is a financial transaction.
     """
-    result = classify_message_intent(text)
+    result = await classify_message_intent(text)
     return result == "TRANSACTION"
 
 
-def is_transaction_image(image_bytes: bytes) -> bool:
+async def is_transaction_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> bool:
     """
     Check if the image is a receipt or transaction-related using Gemini Vision.
     """
-    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-    
     prompt = """Analyze this image and determine if it's a receipt or transaction-related document.
     Look for elements like:
     - Store or merchant name
@@ -97,50 +103,19 @@ def is_transaction_image(image_bytes: bytes) -> bool:
     Respond YES if it's a receipt/transaction, or NO otherwise.
     """
 
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "contents": [{
-            "parts": [
-                {"text": prompt},
-                {
-                    "inline_data": {
-                        "mime_type": "image/jpeg",
-                        "data": image_base64
-                    }
-                }
-            ]
-        }]
-    }
-
-    last_error = None
-    for api_key in GEMINI_API_KEYS:
-        try:
-            logger.info(f"Checking image with API key: {api_key[:8]}...")
-            response = requests.post(
-                f"{GEMINI_VISION_ENDPOINT}?key={api_key}",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            candidates = response.json().get("candidates", [])
-            if not candidates:
-                raise Exception("No response from Gemini Vision API")
-            result_text = candidates[0]["content"]["parts"][0]["text"].strip().upper()
-            return result_text == "YES"
-        except requests.exceptions.HTTPError as e:
-            last_error = e
-            if e.response.status_code in [429, 500, 503]:
-                logger.warning(f"API key {api_key[:8]} failed with status {e.response.status_code}, trying next...")
-                continue
-            else:
-                raise
-        except Exception as e:
-            last_error = e
-            logger.error(f"Unexpected error with API key {api_key[:8]}: {str(e)}")
-            continue
-
-    logger.error(f"All Gemini Vision API keys failed. Last error: {str(last_error)}")
-    return False
+    payload = build_vision_payload(prompt, image_bytes, mime_type)
+
+    async def _call(api_key: str) -> bool:
+        response_json = await gemini_client.generate_content(payload, api_key)
+        result_text = gemini_client.extract_text(response_json)
+        if result_text is None:
+            raise Exception("No response from Gemini Vision API")
+        return result_text.strip().upper() == "YES"
+
+    try:
+        return await call_with_key(_call, label="Gemini Vision")
+    except httpx.HTTPStatusError:
+        raise
+    except Exception as e:
+        logger.error(f"All Gemini Vision API keys failed. Last error: {str(e)}")
+        return False
@@ -1,29 +1,97 @@
+from datetime import date
+import logging
 from logic.gemini import call_gemini
+from logic.sql_templates import ROLLUP_TABLE, parse_question, builtin_sql, bound_params, validate_template, template_store
+from utils import metrics
 
-def generate_sql_from_question(user_question: str, user_id: str, now_date: str) -> str:
+logger = logging.getLogger(__name__)
+
+def _describe_params(params: dict) -> str:
+    lines = ["- :user_id (the current user)", f"- :type = '{params['type']}' (transaction type asked about)"]
+    if "start_date" in params:
+        lines.append(f"- :start_date = '{params['start_date']}' and :end_date = '{params['end_date']}' (inclusive period asked about)")
+    if "category" in params:
+        lines.append(f"- :category = '{params['category']}' (category asked about)")
+    if "keyword" in params:
+        lines.append(f"- :keyword = '{params['keyword']}' (ILIKE pattern for the description)")
+    return "\n".join(lines)
+
+ROLLUP_DESCRIPTION = """
+and a table called `transaction_monthly_rollups`, kept up to date from `transactions`, with one row per user, month, category and type:
+- user_id (string)
+- month (date, always the first day of the month)
+- category (string)
+- type (string, either 'expense' or 'income')
+- total_amount (numeric, SUM(amount) of those transactions)
+- tx_count (integer, number of those transactions)
+
+Prefer `transaction_monthly_rollups` when the question does not need
+individual transactions (descriptions, merchants); it is much faster.
+"""
+
+async def _generate_template(user_question: str, params: dict, now_date: str, whole_months: bool) -> str:
+    # Rollup hanya untuk periode bulan penuh: rentang hari harus membaca transactions
+    rollups = ROLLUP_DESCRIPTION if whole_months else ""
     prompt = f"""
 You are a financial assistant for users.
 
 You have access to a table called `transactions` with the following columns:
 - id (integer)
 - user_id (string)
-- date (YYYY-MM-DD)
+- transaction_date (date, YYYY-MM-DD)
 - category (string)
-- amount (integer)
+- amount (numeric)
 - type (string, either 'expense' or 'income')
+- description (string)
+- merchant (string, may be null)
+{rollups}
+Generate one valid PostgreSQL SELECT query to answer the following question.
+Today is {now_date}.
 
-Generate a valid SQL query to answer the following question.
+Use these bind parameters instead of literal values (never write the values themselves):
+{_describe_params(params)}
 
 Constraints:
-- Only show data for user_id = '{user_id}'
-- If the question says "this month", use date from '{now_date[:7]}-01' to '{now_date}'
+- Always filter with user_id = :user_id; when joining, filter every table with its own <alias>.user_id = :user_id
+- Use every bind parameter listed above and no others; never write dates or LIKE patterns as literals
 - Use SUM(amount) for total
-- If category mentioned (e.g. "makan", "alfamart"), include it in WHERE clause
 - If question is unclear, return "UNKNOWN"
 
 Question: "{user_question}"
 
 Only return the SQL query.
 """
-    result = call_gemini(prompt)
+    result = await call_gemini(prompt)
     return result.strip()
+
+async def generate_sql_from_question(user_question: str, user_id: str, now_date: str) -> tuple:
+    """
+    Return (sql, params) for the question. Known question shapes come from
+    templates; only a new shape costs an LLM call, after which its SQL is
+    reused. Returns ("UNKNOWN", {}) when no safe query can be made.
+    """
+    parsed = parse_question(user_question, date.fromisoformat(now_date))
+    params = {"user_id": user_id, **parsed["params"]}
+
+    if parsed["kind"]:
+        metrics.increment("sql_templates.builtin_hits")
+        sql = builtin_sql(parsed["kind"], params, parsed["whole_months"])
+        return sql, bound_params(sql, params)
+
+    sql = await template_store.get(parsed["shape"], parsed["whole_months"])
+    if sql is not None:
+        metrics.increment("sql_templates.learned_hits")
+        return sql, bound_params(sql, params)
+
+    metrics.increment("sql_templates.llm_calls")
+    generated = await _generate_template(user_question, params, now_date, parsed["whole_months"])
+    if "UNKNOWN" in generated.upper():
+        return "UNKNOWN", {}
+    sql = validate_template(generated, params) if user_id not in generated else None
+    if sql is not None and not parsed["whole_months"] and ROLLUP_TABLE in sql.lower():
+        sql = None
+    if sql is None:
+        logger.warning({"event": "sql_template_rejected", "question": user_question, "sql": generated})
+        return "UNKNOWN", {}
+    await template_store.learn(parsed["shape"], parsed["whole_months"], sql)
+    return sql, bound_params(sql, params)
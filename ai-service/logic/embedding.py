@@ -1,36 +1,128 @@
-import os
+from logic import gemini_client, embedding_cache
+from logic.key_scheduler import call_with_key
+from config.config import EMBEDDING_BATCH_CONCURRENCY
+from utils import metrics
+import asyncio
 import httpx
-from config.config import GEMINI_API_KEYS
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+async def get_embedding_vector(text: str) -> np.ndarray:
+    """Embedding as a float32 array; served from the embedding cache when possible."""
+    cached = await embedding_cache.get(text, gemini_client.EMBEDDING_MODEL)
+    if cached is not None:
+        return cached
+    vector = np.asarray(await _embed_one(text), dtype=np.float32)
+    await embedding_cache.set(text, vector, gemini_client.EMBEDDING_MODEL)
+    return vector
+
 async def generate_embedding(text: str) -> list:
-    last_error = None
-    for api_key in GEMINI_API_KEYS:
-        try:
-            url = (
-                "https://generativelanguage.googleapis.com/v1beta/models/embedding-001:embedContent"
-                f"?key={api_key}"
-            )
-            body = {
-                "content": {
-                    "parts": [{"text": text}]
-                }
+    return (await get_embedding_vector(text)).tolist()
+
+async def _embed_one(text: str) -> list:
+    body = {
+        "content": {
+            "parts": [{"text": text}]
+        }
+    }
+
+    async def _call(api_key: str) -> list:
+        response_json = await gemini_client.embed_content(body, api_key)
+        return response_json["embedding"]["values"]
+
+    return await call_with_key(_call, label="Gemini Embedding")
+
+async def _embed_chunk(texts: list) -> list:
+    body = {
+        "requests": [
+            {
+                "model": f"models/{gemini_client.EMBEDDING_MODEL}",
+                "content": {"parts": [{"text": text}]}
             }
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=body)
-                response.raise_for_status()
-                return response.json()["embedding"]["values"]
-        except Exception as e:
-            last_error = e
-            if "429" in str(e) or "500" in str(e) or "503" in str(e):
-                logger.warning(f"API key {api_key[:8]}... failed with error: {str(e)}, trying next key...")
-                continue
-            else:
-                logger.error(f"Unexpected error with API key {api_key[:8]}...: {str(e)}")
-                continue
-    
-    if last_error:
-        raise last_error
-    raise Exception("No valid API keys available")
+            for text in texts
+        ]
+    }
+
+    async def _call(api_key: str) -> list:
+        response_json = await gemini_client.batch_embed_contents(body, api_key)
+        embeddings = response_json.get("embeddings", [])
+        if len(embeddings) != len(texts):
+            raise Exception(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return [embedding["values"] for embedding in embeddings]
+
+    return await call_with_key(_call, label="Gemini Embedding")
+
+async def _embed_chunk_isolated(texts: list) -> list:
+    """
+    Embed one chunk; returns a vector or an Exception per text. A 400 rejects
+    the whole chunk, so split it in halves to isolate the bad item(s).
+    """
+    try:
+        return await _embed_chunk(texts)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 400 or len(texts) == 1:
+            return [e] * len(texts)
+        middle = len(texts) // 2
+        left, right = await asyncio.gather(
+            _embed_chunk_isolated(texts[:middle]),
+            _embed_chunk_isolated(texts[middle:])
+        )
+        return left + right
+    except Exception as e:
+        return [e] * len(texts)
+
+async def generate_embeddings(texts: list) -> list:
+    """
+    Embed many texts with `batchEmbedContents`: cached texts are served
+    locally, the rest go out in chunks of at most EMBEDDING_BATCH_LIMIT
+    that run concurrently (the key scheduler spreads them over the keys).
+    Returns a vector or an Exception per text, in input order.
+    """
+    results = [None] * len(texts)
+    valid = []
+    for index, text in enumerate(texts):
+        if isinstance(text, str) and text.strip():
+            valid.append(index)
+        else:
+            results[index] = ValueError("Text is required.")
+
+    pending = []
+    cached = await embedding_cache.get_many([texts[index] for index in valid], gemini_client.EMBEDDING_MODEL)
+    for index, vector in zip(valid, cached):
+        if vector is None:
+            pending.append(index)
+        else:
+            results[index] = vector.tolist()
+
+    chunks = [
+        pending[start:start + gemini_client.EMBEDDING_BATCH_LIMIT]
+        for start in range(0, len(pending), gemini_client.EMBEDDING_BATCH_LIMIT)
+    ]
+    semaphore = asyncio.Semaphore(EMBEDDING_BATCH_CONCURRENCY)
+
+    async def _run(indexes: list) -> None:
+        async with semaphore:
+            vectors = await _embed_chunk_isolated([texts[index] for index in indexes])
+        for index, vector in zip(indexes, vectors):
+            results[index] = vector
+
+    await asyncio.gather(*(_run(indexes) for indexes in chunks))
+    await embedding_cache.set_many(
+        [(texts[index], results[index]) for index in pending if not isinstance(results[index], Exception)],
+        gemini_client.EMBEDDING_MODEL
+    )
+
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    metrics.increment("embedding_batch.items", len(texts))
+    metrics.increment("embedding_batch.calls", len(chunks))
+    metrics.increment("embedding_batch.failed_items", failed)
+    logger.info({
+        "event": "batch_embeddings_generated",
+        "items": len(texts),
+        "cache_hits": len(valid) - len(pending),
+        "chunks": len(chunks),
+        "failed": failed
+    })
+    return results
@@ -0,0 +1,72 @@
+import hashlib
+import logging
+import re
+import numpy as np
+from config.config import EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_MAX_ITEMS, EMBEDDING_CACHE_TTL
+from utils import metrics
+from utils.lru import LRUCache
+from utils.redis_client import get_binary_redis
+
+logger = logging.getLogger(__name__)
+
+# Vektor disimpan sebagai float32 packed: 768 dimensi = 3 KB (list float Python ~18 KB)
+_memory = LRUCache("embedding_cache", EMBEDDING_CACHE_MAX_ITEMS, EMBEDDING_CACHE_TTL)
+
+def normalize_embedding_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+def cache_key(text: str, model: str) -> str:
+    digest = hashlib.sha1(normalize_embedding_text(text).encode("utf-8")).hexdigest()
+    return f"emb:{model}:{digest}"
+
+def pack(vector) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+def unpack(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype=np.float32)
+
+async def get_many(texts: list, model: str) -> list:
+    """Cached vectors (float32 arrays) for `texts`, None for each miss."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return [None] * len(texts)
+    keys = [cache_key(text, model) for text in texts]
+    found = [_memory.get(key) for key in keys]
+
+    missing = [index for index, raw in enumerate(found) if raw is None]
+    if missing:
+        try:
+            values = await get_binary_redis().mget([keys[index] for index in missing])
+        except Exception as e:
+            logger.warning({"event": "embedding_cache_get_failed", "error": str(e)})
+            values = [None] * len(missing)
+        for index, raw in zip(missing, values):
+            if raw is not None:
+                _memory.set(keys[index], raw)
+                found[index] = raw
+                metrics.increment("embedding_cache.redis_hits")
+
+    hits = sum(1 for raw in found if raw is not None)
+    metrics.increment("embedding_cache.hits", hits)
+    metrics.increment("embedding_cache.misses", len(texts) - hits)
+    return [None if raw is None else unpack(raw) for raw in found]
+
+async def get(text: str, model: str):
+    return (await get_many([text], model))[0]
+
+async def set_many(items: list, model: str) -> None:
+    """Cache (text, vector) pairs in memory and Redis."""
+    if not EMBEDDING_CACHE_ENABLED or not items:
+        return
+    packed = [(cache_key(text, model), pack(vector)) for text, vector in items]
+    for key, raw in packed:
+        _memory.set(key, raw)
+    try:
+        async with get_binary_redis().pipeline(transaction=False) as pipe:
+            for key, raw in packed:
+                pipe.set(key, raw, ex=EMBEDDING_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning({"event": "embedding_cache_set_failed", "error": str(e)})
+
+async def set(text: str, vector, model: str) -> None:
+    await set_many([(text, vector)], model)
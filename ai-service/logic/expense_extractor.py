@@ -1,5 +1,22 @@
-from logic.gemini import call_gemini
+from logic.structured_output import generate_structured
+from logic import text_cache
+from logic.rule_parser import parse_expense, is_single_expense
+from logic.categorizer import categorize
+from config.config import (
+    RULE_PARSER_ENABLED,
+    RULE_PARSER_MIN_CONFIDENCE,
+    CATEGORIZER_ENABLED,
+    TEXT_BATCH_PROMPT_TOKENS,
+    TEXT_BATCH_OUTPUT_TOKENS,
+    TEXT_BATCH_MAX_ITEMS_PER_PROMPT,
+    TEXT_BATCH_CONCURRENCY,
+    EXTRACT_MAX_OUTPUT_TOKENS
+)
+from models.extraction import DEFAULT_CATEGORIES, Expense, BatchExpense
+from utils import metrics
+from utils.tokens import estimate_tokens
 from datetime import datetime
+import asyncio
 import json
 import logging
 
@@ -7,13 +24,103 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def extract_expense_from_text(text: str, categories: list = None) -> dict:
+# Perkiraan token per item: kerangka JSON input ({"id": .., "text": ..}) dan output per transaksi
+BATCH_ITEM_OVERHEAD_TOKENS = 12
+BATCH_ITEM_OUTPUT_TOKENS = 60
+
+def _rule_fallback(rule_data: dict, confidence: float) -> dict:
+    # Gemini gagal (misal semua key kena rate limit): hasil parser lokal lebih baik dari amount 0
+    metrics.increment("rule_parser.fallbacks")
+    logger.info({
+        "event": "rule_parser_fallback",
+        "confidence": confidence,
+        "final_data": rule_data
+    })
+    return rule_data
+
+def _empty_expense(description: str, category: str = "Lainnya") -> dict:
+    return {
+        "amount": 0,
+        "category": category,
+        "description": description,
+        "date": datetime.now().strftime("%Y-%m-%d")
+    }
+
+def _complete_expense(expense: Expense, description: str) -> dict:
+    """
+    Turn a validated extraction into the response dict. Amount and category
+    are already checked by the model; a missing description or date gets a default.
+    """
+    data = expense.model_dump(include={"amount", "category", "description", "date"})
+    if not data["description"]:
+        logger.warning({
+            "event": "missing_description",
+            "data": data
+        })
+        data["description"] = description
+
+    if not data["date"]:
+        logger.warning({
+            "event": "missing_date",
+            "data": data
+        })
+        data["date"] = datetime.now().strftime("%Y-%m-%d")
+    return data
+
+async def _local_result(text: str, valid_categories: list, user_id: str = None):
+    """
+    Try the answers that need no Gemini call: the rule parser, then the cache.
+    Returns (result, rule_data, rule_confidence); `result` is None on a miss.
+    """
+    # Pesan sederhana ("makan siang 35rb") cukup diparse lokal, tanpa Gemini
+    rule_data, rule_confidence = parse_expense(text, valid_categories) if RULE_PARSER_ENABLED else (None, 0.0)
+    if rule_data and rule_confidence >= RULE_PARSER_MIN_CONFIDENCE:
+        metrics.increment("rule_parser.hits")
+        logger.info({
+            "event": "rule_parser_hit",
+            "confidence": rule_confidence,
+            "final_data": rule_data
+        })
+        return rule_data, rule_data, rule_confidence
+
+    # Nominal jelas tapi kategori belum: coba categorizer embedding sebelum Gemini.
+    # Pemasukan atau beberapa nominal tetap ke Gemini (kategori bukan satu-satunya keraguan)
+    if (CATEGORIZER_ENABLED and rule_data and rule_data["category"] == "Lainnya"
+            and is_single_expense(text)):
+        try:
+            categorized = await categorize(rule_data["description"], valid_categories, user_id)
+        except Exception as e:
+            logger.warning({"event": "categorizer_failed", "error": str(e)})
+            categorized = {"category": None}
+        if categorized["category"]:
+            data = {**rule_data, "category": categorized["category"]}
+            metrics.increment("rule_parser.hits")
+            logger.info({
+                "event": "rule_parser_categorizer_hit",
+                "confidence": categorized["confidence"],
+                "source": categorized["source"],
+                "final_data": data
+            })
+            return data, rule_data, rule_confidence
+    metrics.increment("rule_parser.misses")
+
+    # Pesan yang sering berulang ("bensin 50rb") tidak perlu ke Gemini lagi
+    cached = await text_cache.get(text, valid_categories)
+    if cached is not None:
+        logger.info({
+            "event": "text_cache_hit",
+            "final_data": cached
+        })
+    return cached, rule_data, rule_confidence
+
+async def extract_expense_from_text(text: str, categories: list = None, user_id: str = None) -> dict:
     """
-    Extract expense information from text input using Gemini.
+    Extract expense information from text input. Simple messages are
+    parsed locally; only low-confidence ones are sent to Gemini.
     Returns a dictionary containing expense details.
     """
     # Use provided categories or default ones
-    valid_categories = categories or ["Makanan", "Transportasi", "Belanja", "Tagihan", "Hiburan", "Kesehatan", "Pendidikan", "Lainnya"]
+    valid_categories = categories or DEFAULT_CATEGORIES
     
     logger.info({
         "event": "extract_expense_start",
@@ -21,98 +128,26 @@ def extract_expense_from_text(text: str, categories: list = None) -> dict:
         "provided_categories": categories,
         "valid_categories": valid_categories
     })
+
+    local, rule_data, rule_confidence = await _local_result(text, valid_categories, user_id)
+    if local is not None:
+        return local
     
-    prompt = f"""
-    Ekstrak informasi transaksi dari teks berikut dalam format JSON:
-    "{text}"
-
-    Format JSON yang diharapkan:
-    {{
-        "amount": <jumlah dalam angka>,
-        "category": <kategori pengeluaran>,
-        "description": <deskripsi singkat>,
-        "date": <tanggal dalam format YYYY-MM-DD jika ada, null jika tidak ada>
-    }}
-
-    Kategori yang tersedia: {', '.join(valid_categories)}
-    Jika kategori tidak cocok dengan yang tersedia, gunakan "Lainnya"
-    Return hanya JSON object, tidak ada teks lain.
-    """
-    
+    # Format JSON diatur responseSchema, prompt cukup menjelaskan tugasnya
+    prompt = f'Ekstrak transaksi dari pesan berikut. Pakai kategori "Lainnya" bila tidak ada yang cocok.\nPesan: "{text}"'
+
     try:
         logger.info({
             "event": "sending_to_gemini",
             "prompt_length": len(prompt),
             "valid_categories": valid_categories
         })
-        
-        result = call_gemini(prompt)
-        
-        logger.info({
-            "event": "gemini_response_received",
-            "raw_response": result,
-            "response_length": len(result)
-        })
-        
-        # Clean up response if needed
-        result = result.strip()
-        if result.startswith('```json'):
-            result = result[7:]
-        if result.endswith('```'):
-            result = result[:-3]
-        result = result.strip()
-        
-        logger.info({
-            "event": "cleaned_response",
-            "cleaned_response": result
-        })
-        
-        data = json.loads(result)
-        
-        logger.info({
-            "event": "json_parsed",
-            "parsed_data": data,
-            "category": data.get("category"),
-            "is_valid_category": data.get("category") in valid_categories
-        })
-        
-        # Validasi data
-        if not isinstance(data.get("amount"), (int, float)):
-            logger.warning({
-                "event": "invalid_amount",
-                "amount": data.get("amount"),
-                "type": type(data.get("amount")).__name__
-            })
-            data["amount"] = 0
-            
-        if not data.get("category"):
-            logger.warning({
-                "event": "missing_category",
-                "data": data
-            })
-            data["category"] = "Lainnya"
-        elif data.get("category") not in valid_categories:
-            logger.warning({
-                "event": "invalid_category",
-                "provided_category": data.get("category"),
-                "valid_categories": valid_categories
-            })
-            data["category"] = "Lainnya"
-            
-        if not data.get("description"):
-            logger.warning({
-                "event": "missing_description",
-                "data": data
-            })
-            data["description"] = text
-            
-        if not data.get("date"):
-            logger.warning({
-                "event": "missing_date",
-                "data": data
-            })
-            data["date"] = datetime.now().strftime("%Y-%m-%d")
-            
+
+        expense = await generate_structured(
+            [{"text": prompt}], Expense, EXTRACT_MAX_OUTPUT_TOKENS, categories=valid_categories
+        )
+        data = _complete_expense(expense, text)
+
         logger.info({
             "event": "final_data",
             "final_data": data,
@@ -121,22 +156,22 @@ def extract_expense_from_text(text: str, categories: list = None) -> dict:
             "has_description": bool(data["description"]),
             "has_date": bool(data["date"])
         })
-        
+
+        if data["amount"]:
+            await text_cache.set(text, valid_categories, data)
+
         return data
-        
-    except json.JSONDecodeError as e:
+
+    except ValueError as e:
+        # Output tidak lolos validasi model (mis. terpotong maxOutputTokens)
         logger.error({
-            "event": "json_decode_error",
+            "event": "invalid_response",
             "error": str(e),
-            "raw_result": result,
             "text": text
         })
-        return {
-            "amount": 0,
-            "category": "Lainnya",
-            "description": text,
-            "date": datetime.now().strftime("%Y-%m-%d")
-        }
+        if rule_data:
+            return _rule_fallback(rule_data, rule_confidence)
+        return _empty_expense(text)
     except Exception as e:
         logger.error({
             "event": "unexpected_error",
@@ -144,87 +179,134 @@ def extract_expense_from_text(text: str, categories: list = None) -> dict:
             "error_type": type(e).__name__,
             "text": text
         })
-        return {
-            "amount": 0,
-            "category": "Lainnya",
-            "description": text,
-            "date": datetime.now().strftime("%Y-%m-%d")
-        }
-
-def extract_expense_from_voice(voice_content: bytes, categories: list = None) -> dict:
+        if rule_data:
+            return _rule_fallback(rule_data, rule_confidence)
+        return _empty_expense(text)
+
+def pack_batches(texts: list, prompt_tokens: int, max_items: int) -> list:
+    """Group item indexes so each prompt stays under `prompt_tokens` and `max_items`."""
+    batches, current, used = [], [], 0
+    for index, text in enumerate(texts):
+        cost = estimate_tokens(text) + BATCH_ITEM_OVERHEAD_TOKENS
+        if current and (used + cost > prompt_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def _batch_prompt(items: list) -> str:
+    messages = json.dumps([{"id": item_id, "text": text} for item_id, text in items], ensure_ascii=False)
+    return (
+        "Ekstrak transaksi dari SETIAP pesan berikut, satu object per pesan dengan id yang sama. "
+        'Pakai kategori "Lainnya" bila tidak ada yang cocok.\n'
+        f"Pesan: {messages}"
+    )
+
+async def _extract_batch(texts: list, indexes: list, valid_categories: list, fallbacks: dict) -> dict:
+    """One Gemini call for a packed batch. Returns {index: ("success", data) | ("error", message)}."""
+    prompt = _batch_prompt([(index, texts[index]) for index in indexes])
+    try:
+        parsed = await generate_structured(
+            [{"text": prompt}], BatchExpense, len(indexes) * BATCH_ITEM_OUTPUT_TOKENS,
+            many=True, categories=valid_categories
+        )
+        by_id = {item.id: item for item in parsed}
+        error = "Message missing from Gemini response"
+    except Exception as e:
+        logger.error({
+            "event": "batch_extract_failed",
+            "error": str(e),
+            "error_type": type(e).__name__,
+            "batch_size": len(indexes)
+        })
+        by_id, error = {}, str(e)
+
+    results = {}
+    for index in indexes:
+        item = by_id.get(index)
+        if item is not None:
+            data = _complete_expense(item, texts[index])
+            if data["amount"]:
+                await text_cache.set(texts[index], valid_categories, data)
+            results[index] = ("success", data)
+        elif fallbacks.get(index):
+            results[index] = ("success", _rule_fallback(*fallbacks[index]))
+        else:
+            results[index] = ("error", error)
+    return results
+
+async def extract_expenses_from_texts(texts: list, categories: list = None, user_id: str = None) -> list:
+    """
+    Extract many messages at once. Messages answered by the rule parser or the
+    cache skip Gemini; the rest are packed into as few prompts as the token
+    budget allows and the prompts run concurrently. Returns one
+    ("success", data) or ("error", message) tuple per text, in input order.
     """
-    Extract expense information from voice message using Gemini.
+    valid_categories = categories or DEFAULT_CATEGORIES
+    results, pending, fallbacks = {}, [], {}
+
+    local_results = await asyncio.gather(*(_local_result(text, valid_categories, user_id) for text in texts))
+    for index, (local, rule_data, rule_confidence) in enumerate(local_results):
+        if local is not None:
+            results[index] = ("success", local)
+        else:
+            pending.append(index)
+            if rule_data:
+                fallbacks[index] = (rule_data, rule_confidence)
+
+    # Output juga dibatasi: ~60 token JSON per transaksi (maxOutputTokens per prompt)
+    max_items = min(TEXT_BATCH_MAX_ITEMS_PER_PROMPT, TEXT_BATCH_OUTPUT_TOKENS // BATCH_ITEM_OUTPUT_TOKENS)
+    batches = [
+        [pending[position] for position in batch]
+        for batch in pack_batches([texts[index] for index in pending], TEXT_BATCH_PROMPT_TOKENS, max_items)
+    ]
+    logger.info({
+        "event": "batch_extract_start",
+        "items": len(texts),
+        "local_hits": len(texts) - len(pending),
+        "prompts": len(batches)
+    })
+    metrics.increment("text_batch.items", len(texts))
+    metrics.increment("text_batch.prompts", len(batches))
+
+    semaphore = asyncio.Semaphore(TEXT_BATCH_CONCURRENCY)
+
+    async def _run(indexes):
+        async with semaphore:
+            return await _extract_batch(texts, indexes, valid_categories, fallbacks)
+
+    for batch_results in await asyncio.gather(*(_run(indexes) for indexes in batches)):
+        results.update(batch_results)
+    return [results[index] for index in range(len(texts))]
+
+async def extract_expense_from_voice(voice_content: str, categories: list = None) -> dict:
+    """
+    Extract expense information from a voice message transcript using Gemini.
     Returns a dictionary containing expense details.
     """
     # Use provided categories or default ones
-    valid_categories = categories or ["Makanan", "Transportasi", "Belanja", "Tagihan", "Hiburan", "Kesehatan", "Pendidikan", "Lainnya"]
-    
-    prompt = f"""
-    Ekstrak informasi transaksi dari pesan suara berikut dalam format JSON.
-    Transkripsi pesan suara: "{voice_content}"
-
-    Format JSON yang diharapkan:
-    {{
-        "amount": <jumlah dalam angka>,
-        "category": <kategori pengeluaran>,
-        "description": <deskripsi singkat>,
-        "date": <tanggal dalam format YYYY-MM-DD jika ada, null jika tidak ada>
-    }}
-
-    Kategori yang tersedia: {', '.join(valid_categories)}
-    Jika kategori tidak cocok dengan yang tersedia, gunakan "Lainnya"
-    Return hanya JSON object, tidak ada teks lain.
-    """
-    
+    valid_categories = categories or DEFAULT_CATEGORIES
+
+    prompt = (
+        'Ekstrak transaksi dari transkripsi pesan suara berikut. Pakai kategori "Lainnya" bila tidak ada yang cocok.\n'
+        f'Transkripsi: "{voice_content}"'
+    )
+
     try:
         logger.info(f"Sending voice prompt to Gemini")
-        result = call_gemini(prompt)
-        logger.info(f"Raw response from Gemini for voice: {result}")
-        
-        # Clean up response if needed
-        result = result.strip()
-        if result.startswith('```json'):
-            result = result[7:]
-        if result.endswith('```'):
-            result = result[:-3]
-        result = result.strip()
-        
-        logger.info(f"Cleaned voice response: {result}")
-        
-        data = json.loads(result)
-        logger.info(f"Parsed JSON data from voice: {data}")
-        
-        # Validasi data
-        if not isinstance(data.get("amount"), (int, float)):
-            logger.warning(f"Invalid amount format from voice: {data.get('amount')}")
-            data["amount"] = 0
-        if not data.get("category"):
-            logger.warning("Missing category in voice")
-            data["category"] = "uncategorized"
-        if not data.get("description"):
-            logger.warning("Missing description in voice")
-            data["description"] = "Transaksi dari pesan suara"
-        if not data.get("date"):
-            logger.warning("Missing date in voice")
-            data["date"] = datetime.now().strftime("%Y-%m-%d")
-            
+        expense = await generate_structured(
+            [{"text": prompt}], Expense, EXTRACT_MAX_OUTPUT_TOKENS, categories=valid_categories
+        )
+        data = _complete_expense(expense, "Transaksi dari pesan suara")
         logger.info(f"Final processed voice data: {data}")
         return data
-        
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error in voice: {str(e)}")
-        logger.error(f"Failed to parse voice response: {result}")
-        return {
-            "amount": 0,
-            "category": "uncategorized",
-            "description": "Transaksi dari pesan suara",
-            "date": datetime.now().strftime("%Y-%m-%d")
-        }
+
+    except ValueError as e:
+        logger.error(f"Invalid voice extraction response: {str(e)}")
+        return _empty_expense("Transaksi dari pesan suara", "uncategorized")
     except Exception as e:
         logger.error(f"Unexpected error in voice processing: {str(e)}")
-        return {
-            "amount": 0,
-            "category": "uncategorized",
-            "description": "Transaksi dari pesan suara",
-            "date": datetime.now().strftime("%Y-%m-%d")
-        } 
\ No newline at end of file
+        return _empty_expense("Transaksi dari pesan suara", "uncategorized")
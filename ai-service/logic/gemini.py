@@ -1,20 +1,17 @@
-import requests
-from config.config import GEMINI_API_KEYS
+from logic import gemini_client
+from logic.key_scheduler import call_with_key
+from logic.structured_output import generate_structured, stream_structured_items
+from logic.asr import whisper_model
+from models.extraction import DEFAULT_CATEGORIES, Receipt, FusedReceipt, ReceiptItem
+from config.config import RECEIPT_MAX_OUTPUT_TOKENS
+from datetime import datetime
 import base64
-import whisper
-import tempfile
-import os
 import logging
 import json
 
 logger = logging.getLogger(__name__)
-GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
-GEMINI_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
 
-def call_gemini_with_key(prompt: str, api_key: str) -> str:
-    headers = {
-        "Content-Type": "application/json"
-    }
+async def call_gemini_with_key(prompt: str, api_key: str) -> str:
     payload = {
         "contents": [
             {
@@ -22,244 +19,119 @@ def call_gemini_with_key(prompt: str, api_key: str) -> str:
             }
         ]
     }
-    response = requests.post(
-        f"{GEMINI_ENDPOINT}?key={api_key}",
-        headers=headers,
-        json=payload
-    )
-    response.raise_for_status()
-    candidates = response.json().get("candidates", [])
-    if not candidates:
+    response_json = await gemini_client.generate_content(payload, api_key)
+    text = gemini_client.extract_text(response_json)
+    if text is None:
         return "NONE"
-    return candidates[0]["content"]["parts"][0]["text"]
+    return text
 
-def call_gemini(prompt: str) -> str:
+async def call_gemini(prompt: str) -> str:
     """
-    Call Gemini API with fallback mechanism for multiple API keys.
-    Will try each API key in sequence until one succeeds.
+    Call Gemini API using the shared key scheduler.
+    Keys are picked by remaining quota; rate-limited keys are skipped.
     """
-    last_error = None
-    
-    for api_key in GEMINI_API_KEYS:
-        try:
-            logger.info(f"Attempting to call Gemini API with key: {api_key[:8]}...")
-            return call_gemini_with_key(prompt, api_key)
-        except requests.exceptions.HTTPError as e:
-            last_error = e
-            if e.response.status_code in [429, 500, 503]:  # Rate limit or server error
-                logger.warning(f"API key {api_key[:8]}... failed with status {e.response.status_code}, trying next key...")
-                continue
-            else:
-                raise  # Re-raise if it's not a rate limit or server error
-        except Exception as e:
-            last_error = e
-            logger.error(f"Unexpected error with API key {api_key[:8]}...: {str(e)}")
-            continue
-    
-    # If we get here, all API keys failed
-    error_msg = f"All Gemini API keys failed. Last error: {str(last_error)}"
-    logger.error(error_msg)
-    raise Exception(error_msg)
+    return await call_with_key(lambda api_key: call_gemini_with_key(prompt, api_key))
 
-def extract_expense_from_image(image_bytes: bytes) -> dict:
-    """
-    Extract expense information from receipt image using Gemini Vision API.
-    Returns a dictionary containing expense details.
-    """
+# Format JSON diatur responseSchema (models.extraction), prompt cukup menjelaskan tugasnya
+RECEIPT_PROMPT = (
+    "Extract the transactions from this receipt image: one object per purchased item, "
+    "amount in rupiah as a plain number, date as the receipt date."
+)
+
+FUSED_RECEIPT_PROMPT = (
+    "First decide whether this image is a receipt or transaction-related document "
+    "(store or merchant name, date, purchased items, total amount, payment method). "
+    "If it is not, set is_receipt to false and return no transactions. "
+    "If it is, set is_receipt to true and extract the transactions: one object per purchased item, "
+    "amount in rupiah as a plain number, date as the receipt date."
+)
+
+def vision_parts(prompt: str, image_bytes: bytes, mime_type: str = "image/jpeg") -> list:
     # Convert image bytes to base64
     image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-    
-    # Prepare the prompt for Gemini Vision
-    prompt = """Analyze this receipt image and extract the transaction information. Return the data in this exact JSON format:
-
-{
-    "transactions": [
+    return [
+        {"text": prompt},
         {
-            "amount": "total amount in numbers only (e.g. 50000)",
-            "category": "one of these categories: Makanan, Transportasi, Belanja, Tagihan, Hiburan, Kesehatan, Pendidikan, Lainnya",
-            "description": "brief description of items purchased",
-            "date": "transaction date in YYYY-MM-DD format"
+            "inline_data": {
+                "mime_type": mime_type,
+                "data": image_base64
+            }
         }
     ]
-}
 
-Rules:
-1. If there are multiple items in the receipt, create multiple transaction objects in the array
-2. For amount, use only numbers without currency symbol or commas
-3. For category, use only the predefined categories listed above
-4. For date, use YYYY-MM-DD format. If date is not found, use today's date
-5. Return only the JSON object, no other text or formatting
+def build_vision_payload(prompt: str, image_bytes: bytes, mime_type: str = "image/jpeg") -> dict:
+    return {"contents": [{"parts": vision_parts(prompt, image_bytes, mime_type)}]}
 
-Example response for a single transaction:
-{
-    "transactions": [
-        {
-            "amount": "50000",
-            "category": "Makanan",
-            "description": "Nasi Goreng + Es Teh",
-            "date": "2024-03-20"
-        }
-    ]
-}
+async def extract_expense_from_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> dict:
+    """
+    Extract expense information from receipt image using Gemini Vision API.
+    Returns a dictionary containing expense details.
+    """
+    receipt = await generate_structured(
+        vision_parts(RECEIPT_PROMPT, image_bytes, mime_type), Receipt, RECEIPT_MAX_OUTPUT_TOKENS,
+        categories=DEFAULT_CATEGORIES, label="Gemini Vision"
+    )
+    return receipt_result(receipt)
 
-Example response for multiple transactions:
-{
-    "transactions": [
-        {
-            "amount": "25000",
-            "category": "Makanan",
-            "description": "Nasi Goreng",
-            "date": "2024-03-20"
-        },
-        {
-            "amount": "15000",
-            "category": "Makanan",
-            "description": "Es Teh",
-            "date": "2024-03-20"
-        }
-    ]
-}"""
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "contents": [{
-            "parts": [
-                {"text": prompt},
-                {
-                    "inline_data": {
-                        "mime_type": "image/jpeg",
-                        "data": image_base64
-                    }
-                }
-            ]
-        }]
+async def extract_receipt_from_image(image_bytes: bytes, mime_type: str = "image/jpeg"):
+    """
+    Classify and extract a receipt in a single Gemini Vision call.
+    Returns None when the image is not a receipt, otherwise the same
+    result as `extract_expense_from_image`.
+    """
+    receipt = await generate_structured(
+        vision_parts(FUSED_RECEIPT_PROMPT, image_bytes, mime_type), FusedReceipt, RECEIPT_MAX_OUTPUT_TOKENS,
+        categories=DEFAULT_CATEGORIES, label="Gemini Vision"
+    )
+    if not receipt.is_receipt:
+        return None
+    return receipt_result(receipt)
+
+async def stream_receipt_items(image_bytes: bytes, mime_type: str = "image/jpeg", status: dict = None):
+    """
+    Fused receipt call over streamGenerateContent: yields (index, transaction)
+    (same dict as in `extract_receipt_from_image`) as soon as Gemini has
+    generated each item; `index` is the item's position on the receipt.
+    Yields nothing when the image is not a receipt. `status` receives
+    "is_receipt" and "dropped" (items that failed validation).
+    """
+    items = stream_structured_items(
+        vision_parts(FUSED_RECEIPT_PROMPT, image_bytes, mime_type), FusedReceipt, "transactions", ReceiptItem,
+        RECEIPT_MAX_OUTPUT_TOKENS, categories=DEFAULT_CATEGORIES, label="Gemini Vision",
+        gate="is_receipt", status=status
+    )
+    async for index, item in items:
+        yield index, receipt_item_result(item)
+
+def receipt_item_result(item: ReceiptItem) -> dict:
+    """Response dict of one receipt item (amount as a string, as /process_image always returned it)."""
+    return {
+        "amount": str(item.amount),
+        "category": item.category,
+        "description": item.description,
+        "date": item.date or datetime.now().strftime("%Y-%m-%d")
     }
-    
-    last_error = None
-    for api_key in GEMINI_API_KEYS:
-        try:
-            logger.info(f"Attempting to call Gemini Vision API with key: {api_key[:8]}...")
-            
-            # Log request payload (without image data for brevity)
-            logger.debug(f"Request payload: {json.dumps({**payload, 'contents': [{**payload['contents'][0], 'parts': [payload['contents'][0]['parts'][0]]}]})}")
-            
-            response = requests.post(
-                f"{GEMINI_ENDPOINT}?key={api_key}",
-                headers=headers,
-                json=payload
-            )
-            
-            # Log response status and headers
-            logger.info(f"Response status: {response.status_code}")
-            logger.info(f"Response headers: {dict(response.headers)}")
-            
-            # Log raw response text
-            response_text = response.text
-            logger.info(f"Raw response text: {response_text}")
-            
-            response.raise_for_status()
-            
-            # Try to parse JSON response
-            try:
-                response_json = response.json()
-                logger.info(f"Parsed JSON response: {json.dumps(response_json, indent=2)}")
-                
-                candidates = response_json.get("candidates", [])
-                if not candidates:
-                    raise Exception("No response from Gemini Vision API")
-                    
-                result_text = candidates[0]["content"]["parts"][0]["text"]
-                logger.info(f"Extracted text from response: {result_text}")
-                
-                # Clean up the response text - remove any markdown formatting
-                result_text = result_text.replace("```json", "").replace("```", "").strip()
-                
-                # Parse the JSON response
-                result = json.loads(result_text)
-                logger.info(f"Final parsed result: {json.dumps(result, indent=2)}")
-                
-                # Validate the result format
-                if not isinstance(result, dict) or "transactions" not in result:
-                    raise ValueError("Invalid response format: missing 'transactions' array")
-                
-                if not isinstance(result["transactions"], list):
-                    raise ValueError("Invalid response format: 'transactions' must be an array")
-                
-                # Validate each transaction
-                for transaction in result["transactions"]:
-                    if not isinstance(transaction, dict):
-                        raise ValueError("Invalid transaction format: must be an object")
-                    
-                    required_fields = ["amount", "category", "description", "date"]
-                    for field in required_fields:
-                        if field not in transaction:
-                            raise ValueError(f"Missing required field: {field}")
-                    
-                    # Validate category
-                    valid_categories = ["Makanan", "Transportasi", "Belanja", "Tagihan", "Hiburan", "Kesehatan", "Pendidikan", "Lainnya"]
-                    if transaction["category"] not in valid_categories:
-                        transaction["category"] = "Lainnya"
-                    
-                    # Clean amount - remove currency symbols and commas
-                    amount = str(transaction["amount"]).replace("Rp", "").replace(".", "").replace(",", "").strip()
-                    try:
-                        transaction["amount"] = str(int(float(amount)))
-                    except ValueError:
-                        raise ValueError(f"Invalid amount format: {transaction['amount']}")
-                
-                # If there's only one transaction, return it directly
-                if len(result["transactions"]) == 1:
-                    return result["transactions"][0]
-                
-                return result["transactions"]
-                
-            except json.JSONDecodeError as json_err:
-                logger.error(f"Failed to parse response as JSON: {str(json_err)}")
-                raise
-            
-        except requests.exceptions.HTTPError as e:
-            last_error = e
-            if e.response.status_code in [429, 500, 503]:  # Rate limit or server error
-                logger.warning(f"Vision API key {api_key[:8]}... failed with status {e.response.status_code}, trying next key...")
-                continue
-            else:
-                logger.error(f"HTTP error with key {api_key[:8]}...: {str(e)}")
-                logger.error(f"Response content: {e.response.text}")
-                raise  # Re-raise if it's not a rate limit or server error
-        except Exception as e:
-            last_error = e
-            logger.error(f"Unexpected error with Vision API key {api_key[:8]}...: {str(e)}")
-            continue
-    
-    # If we get here, all API keys failed
-    error_msg = f"All Gemini Vision API keys failed. Last error: {str(last_error)}"
-    logger.error(error_msg)
-    raise Exception(error_msg)
 
-def extract_expense_from_voice(voice_bytes: bytes) -> str:
+def receipt_result(receipt: Receipt):
     """
-    Convert voice recording to text using OpenAI Whisper.
+    A single transaction dict, or a list of transactions when the receipt
+    has more than one item.
+    """
+    transactions = [receipt_item_result(item) for item in receipt.transactions]
+    logger.info(f"Final parsed result: {json.dumps(transactions, indent=2)}")
+
+    # If there's only one transaction, return it directly
+    if len(transactions) == 1:
+        return transactions[0]
+
+    return transactions
+
+async def extract_expense_from_voice(voice_bytes: bytes) -> str:
+    """
+    Convert voice recording to text using the shared Whisper model.
     Returns the transcribed text.
     """
     try:
-        # Save voice bytes to temporary file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_file.write(voice_bytes)
-            temp_file_path = temp_file.name
-
-        # Load Whisper model
-        model = whisper.load_model("base")
-        
-        # Transcribe audio
-        result = model.transcribe(temp_file_path)
-        
-        # Clean up temporary file
-        os.unlink(temp_file_path)
-        
-        return result["text"]
-        
+        return await whisper_model.transcribe(voice_bytes)
     except Exception as e:
         raise Exception(f"Error processing voice recording: {str(e)}")
@@ -0,0 +1,119 @@
+import httpx
+import json
+import logging
+from config.config import (
+    GEMINI_MODEL,
+    GEMINI_HTTP_TIMEOUT,
+    GEMINI_MAX_CONNECTIONS,
+    GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+    GEMINI_KEEPALIVE_EXPIRY
+)
+
+logger = logging.getLogger(__name__)
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+EMBEDDING_MODEL = "embedding-001"
+EMBEDDING_BATCH_LIMIT = 100  # batas request per batchEmbedContents
+
+_client = None
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=GEMINI_BASE_URL,
+        http2=True,
+        timeout=httpx.Timeout(GEMINI_HTTP_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=GEMINI_MAX_CONNECTIONS,
+            max_keepalive_connections=GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=GEMINI_KEEPALIVE_EXPIRY
+        ),
+        headers={"Content-Type": "application/json"}
+    )
+
+async def startup() -> None:
+    """Create the shared Gemini HTTP client (dipanggil saat app startup)"""
+    global _client
+    if _client is None:
+        _client = _build_client()
+        logger.info({
+            "event": "gemini_client_started",
+            "max_connections": GEMINI_MAX_CONNECTIONS,
+            "max_keepalive_connections": GEMINI_MAX_KEEPALIVE_CONNECTIONS
+        })
+
+async def shutdown() -> None:
+    """Close the shared Gemini HTTP client (dipanggil saat app shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info({"event": "gemini_client_closed"})
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared client. Outside the app lifespan (script, test)
+    the client is created lazily on first use.
+    """
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+async def _post(path: str, payload: dict, api_key: str) -> dict:
+    # API key dikirim lewat header agar tidak ikut tercatat di log URL httpx
+    response = await get_client().post(
+        path,
+        json=payload,
+        headers={"x-goog-api-key": api_key}
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def generate_content(payload: dict, api_key: str, model: str = GEMINI_MODEL) -> dict:
+    """Call `generateContent` and return the raw JSON response."""
+    return await _post(f"/models/{model}:generateContent", payload, api_key)
+
+async def stream_generate_content(payload: dict, api_key: str, model: str = GEMINI_MODEL) -> httpx.Response:
+    """
+    Open `streamGenerateContent` (alt=sse) and return the streaming response
+    once the status is known, so quota errors surface here (key rotation)
+    and not halfway through the stream. Read it with `iter_stream_chunks`.
+    """
+    client = get_client()
+    request = client.build_request(
+        "POST",
+        f"/models/{model}:streamGenerateContent",
+        params={"alt": "sse"},
+        json=payload,
+        headers={"x-goog-api-key": api_key}
+    )
+    response = await client.send(request, stream=True)
+    if response.is_error:
+        await response.aread()
+        await response.aclose()
+        response.raise_for_status()
+    return response
+
+async def iter_stream_chunks(response: httpx.Response):
+    """Yield each partial GenerateContentResponse (JSON) of an SSE stream, then close it."""
+    try:
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                yield json.loads(line[len("data:"):])
+    finally:
+        await response.aclose()
+
+async def embed_content(payload: dict, api_key: str, model: str = EMBEDDING_MODEL) -> dict:
+    """Call `embedContent` and return the raw JSON response."""
+    return await _post(f"/models/{model}:embedContent", payload, api_key)
+
+async def batch_embed_contents(payload: dict, api_key: str, model: str = EMBEDDING_MODEL) -> dict:
+    """Call `batchEmbedContents` (max EMBEDDING_BATCH_LIMIT requests) and return the raw JSON response."""
+    return await _post(f"/models/{model}:batchEmbedContents", payload, api_key)
+
+def extract_text(response_json: dict):
+    """Return the text of the first candidate, or None when there is no candidate."""
+    candidates = response_json.get("candidates", [])
+    if not candidates:
+        return None
+    return candidates[0]["content"]["parts"][0]["text"]
@@ -0,0 +1,133 @@
+import io
+import logging
+from PIL import Image, ImageOps, UnidentifiedImageError
+from config.config import (
+    IMAGE_MAX_EDGE,
+    IMAGE_JPEG_QUALITY,
+    IMAGE_GRAYSCALE,
+    IMAGE_GRAYSCALE_MAX_SATURATION
+)
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Format yang diterima Gemini Vision apa adanya
+GEMINI_IMAGE_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+EXIF_ORIENTATION_TAG = 0x0112
+
+class PreparedImage:
+    """Image bytes ready for a vision call, plus what preprocessing did."""
+
+    def __init__(self, data: bytes, mime_type: str, original_size: int, width: int = None, height: int = None, grayscale: bool = False):
+        self.data = data
+        self.mime_type = mime_type
+        self.original_size = original_size
+        self.width = width
+        self.height = height
+        self.grayscale = grayscale
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - len(self.data)
+
+def sniff_mime_type(data: bytes):
+    """Detect the real image format from its magic bytes (None if unknown)."""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    if data[4:8] == b"ftyp":
+        brand = data[8:12]
+        if brand in (b"heic", b"heix", b"hevc", b"hevx"):
+            return "image/heic"
+        if brand in (b"mif1", b"msf1"):
+            return "image/heif"
+    return None
+
+def _is_mostly_gray(image: Image.Image) -> bool:
+    """Receipts are mostly black on white; a low mean saturation means color adds nothing."""
+    sample = image.convert("RGB").resize((64, 64))
+    saturation = sample.convert("HSV").getchannel("S")
+    histogram = saturation.histogram()
+    mean = sum(value * count for value, count in enumerate(histogram)) / (64 * 64)
+    return mean <= IMAGE_GRAYSCALE_MAX_SATURATION
+
+def _flatten(image: Image.Image) -> Image.Image:
+    # JPEG tidak punya alpha channel: tempel di atas background putih
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    if image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+def prepare_image(image_bytes: bytes) -> PreparedImage:
+    """
+    Prepare an uploaded image for Gemini Vision: fix EXIF orientation,
+    downscale to IMAGE_MAX_EDGE, convert to grayscale when it is
+    (almost) colorless and re-encode as JPEG. The original bytes are
+    kept when re-encoding would not make them smaller.
+    """
+    original_size = len(image_bytes)
+    sniffed = sniff_mime_type(image_bytes)
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        # Misal HEIC tanpa plugin: kirim apa adanya dengan MIME yang benar
+        logger.warning({
+            "event": "image_preprocess_skipped",
+            "mime_type": sniffed,
+            "error": str(e)
+        })
+        return PreparedImage(image_bytes, sniffed or "image/jpeg", original_size)
+
+    changed = False
+    if image.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+        changed = True
+
+    if max(image.size) > IMAGE_MAX_EDGE:
+        image.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.LANCZOS)
+        changed = True
+
+    image = _flatten(image)
+    grayscale = image.mode == "L"
+    if not grayscale and (IMAGE_GRAYSCALE == "always" or (IMAGE_GRAYSCALE == "auto" and _is_mostly_gray(image))):
+        image = image.convert("L")
+        grayscale = True
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    encoded = buffer.getvalue()
+
+    if not changed and len(encoded) >= original_size and sniffed in GEMINI_IMAGE_MIME_TYPES:
+        prepared = PreparedImage(image_bytes, sniffed, original_size, image.width, image.height)
+    else:
+        prepared = PreparedImage(encoded, "image/jpeg", original_size, image.width, image.height, grayscale)
+
+    metrics.increment("image_preprocess.requests")
+    metrics.increment("image_preprocess.bytes_in", original_size)
+    metrics.increment("image_preprocess.bytes_out", len(prepared.data))
+    metrics.increment("image_preprocess.bytes_saved", prepared.bytes_saved)
+    logger.info({
+        "event": "image_preprocessed",
+        "original_mime_type": sniffed,
+        "mime_type": prepared.mime_type,
+        "original_size": original_size,
+        "size": len(prepared.data),
+        "bytes_saved": prepared.bytes_saved,
+        "width": prepared.width,
+        "height": prepared.height,
+        "grayscale": prepared.grayscale
+    })
+    return prepared
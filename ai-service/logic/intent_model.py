@@ -0,0 +1,177 @@
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+import numpy as np
+from config.config import INTENT_MODEL_PATH, INTENT_MODEL_MIN_SAMPLES
+from logic.text_normalize import normalize_text
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+INTENTS = {"add_transaction", "consultation", "delete_transaction", "view_transaction", "unknown"}
+
+# Label dari dataset (bisa Indonesia / label LLM lama) -> nama intent standar
+INTENT_ALIASES = {
+    "transaction": "add_transaction",
+    "tambah_transaksi": "add_transaction",
+    "catat_transaksi": "add_transaction",
+    "transaksi": "add_transaction",
+    "consult": "consultation",
+    "konsultasi": "consultation",
+    "hapus_transaksi": "delete_transaction",
+    "delete": "delete_transaction",
+    "lihat_transaksi": "view_transaction",
+    "view": "view_transaction",
+    "none": "unknown",
+    "lainnya": "unknown",
+}
+
+def canonical_intent(label):
+    """Map a dataset label to a standard intent name, or None if unknown."""
+    if not label:
+        return None
+    key = str(label).strip().lower().replace(" ", "_").replace("-", "_")
+    key = INTENT_ALIASES.get(key, key)
+    return key if key in INTENTS else None
+
+def training_examples(rows) -> tuple:
+    """(texts, intents) from `ai_dataset` rows with type='intent' (label or json_data["intent"])."""
+    texts, intents = [], []
+    for row in rows:
+        label = row.label or (row.json_data or {}).get("intent")
+        intent = canonical_intent(label)
+        if intent and row.input and row.input.strip():
+            texts.append(row.input)
+            intents.append(intent)
+    return texts, intents
+
+
+class _CompiledModel:
+    """
+    Fitted vectorizer + classifier flattened to plain arrays. Scoring one
+    message this way takes tens of microseconds; sklearn's own
+    transform/predict_proba needs ~1 ms because of per-call validation.
+    """
+
+    def __init__(self, vectorizer, classifier):
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = vectorizer.vocabulary_
+        self.idf = vectorizer.idf_
+        self.sublinear_tf = vectorizer.sublinear_tf
+        self.weights = np.ascontiguousarray(classifier.coef_.T)
+        self.intercept = classifier.intercept_
+        self.classes = list(classifier.classes_)
+
+    def predict(self, text: str):
+        counts = {}
+        for gram in self.analyzer(text):
+            column = self.vocabulary.get(gram)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+
+        scores = self.intercept.copy()
+        if counts:
+            columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            if self.sublinear_tf:
+                tf = 1 + np.log(tf)
+            values = tf * self.idf[columns]
+            values /= np.linalg.norm(values)
+            scores = scores + values @ self.weights[columns]
+
+        if len(self.classes) == 2:
+            # Biner: satu skor untuk kelas kedua
+            positive = 1 / (1 + np.exp(-scores[0]))
+            probabilities = np.array([1 - positive, positive])
+        else:
+            exp = np.exp(scores - scores.max())
+            probabilities = exp / exp.sum()
+        best = int(probabilities.argmax())
+        return self.classes[best], float(probabilities[best])
+
+
+class IntentModel:
+    """
+    Character n-gram TF-IDF + logistic regression over normalized messages.
+    Char n-grams cope with typos and slang ("tmpilkan", "bli kopi") without a tokenizer.
+    """
+
+    def __init__(self, path: str = INTENT_MODEL_PATH):
+        self.path = path
+        self._compiled = None
+        self._info = {}
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._compiled is not None
+
+    @property
+    def info(self) -> dict:
+        return dict(self._info)
+
+    def load(self) -> bool:
+        """Load the persisted model. Returns False when no model has been trained yet."""
+        if not os.path.exists(self.path):
+            logger.info({"event": "intent_model_missing", "path": self.path})
+            return False
+        import joblib
+        try:
+            saved = joblib.load(self.path)
+        except Exception as e:
+            logger.error({"event": "intent_model_load_failed", "path": self.path, "error": str(e)})
+            return False
+        self._compiled = _CompiledModel(saved["vectorizer"], saved["classifier"])
+        self._info = saved["info"]
+        logger.info({"event": "intent_model_loaded", "path": self.path, **self._info})
+        return True
+
+    def train(self, texts: list, intents: list, save: bool = True) -> dict:
+        """Fit a new model and swap it in. Raises ValueError when there is too little data."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        counts = Counter(intents)
+        if len(texts) < INTENT_MODEL_MIN_SAMPLES or len(counts) < 2:
+            raise ValueError(
+                f"Need at least {INTENT_MODEL_MIN_SAMPLES} labelled examples over 2+ intents, "
+                f"got {len(texts)} over {len(counts)}"
+            )
+
+        start = time.perf_counter()
+        vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True, min_df=1)
+        features = vectorizer.fit_transform([normalize_text(text) for text in texts])
+        classifier = LogisticRegression(max_iter=1000, C=10.0, class_weight="balanced")
+        classifier.fit(features, intents)
+        info = {
+            "samples": len(texts),
+            "intents": dict(counts),
+            "trained_at": datetime.utcnow().isoformat(),
+            "train_seconds": round(time.perf_counter() - start, 3)
+        }
+
+        if save:
+            import joblib
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            joblib.dump({"vectorizer": vectorizer, "classifier": classifier, "info": info}, tmp_path)
+            os.replace(tmp_path, self.path)
+
+        # Swap sekaligus: request yang sedang berjalan tetap memakai model lama
+        self._compiled, self._info = _CompiledModel(vectorizer, classifier), info
+        logger.info({"event": "intent_model_trained", "path": self.path, **info})
+        return info
+
+    def predict(self, text: str):
+        """Return (intent, confidence), or (None, 0.0) when no model is loaded."""
+        compiled = self._compiled
+        if compiled is None:
+            return None, 0.0
+        start = time.perf_counter()
+        intent, confidence = compiled.predict(normalize_text(text))
+        metrics.observe("intent_model.predict_ms", (time.perf_counter() - start) * 1000)
+        return intent, confidence
+
+
+intent_model = IntentModel()
@@ -0,0 +1,65 @@
+"""
+Incremental JSON parsing for streamed Gemini output.
+
+JsonArrayItems is fed the text chunks of a JSON document as they arrive and
+returns every object of the array under `key` as soon as its closing brace
+is seen, e.g. each entry of {"is_receipt": true, "transactions": [...]}
+while the rest of the receipt is still being generated.
+"""
+import json
+import re
+
+
+class JsonArrayItems:
+    def __init__(self, key: str):
+        self._array = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self.buffer = ""
+        self.position = None  # indeks karakter berikutnya yang belum dipindai
+        self.depth = 0  # kedalaman di dalam array (0 = di antara item)
+        self.item_start = None
+        self.in_string = False
+        self.escaped = False
+        self.finished = False  # "]" penutup array sudah terbaca
+
+    def value(self, key: str):
+        """
+        Scalar (true/false/null/number) of `key` once it has been streamed,
+        else None; e.g. "is_receipt" before or after the array.
+        """
+        match = re.search(r'"%s"\s*:\s*(true|false|null|-?\d+(?:\.\d+)?)\s*[,}]' % re.escape(key), self.buffer)
+        return json.loads(match.group(1)) if match else None
+
+    def feed(self, text: str) -> list:
+        """Add a chunk of text; returns the items completed by it (parsed JSON)."""
+        self.buffer += text
+        if self.position is None:
+            match = self._array.search(self.buffer)
+            if match is None:
+                return []
+            self.position = match.end()
+
+        items = []
+        while self.position < len(self.buffer) and not self.finished:
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                if self.depth == 0:
+                    self.item_start = self.position
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 0:
+                    self.finished = True
+                else:
+                    self.depth -= 1
+                    if self.depth == 0:
+                        items.append(json.loads(self.buffer[self.item_start:self.position + 1]))
+            self.position += 1
+        return items
@@ -0,0 +1,285 @@
+import asyncio
+import email.utils
+import httpx
+import logging
+import re
+import time
+from config.config import (
+    GEMINI_API_KEYS,
+    GEMINI_KEY_RPM,
+    GEMINI_KEY_BURST,
+    GEMINI_KEY_COOLDOWN_SECONDS,
+    GEMINI_KEY_FAILURE_THRESHOLD,
+    GEMINI_KEY_DISABLE_SECONDS,
+    GEMINI_KEY_ACQUIRE_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+# Status yang menandakan masalah di sisi key/kuota, bukan di request kita
+KEY_FAILURE_STATUSES = {401, 403, 429, 500, 503}
+
+
+class NoAvailableKeyError(Exception):
+    """Raised when no API key becomes available within the acquire timeout."""
+
+
+class TokenBucket:
+    """Simple token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float, now: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available."""
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> bool:
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class KeyState:
+    """Live state of a single API key."""
+
+    def __init__(self, api_key: str, bucket: TokenBucket):
+        self.api_key = api_key
+        self.bucket = bucket
+        self.cooldown_until = 0.0
+        self.disabled_until = 0.0
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.last_status = None
+        self.last_used_at = 0.0
+
+    @property
+    def label(self) -> str:
+        return f"{self.api_key[:8]}..."
+
+    def blocked_until(self) -> float:
+        return max(self.cooldown_until, self.disabled_until)
+
+
+class KeyScheduler:
+    """
+    Spread Gemini calls over all API keys.
+
+    Every key has its own token bucket. A 429 puts the key on cooldown
+    (honouring `Retry-After`), and a key that keeps failing is disabled
+    for a while before it gets a single probe request again.
+    """
+
+    def __init__(
+        self,
+        api_keys: list,
+        rate_per_minute: float = GEMINI_KEY_RPM,
+        burst: float = GEMINI_KEY_BURST,
+        cooldown_seconds: float = GEMINI_KEY_COOLDOWN_SECONDS,
+        failure_threshold: int = GEMINI_KEY_FAILURE_THRESHOLD,
+        disable_seconds: float = GEMINI_KEY_DISABLE_SECONDS,
+        clock=time.monotonic
+    ):
+        self.clock = clock
+        self.cooldown_seconds = cooldown_seconds
+        self.failure_threshold = failure_threshold
+        self.disable_seconds = disable_seconds
+        now = clock()
+        self.keys = {
+            key: KeyState(key, TokenBucket(rate_per_minute, burst, now))
+            for key in api_keys
+        }
+
+    def _pick(self, now: float):
+        """Return the available key with the most tokens left, or None."""
+        candidates = [
+            state for state in self.keys.values()
+            if state.blocked_until() <= now and state.bucket.wait_time(now) == 0.0
+        ]
+        if not candidates:
+            return None
+        # Token terbanyak dulu, lalu yang paling lama tidak dipakai
+        return max(candidates, key=lambda s: (s.bucket.tokens, -s.last_used_at))
+
+    def _next_ready_in(self, now: float) -> float:
+        waits = [
+            max(state.blocked_until() - now, state.bucket.wait_time(now))
+            for state in self.keys.values()
+        ]
+        return max(0.0, min(waits))
+
+    async def acquire(self, timeout: float = GEMINI_KEY_ACQUIRE_TIMEOUT) -> str:
+        """Wait for a key with quota left and reserve one request on it."""
+        if not self.keys:
+            raise NoAvailableKeyError("No Gemini API keys configured")
+
+        deadline = self.clock() + timeout
+        while True:
+            now = self.clock()
+            state = self._pick(now)
+            if state is not None:
+                state.bucket.take(now)
+                state.in_flight += 1
+                state.total_requests += 1
+                state.last_used_at = now
+                return state.api_key
+
+            wait = self._next_ready_in(now)
+            if now + wait > deadline:
+                raise NoAvailableKeyError(
+                    f"No Gemini API key available within {timeout:.0f}s"
+                )
+            await asyncio.sleep(max(wait, 0.01))
+
+    def report_success(self, api_key: str) -> None:
+        state = self.keys.get(api_key)
+        if state is None:
+            return
+        state.in_flight = max(0, state.in_flight - 1)
+        state.consecutive_failures = 0
+        state.disabled_until = 0.0
+        state.last_status = 200
+
+    def report_failure(self, api_key: str, status_code: int = None, retry_after: float = None) -> None:
+        state = self.keys.get(api_key)
+        if state is None:
+            return
+        now = self.clock()
+        state.in_flight = max(0, state.in_flight - 1)
+        state.consecutive_failures += 1
+        state.total_failures += 1
+        state.last_status = status_code
+
+        if status_code == 429:
+            cooldown = retry_after if retry_after is not None else self.cooldown_seconds
+            state.cooldown_until = max(state.cooldown_until, now + cooldown)
+            logger.warning({
+                "event": "gemini_key_cooldown",
+                "key": state.label,
+                "cooldown_seconds": cooldown
+            })
+
+        if state.consecutive_failures >= self.failure_threshold:
+            state.disabled_until = now + self.disable_seconds
+            logger.error({
+                "event": "gemini_key_disabled",
+                "key": state.label,
+                "consecutive_failures": state.consecutive_failures,
+                "disabled_seconds": self.disable_seconds
+            })
+
+    def snapshot(self) -> list:
+        """Return the live state of every key (API key is masked)."""
+        now = self.clock()
+        result = []
+        for state in self.keys.values():
+            state.bucket.refill(now)
+            if state.disabled_until > now:
+                status = "disabled"
+            elif state.cooldown_until > now:
+                status = "cooldown"
+            else:
+                status = "active"
+            result.append({
+                "key": state.label,
+                "status": status,
+                "tokens": round(state.bucket.tokens, 2),
+                "cooldown_remaining": round(max(0.0, state.cooldown_until - now), 1),
+                "disabled_remaining": round(max(0.0, state.disabled_until - now), 1),
+                "consecutive_failures": state.consecutive_failures,
+                "in_flight": state.in_flight,
+                "total_requests": state.total_requests,
+                "total_failures": state.total_failures,
+                "last_status": state.last_status
+            })
+        return result
+
+
+def parse_retry_after(response: httpx.Response):
+    """
+    Read the retry delay from a 429 response: the `Retry-After` header
+    (seconds or HTTP date) or Gemini's `RetryInfo.retryDelay` ("32s").
+    """
+    header = response.headers.get("retry-after")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                parsed = email.utils.parsedate_to_datetime(header)
+            except (TypeError, ValueError):
+                parsed = None  # header rusak: pakai retryDelay atau cooldown default
+            if parsed is not None:
+                return max(0.0, parsed.timestamp() - time.time())
+
+    try:
+        details = response.json().get("error", {}).get("details", [])
+    except Exception:
+        return None
+    for detail in details:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if delay:
+            match = re.match(r"^([\d.]+)s$", delay)
+            if match:
+                return float(match.group(1))
+    return None
+
+
+scheduler = KeyScheduler(GEMINI_API_KEYS)
+
+
+async def call_with_key(call, label: str = "Gemini"):
+    """
+    Run `await call(api_key)` with a key from the shared scheduler.
+    Quota and server errors move on to the next available key; other
+    HTTP errors are raised straight away.
+    """
+    last_error = None
+    for _ in range(max(1, len(scheduler.keys))):
+        api_key = await scheduler.acquire()
+        try:
+            logger.info(f"Calling {label} API with key: {api_key[:8]}...")
+            result = await call(api_key)
+        except httpx.HTTPStatusError as e:
+            last_error = e
+            status = e.response.status_code
+            if status in KEY_FAILURE_STATUSES:
+                scheduler.report_failure(api_key, status, parse_retry_after(e.response))
+                logger.warning(f"{label} API key {api_key[:8]}... failed with status {status}, trying next key...")
+                continue
+            # Request-nya yang salah, bukan key-nya
+            scheduler.report_success(api_key)
+            logger.error(f"HTTP error with key {api_key[:8]}...: {str(e)}")
+            logger.error(f"Response content: {e.response.text}")
+            raise
+        except httpx.TransportError as e:
+            last_error = e
+            scheduler.report_failure(api_key)
+            logger.warning(f"{label} API key {api_key[:8]}... transport error: {str(e)}, trying next key...")
+            continue
+        except Exception as e:
+            last_error = e
+            scheduler.report_success(api_key)
+            logger.error(f"Unexpected error with {label} API key {api_key[:8]}...: {str(e)}")
+            continue
+        scheduler.report_success(api_key)
+        return result
+
+    error_msg = f"All {label} API keys failed. Last error: {str(last_error)}"
+    logger.error(error_msg)
+    raise Exception(error_msg)
@@ -0,0 +1,157 @@
+import re
+from datetime import date
+from logic.text_normalize import normalize_text, date_spans, parse_absolute_date, resolve_relative_date, RELATIVE_DAYS
+
+# Kata kunci -> kategori default. Hanya dipakai kalau kategorinya ada di daftar kategori user.
+CATEGORY_KEYWORDS = {
+    "makanan": [
+        "makan", "sarapan", "makan siang", "makan malam", "nasi", "kopi", "teh", "minum", "jajan",
+        "bakso", "mie", "mi ayam", "ayam", "sate", "soto", "gorengan", "martabak", "warteg", "roti",
+        "snack", "cemilan", "boba", "pizza", "burger", "kfc", "mcd", "starbucks", "gofood",
+        "grabfood", "shopeefood", "resto", "restoran", "cafe", "kafe", "air mineral", "galon"
+    ],
+    "transportasi": [
+        "bensin", "pertalite", "pertamax", "solar", "parkir", "tol", "ojek", "ojol", "gojek", "goride",
+        "grab", "grabbike", "gocar", "grabcar", "taksi", "taxi", "angkot", "bus", "busway",
+        "transjakarta", "kereta", "krl", "mrt", "lrt", "tiket pesawat", "servis motor", "servis mobil"
+    ],
+    "belanja": [
+        "belanja", "indomaret", "alfamart", "supermarket", "minimarket", "pasar", "sembako", "baju",
+        "celana", "sepatu", "tas", "sabun", "sampo", "shopee", "tokopedia", "lazada", "skincare"
+    ],
+    "tagihan": [
+        "tagihan", "listrik", "pln", "token listrik", "pdam", "tagihan air", "bayar air", "internet",
+        "wifi", "indihome", "pulsa", "kuota", "paket data", "bpjs", "cicilan", "kos", "kost", "kontrakan",
+        "sewa", "asuransi", "iuran"
+    ],
+    "hiburan": [
+        "nonton", "bioskop", "film", "netflix", "spotify", "youtube premium", "game", "karaoke",
+        "konser", "liburan", "wisata", "rekreasi", "hiburan"
+    ],
+    "kesehatan": [
+        "obat", "dokter", "apotek", "apotik", "rumah sakit", "klinik", "puskesmas", "vitamin",
+        "periksa", "dokter gigi", "masker", "kesehatan"
+    ],
+    "pendidikan": [
+        "buku", "kursus", "les", "sekolah", "kuliah", "spp", "ukt", "seminar", "pelatihan",
+        "alat tulis", "fotokopi", "pendidikan"
+    ],
+}
+
+# Pesan seperti ini bukan pengeluaran sederhana: serahkan ke LLM
+INCOME_WORDS = ["gaji", "terima", "diterima", "dapat", "dapet", "pemasukan", "bonus", "transfer masuk", "refund"]
+QUESTION_WORDS = ["berapa", "kapan", "apa", "gimana", "bagaimana"]
+FILLER_WORDS = ["tgl", "tanggal", "seharga", "sebesar", "harganya", "harga", "total", "habis", "senilai"]
+
+_AMOUNT = re.compile(r"(?<![\w.])(\d+(?:\.\d+)?)(rb|jt)?(?![\w.])")
+_RAW_AMOUNT = re.compile(
+    r"\brp\.?\s*\d+(?:[.,]\d+)*(?:\s*(?:ribu|rb|k|juta|jt))?\b"
+    r"|\b\d+(?:[.,]\d+)*\s*(?:ribu|rb|k|juta|jt)\b"
+    r"|\b\d{1,3}(?:[.,]\d{3})+\b"  # ribuan bertitik: 15.500, 1.000.000
+    r"|\b\d{3,}(?:[.,]\d+)*\b"
+)
+_MULTIPLIERS = {None: 1, "rb": 1_000, "jt": 1_000_000}
+
+# Bobot confidence dari kategori yang cocok (sisanya dari nominal dan deskripsi)
+CATEGORY_CONFIDENCE = 0.35
+
+# Angka tanpa satuan di bawah ini kemungkinan jumlah barang ("2 porsi"), bukan nominal
+MIN_PLAIN_AMOUNT = 100
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(rf"\b{re.escape(phrase)}\b", text) is not None
+
+def _blank_spans(text: str, spans: list) -> str:
+    chars = list(text)
+    for start, end in spans:
+        chars[start:end] = " " * (end - start)
+    return "".join(chars)
+
+def parse_amounts(text: str) -> list:
+    """All rupiah amounts in the message ("35rb", "1,2jt", "Rp 25.000", "50000"), dates excluded."""
+    without_dates = _blank_spans(text.lower(), date_spans(text))
+    amounts = []
+    for match in _AMOUNT.finditer(normalize_text(without_dates)):
+        number, unit = match.group(1), match.group(2)
+        value = float(number) * _MULTIPLIERS[unit]
+        if unit is None and ("." in number or value < MIN_PLAIN_AMOUNT):
+            continue
+        amounts.append(int(round(value)))
+    return amounts
+
+def match_category(text: str, categories: list):
+    """
+    Pick a category from `categories` by keywords. Returns (category, unique):
+    `category` is None when nothing matches, `unique` is False on a tie.
+    """
+    normalized = normalize_text(text)
+    scores = {}
+    for category in categories:
+        name = category.lower()
+        if name == "lainnya":
+            continue
+        # Nama kategori yang disebut langsung (termasuk kategori custom user) paling kuat
+        score = 2 if _contains(normalized, name) else 0
+        score += sum(1 for keyword in CATEGORY_KEYWORDS.get(name, []) if _contains(normalized, keyword))
+        if score:
+            scores[category] = score
+    if not scores:
+        return None, True
+    best = max(scores.values())
+    winners = [category for category, score in scores.items() if score == best]
+    return winners[0], len(winners) == 1
+
+def _description(text: str) -> str:
+    lowered = _blank_spans(text.lower(), date_spans(text))
+    lowered = _RAW_AMOUNT.sub(" ", lowered)
+    for phrase, _ in RELATIVE_DAYS:
+        lowered = re.sub(rf"\b{phrase}\b", " ", lowered)
+    for word in FILLER_WORDS:
+        lowered = re.sub(rf"\b{word}\b", " ", lowered)
+    lowered = re.sub(r"\s+", " ", re.sub(r"[^\w\s/&-]", " ", lowered)).strip()
+    return lowered[:1].upper() + lowered[1:]
+
+def is_single_expense(text: str) -> bool:
+    """Exactly one amount and no income word: a plain expense whose only open question may be the category."""
+    lowered = text.lower()
+    return len(parse_amounts(text)) == 1 and not any(_contains(lowered, word) for word in INCOME_WORDS)
+
+def parse_expense(text: str, categories: list, today: date = None):
+    """
+    Deterministic parser for simple expense messages ("makan siang 35rb",
+    "bayar listrik 1,2jt kemarin"). Returns (data, confidence); `data` is
+    None when no amount is found. Only a single amount with a clearly
+    matching category gets a high confidence.
+    """
+    lowered = text.lower()
+    if "?" in lowered or any(_contains(lowered, word) for word in QUESTION_WORDS):
+        return None, 0.0
+
+    amounts = parse_amounts(text)
+    if not amounts:
+        return None, 0.0
+
+    category, unique = match_category(text, categories)
+    description = _description(text)
+    transaction_date = parse_absolute_date(text, today) or resolve_relative_date(text, today)
+
+    confidence = 0.5
+    if category and unique:
+        confidence += CATEGORY_CONFIDENCE
+    elif category:
+        confidence += 0.1
+    if description:
+        confidence += 0.1
+    if len(amounts) > 1:
+        # Beberapa nominal = beberapa transaksi atau harga satuan x jumlah
+        confidence = min(confidence, 0.3)
+    if any(_contains(lowered, word) for word in INCOME_WORDS):
+        confidence = min(confidence, 0.5)
+
+    data = {
+        "amount": max(amounts),
+        "category": category if category and unique else "Lainnya",
+        "description": description or text,
+        "date": transaction_date.strftime("%Y-%m-%d")
+    }
+    return data, round(confidence, 2)
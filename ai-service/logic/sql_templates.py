@@ -0,0 +1,457 @@
+"""
+Question -> parameterized SQL for /process_consult_keuangan.
+
+A question is reduced to its *shape*: the normalized text with the period,
+category and transaction type replaced by slots, e.g.
+"berapa total pengeluaran makan bulan ini" -> "berapa total {type} {category} {period}".
+The common shapes (total, total per category, top category) have built-in
+templates; any other shape is answered by the LLM once and its SQL is kept
+as the template for that shape. Values are always bound parameters
+(:user_id, :type, :start_date, :end_date, :category, :keyword), never
+interpolated. Questions over whole months read the per-user monthly rollup
+table (supabase/migrations) instead of scanning `transactions`.
+"""
+import hashlib
+import json
+import logging
+import re
+from datetime import date, timedelta
+from config.config import SQL_TEMPLATE_LEARNING_ENABLED, SQL_TEMPLATE_CACHE_MAX_ITEMS, SQL_TEMPLATE_TTL, CONSULT_USE_ROLLUPS
+from logic.rule_parser import CATEGORY_KEYWORDS
+from logic.text_normalize import MONTHS, date_spans, normalize_text, parse_absolute_date
+from utils import metrics
+from utils.lru import LRUCache
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = "transaction_monthly_rollups"
+
+CATEGORIES = ["Makanan", "Transportasi", "Belanja", "Tagihan", "Hiburan", "Kesehatan", "Pendidikan", "Lainnya"]
+
+# Sebutan langsung untuk kategori; kata kunci lain ("kopi", "bensin") dicari di deskripsi
+CATEGORY_ALIASES = {
+    "makanan": ["makanan", "makan"],
+    "transportasi": ["transportasi", "transport"],
+    "belanja": ["belanja", "belanjaan"],
+    "tagihan": ["tagihan"],
+    "hiburan": ["hiburan"],
+    "kesehatan": ["kesehatan"],
+    "pendidikan": ["pendidikan"],
+}
+
+INCOME_TERMS = ["pemasukan", "pendapatan", "penghasilan", "gaji", "income"]
+EXPENSE_TERMS = ["pengeluaran", "expense"]
+FILLER_WORDS = ["saya", "aku", "gue", "gw", "dong", "sih", "ya", "nih", "kah", "deh", "tolong", "coba", "kak", "min"]
+
+# Pertanyaan seperti ini bukan sekadar jumlah: biarkan LLM yang menyusun SQL-nya
+_NOT_A_SUM = re.compile(r"\b(kali|transaksi|rata|terakhir|sisa|saldo|hemat|tips|saran|banding|dibanding|selisih)\b")
+_TOP_CATEGORY = re.compile(r"\bkategori\b.*\b(terbesar|paling (besar|banyak|boros))\b|\b(terbesar|paling (besar|banyak|boros))\b.*\bkategori\b")
+_BY_CATEGORY = re.compile(r"\b(per|tiap|setiap|masing masing|semua) kategori\b|\bkategori apa saja\b|\brincian\b")
+_TOTAL = re.compile(r"\b(berapa|total|jumlah|habis)\b")
+_CONNECTIVES = re.compile(r"\{\w+\}|\b(di|untuk|buat|dari|ke|yang|selama)\b")
+
+_MONTH_NAME = re.compile(r"\b(?:bulan\s+)?(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b(?:\s+(\d{4}))?")
+_LAST_DAYS = re.compile(r"\b(\d{1,3}) hari terakhir\b")
+_BIND = re.compile(r"(?<![:\w]):([a-z_]+)\b")
+_TOKEN = re.compile(r"''|:[a-z_]+|[a-z_][\w.]*|\d+(?:\.\d+)?|<>|!=|<=|>=|\S", re.I)
+_SET_OPERATORS = {"union", "intersect", "except"}
+_CLAUSE_END = {"group", "order", "limit", "having", "window", "offset", "fetch"}
+_ALLOWED_TABLES = {"transactions", ROLLUP_TABLE}
+_TABLE_FUNCTIONS = {"generate_series", "unnest"}
+_ALIAS_STOP = {"on", "using", "where", "join", "inner", "left", "right", "full", "cross", "natural",
+               "lateral", ",", "(", ")"} | _SET_OPERATORS | _CLAUSE_END
+# Slot yang diisi dari pertanyaan: template wajib memakai bind-nya, bukan nilai literal
+_SLOT_PARAMS = ("start_date", "end_date", "category", "keyword")
+_LITERAL_DATE = re.compile(r"'\s*\d{4}-\d{1,2}")
+_LITERAL_PATTERN = re.compile(r"\b(i?like|similar\s+to)\s+'|~~\*?\s*'", re.I)
+_FORBIDDEN = re.compile(r"\b(insert|update|delete|drop|alter|truncate|create|grant|revoke|copy|call|do|pg_sleep|set)\b", re.I)
+
+def _month_range(year: int, month: int) -> tuple:
+    start = date(year, month, 1)
+    next_month = date(year + (month == 12), month % 12 + 1, 1)
+    return start, next_month - timedelta(days=1)
+
+def _relative_periods(today: date) -> list:
+    """(phrase, (start, end)), longest phrases first."""
+    monday = today - timedelta(days=today.weekday())
+    last_month_end = today.replace(day=1) - timedelta(days=1)
+    return [
+        ("bulan kemarin", (last_month_end.replace(day=1), last_month_end)),
+        ("bulan lalu", (last_month_end.replace(day=1), last_month_end)),
+        ("bulan ini", (today.replace(day=1), today)),
+        ("minggu lalu", (monday - timedelta(days=7), monday - timedelta(days=1))),
+        ("minggu ini", (monday, today)),
+        ("tahun lalu", (date(today.year - 1, 1, 1), date(today.year - 1, 12, 31))),
+        ("tahun ini", (date(today.year, 1, 1), today)),
+        ("hari ini", (today, today)),
+        ("kemarin", (today - timedelta(days=1), today - timedelta(days=1))),
+        ("kmrn", (today - timedelta(days=1), today - timedelta(days=1))),
+    ]
+
+def extract_period(text: str, today: date):
+    """((start, end), text with the period replaced by "{period}") or (None, text)."""
+    match = _LAST_DAYS.search(text)
+    if match:
+        days = max(int(match.group(1)), 1)
+        return (today - timedelta(days=days - 1), today), text[:match.start()] + "{period}" + text[match.end():]
+
+    for phrase, period in _relative_periods(today):
+        match = re.search(rf"\b{phrase}\b", text)
+        if match:
+            return period, text[:match.start()] + "{period}" + text[match.end():]
+
+    # Tanggal eksplisit: satu tanggal = hari itu, dua tanggal = rentang
+    spans = []
+    for start, end in sorted(date_spans(text), key=lambda span: (span[0], -span[1])):
+        # "2024-03-01" juga cocok dengan pola numerik "03-01": ambil span terpanjang saja
+        if (not spans or start >= spans[-1][1]) and parse_absolute_date(text[start:end], today):
+            spans.append((start, end))
+    dates = [parse_absolute_date(text[start:end], today) for start, end in spans[:2]]
+    if dates:
+        start, end = min(dates), max(dates)
+        first, last = spans[0][0], spans[len(dates) - 1][1]
+        # "dari 1 maret sampai 10 maret" -> satu slot
+        prefix = re.search(r"\b(dari|antara|sejak|tanggal|tgl)\s*$", text[:first])
+        if prefix:
+            first = prefix.start()
+        return (start, end), text[:first] + "{period}" + text[last:]
+
+    match = _MONTH_NAME.search(text)
+    if match:
+        month = MONTHS[match.group(1)]
+        year = int(match.group(2)) if match.group(2) else today.year - (month > today.month)
+        return _month_range(year, month), text[:match.start()] + "{period}" + text[match.end():]
+    return None, text
+
+def _longest_match(text: str, phrases: dict):
+    """(value, match) of the longest phrase found in `text`; `phrases` maps phrase -> value."""
+    best = None
+    for phrase, value in phrases.items():
+        match = re.search(rf"\b{re.escape(phrase)}\b", text)
+        if match and (best is None or len(phrase) > best[1].end() - best[1].start()):
+            best = (value, match)
+    return best
+
+def extract_category(text: str, categories: list = CATEGORIES):
+    """(category, text with the category name replaced by "{category}") or (None, text)."""
+    phrases = {}
+    for category in categories:
+        name = category.lower()
+        if name != "lainnya":
+            phrases.update({alias: category for alias in CATEGORY_ALIASES.get(name, [name])})
+    best = _longest_match(text, phrases)
+    if best is None:
+        return None, text
+    category, match = best
+    return category, text[:match.start()] + "{category}" + text[match.end():]
+
+def extract_keyword(text: str):
+    """(ILIKE pattern, text with the item replaced by "{keyword}") for items like "kopi", or (None, text)."""
+    phrases = {
+        keyword: keyword
+        for name, keywords in CATEGORY_KEYWORDS.items()
+        for keyword in keywords
+        if keyword not in CATEGORY_ALIASES.get(name, [])
+    }
+    best = _longest_match(text, phrases)
+    if best is None:
+        return None, text
+    keyword, match = best
+    return f"%{keyword}%", text[:match.start()] + "{keyword}" + text[match.end():]
+
+def extract_type(text: str):
+    """("income"|"expense", text with the type word replaced by "{type}")."""
+    for tipe, terms in (("income", INCOME_TERMS), ("expense", EXPENSE_TERMS)):
+        for term in terms:
+            match = re.search(rf"\b{term}\b", text)
+            if match:
+                return tipe, text[:match.start()] + "{type}" + text[match.end():]
+    return "expense", text
+
+def covers_whole_months(start: date, end: date, today: date) -> bool:
+    """True if [start, end] is a run of whole months (the current one counts up to today)."""
+    return start.day == 1 and ((end + timedelta(days=1)).day == 1 or end >= today)
+
+def parse_question(question: str, today: date = None, categories: list = CATEGORIES) -> dict:
+    """
+    {"shape", "kind", "params", "whole_months"}: `kind` is "total",
+    "by_category", "top_category" or None (no built-in template), `params`
+    are the bind values found in the question (without :user_id) and
+    `whole_months` says whether the monthly rollups can answer it.
+    """
+    today = today or date.today()
+    text = normalize_text(question)
+    text = re.sub(r"\s+", " ", re.sub(r"[^\w\s/-]", " ", text)).strip()
+
+    params = {}
+    period, text = extract_period(text, today)
+    if period:
+        params["start_date"], params["end_date"] = period
+    # Tanda hubung baru dibuang setelah tanggal ("2024-03-01") terbaca: "masing-masing" -> "masing masing"
+    text = re.sub(r"\s+", " ", text.replace("-", " ")).strip()
+    category, text = extract_category(text, categories)
+    if category:
+        params["category"] = category
+    keyword, text = extract_keyword(text)
+    if keyword:
+        params["keyword"] = keyword
+    params["type"], text = extract_type(text)
+
+    words = [word for word in text.split() if word not in FILLER_WORDS]
+    shape = " ".join(words)
+
+    kind = None
+    if not _NOT_A_SUM.search(shape):
+        if _TOP_CATEGORY.search(shape):
+            kind = "top_category"
+        elif _BY_CATEGORY.search(shape):
+            kind = "by_category"
+        elif _TOTAL.search(shape) or not _CONNECTIVES.sub("", shape).strip():
+            # "pengeluaran bulan ini" (hanya slot) juga berarti total
+            kind = "total"
+    whole_months = period is None or covers_whole_months(period[0], period[1], today)
+    return {"shape": shape, "kind": kind, "params": params, "whole_months": whole_months}
+
+def builtin_sql(kind: str, params: dict, whole_months: bool = False) -> str:
+    """
+    SQL of a built-in template; the WHERE clause follows the slots that are
+    present. Whole-month questions without an item keyword read the rollups.
+    """
+    rollup = CONSULT_USE_ROLLUPS and whole_months and "keyword" not in params
+    table, amount, day = (ROLLUP_TABLE, "total_amount", "month") if rollup else ("transactions", "amount", "transaction_date")
+    where = ["user_id = :user_id", "type = :type"]
+    if "start_date" in params:
+        # Rollup: month = tanggal 1, jadi BETWEEN tetap memuat bulan terakhir
+        where.append(f"{day} BETWEEN :start_date AND :end_date")
+    if "category" in params:
+        where.append("LOWER(category) = LOWER(:category)")
+    if "keyword" in params:
+        where.append("description ILIKE :keyword")
+    condition = " AND ".join(where)
+    if kind == "total":
+        return f"SELECT COALESCE(SUM({amount}), 0) AS total FROM {table} WHERE {condition}"
+    sql = f"SELECT category, SUM({amount}) AS total FROM {table} WHERE {condition} GROUP BY category ORDER BY total DESC"
+    return sql + " LIMIT 1" if kind == "top_category" else sql
+
+def bind_names(sql: str) -> set:
+    return set(_BIND.findall(sql))
+
+def bound_params(sql: str, params: dict) -> dict:
+    """Only the parameters the statement actually references."""
+    names = bind_names(sql)
+    return {name: value for name, value in params.items() if name in names}
+
+def _tokens(sql: str) -> list:
+    """(token, depth) pairs; string literals are collapsed to '' and depth counts parentheses."""
+    sql = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    tokens, depth = [], 0
+    for token in _TOKEN.findall(sql):
+        token = token.lower()
+        if token == ")":
+            depth -= 1
+        tokens.append((token, depth))
+        if token == "(":
+            depth += 1
+    return tokens
+
+def _user_filters(clause: list, depth: int):
+    """
+    Qualifiers ("" when unqualified) of the `[q.]user_id = :user_id`
+    conditions ANDed at the top level of a WHERE clause; None if that level
+    has an OR.
+    """
+    conditions, current, between = [], [], False
+    for token, level in clause:
+        if level == depth and token == "or":
+            return None
+        if level == depth and token == "between":
+            between = True
+        if level == depth and token == "and":
+            if between:  # AND milik BETWEEN x AND y
+                between = False
+            else:
+                conditions.append(current)
+                current = []
+                continue
+        current.append(token)
+    conditions.append(current)
+
+    qualifiers = set()
+    for condition in conditions:
+        if len(condition) == 3 and condition[1] == "=" and ":user_id" in (condition[0], condition[2]):
+            column = condition[2] if condition[0] == ":user_id" else condition[0]
+            qualifier, _, name = column.rpartition(".")
+            if name == "user_id":
+                qualifiers.add(qualifier.split(".")[-1])
+    return qualifiers
+
+def _closing(block: list, index: int, depth: int) -> int:
+    """Index of the ")" closing the "(" at `index`."""
+    for position in range(index + 1, len(block)):
+        if block[position] == (")", depth):
+            return position
+    return len(block) - 1
+
+def _sources(block: list, depth: int, ctes: set):
+    """
+    (kind, qualifier) of every FROM/JOIN item of a SELECT block: kind is
+    "table" (an allowed table), "cte" or "derived" (subquery or table
+    function). None if an item reads any other table or function.
+    """
+    sources, in_from = [], False
+    index = 0
+    while index < len(block):
+        token, level = block[index]
+        index += 1
+        if level != depth:
+            continue
+        if token == "from":
+            in_from = True
+        elif token == "where" or token in _CLAUSE_END:
+            in_from = False
+        if not in_from or token not in ("from", "join", ",") or index >= len(block):
+            continue
+
+        if block[index][0] == "lateral":
+            index += 1
+        name = block[index][0] if index < len(block) else ""
+        if name == "(":
+            kind, qualifier, index = "derived", "", _closing(block, index, depth) + 1
+        elif not re.match(r"^[a-z_][\w.]*$", name):
+            return None
+        elif index + 1 < len(block) and block[index + 1][0] == "(":
+            if name.split(".")[-1] not in _TABLE_FUNCTIONS:
+                return None
+            kind, qualifier, index = "derived", "", _closing(block, index + 1, depth) + 1
+        else:
+            table = name.split(".")[-1]
+            if table in ctes:
+                kind = "cte"
+            elif table in _ALLOWED_TABLES:
+                kind = "table"
+            else:
+                return None
+            qualifier, index = table, index + 1
+
+        if index < len(block) and block[index][0] == "as":
+            index += 1
+        if index < len(block) and block[index][0] not in _ALIAS_STOP and re.match(r"^[a-z_]\w*$", block[index][0]):
+            qualifier = block[index][0]
+            index += 1
+        sources.append((kind, qualifier))
+    return sources
+
+def _filters_every_select_by_user(sql: str) -> bool:
+    """
+    Every SELECT reads only `transactions`, the monthly rollups, CTEs or
+    subqueries, and each of those tables carries its own top-level
+    `<alias>.user_id = :user_id` condition in the WHERE (unqualified is
+    enough when it is the only FROM item).
+    """
+    tokens = _tokens(sql)
+    ctes = {
+        token for index, (token, depth) in enumerate(tokens[:-2])
+        if depth == 0 and tokens[index + 1][0] == "as" and tokens[index + 2][0] == "("
+    }
+    for start, (token, depth) in enumerate(tokens):
+        if token != "select":
+            continue
+        block = []
+        for token, level in tokens[start + 1:]:
+            if level < depth or (level == depth and token in _SET_OPERATORS):
+                break
+            block.append((token, level))
+
+        sources = _sources(block, depth, ctes)
+        if sources is None:
+            return False
+        tables = [qualifier for kind, qualifier in sources if kind == "table"]
+        if not tables:
+            continue
+        where = next((index for index, item in enumerate(block) if item == ("where", depth)), None)
+        if where is None:
+            return False
+        clause = []
+        for token, level in block[where + 1:]:
+            if level == depth and token in _CLAUSE_END:
+                break
+            clause.append((token, level))
+        filters = _user_filters(clause, depth)
+        if filters is None:
+            return False
+        for qualifier in tables:
+            # Kolom tanpa alias hanya jelas milik tabel itu bila FROM-nya satu-satunya
+            if qualifier not in filters and not ("" in filters and len(sources) == 1):
+                return False
+    return True
+
+def validate_template(sql: str, params: dict):
+    """
+    Cleaned LLM SQL if it is a single read-only SELECT over the transaction
+    tables in which every table is filtered with its own top-level
+    `user_id = :user_id` (ANDed, no OR), binding every slot found in the
+    question instead of literal dates or patterns, else None.
+    """
+    sql = sql.strip().strip("`")
+    sql = re.sub(r"^sql\s+", "", sql, flags=re.I).strip().rstrip(";").strip()
+    if ";" in sql or "--" in sql or "/*" in sql or not re.match(r"^(select|with)\b", sql, re.I) or _FORBIDDEN.search(sql):
+        return None
+    names = bind_names(sql)
+    if "user_id" not in names or not names <= set(params) | {"user_id"}:
+        return None
+    # Template dipakai ulang untuk shape yang sama: nilai slot tidak boleh tertanam
+    if any(name in params and name not in names for name in _SLOT_PARAMS):
+        return None
+    if _LITERAL_DATE.search(sql) or _LITERAL_PATTERN.search(sql):
+        return None
+    if not _filters_every_select_by_user(sql):
+        return None
+    return sql
+
+
+class TemplateStore:
+    """
+    Learned SQL templates per question shape and period granularity
+    (whole months or not: rollup SQL must never answer a day-range question),
+    in-process LRU in front of Redis.
+    """
+
+    def __init__(self, max_items: int = SQL_TEMPLATE_CACHE_MAX_ITEMS, ttl: int = SQL_TEMPLATE_TTL):
+        self.ttl = ttl
+        self._memory = LRUCache("sql_templates", max_items, ttl)
+
+    def key(self, shape: str, whole_months: bool) -> str:
+        # v2: template v1 hanya dikunci shape (bisa berisi SQL rollup untuk rentang hari)
+        granularity = "months" if whole_months else "days"
+        return "sqltpl:v2:" + hashlib.sha1(f"{shape}|{granularity}".encode("utf-8")).hexdigest()
+
+    async def get(self, shape: str, whole_months: bool):
+        key = self.key(shape, whole_months)
+        sql = self._memory.get(key)
+        if sql is not None:
+            return sql
+        try:
+            raw = await get_redis().get(key)
+        except Exception as e:
+            logger.warning({"event": "sql_template_get_failed", "error": str(e)})
+            return None
+        if raw is None:
+            return None
+        sql = json.loads(raw)["sql"]
+        self._memory.set(key, sql)
+        return sql
+
+    async def learn(self, shape: str, whole_months: bool, sql: str) -> None:
+        if not SQL_TEMPLATE_LEARNING_ENABLED:
+            return
+        key = self.key(shape, whole_months)
+        self._memory.set(key, sql)
+        try:
+            await get_redis().set(key, json.dumps({"shape": shape, "whole_months": whole_months, "sql": sql}), ex=self.ttl)
+        except Exception as e:
+            logger.warning({"event": "sql_template_set_failed", "error": str(e)})
+        metrics.increment("sql_templates.learned")
+        logger.info({"event": "sql_template_learned", "shape": shape, "whole_months": whole_months, "sql": sql})
+
+template_store = TemplateStore()
@@ -0,0 +1,183 @@
+"""
+Gemini structured output: one extraction engine for the text, voice, batch
+and receipt paths.
+
+Each call asks for `application/json` with a `responseSchema` derived from
+a pydantic model (categories as an enum), a tight `maxOutputTokens` and
+temperature 0, so the prompt only has to describe the task, not the JSON
+format. The candidate text is validated into the model once.
+"""
+from logic import gemini_client
+from logic.json_stream import JsonArrayItems
+from logic.key_scheduler import call_with_key
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Type, Union, get_args, get_origin
+from utils import metrics
+import logging
+import time
+import types
+
+logger = logging.getLogger(__name__)
+
+_SCALAR_TYPES = {str: "STRING", int: "INTEGER", float: "NUMBER", bool: "BOOLEAN"}
+
+def _schema_for(annotation, description: str = None, enum: list = None) -> dict:
+    schema = {}
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if set(args) == {int, float}:
+            schema = {"type": "NUMBER"}
+        else:
+            schema = _schema_for(args[0], enum=enum)
+        if len(args) < len(get_args(annotation)):
+            schema["nullable"] = True
+    elif origin in (list, List):
+        schema = {"type": "ARRAY", "items": _schema_for(get_args(annotation)[0], enum=enum)}
+    elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        schema = response_schema(annotation, enum)
+    else:
+        schema = {"type": _SCALAR_TYPES[annotation]}
+        if enum and annotation is str:
+            schema.update({"format": "enum", "enum": list(enum)})
+    if description:
+        schema["description"] = description
+    return schema
+
+def response_schema(model: Type[BaseModel], categories: list = None) -> dict:
+    """
+    Gemini `responseSchema` (OpenAPI subset) for `model`; a `category` field
+    is restricted to `categories` (enum).
+    """
+    properties = {}
+    for name, field in model.model_fields.items():
+        enum = categories if name == "category" else None
+        properties[name] = _schema_for(field.annotation, field.description, enum)
+    # Semua field wajib ada di output (boleh null bila nullable); default model
+    # hanya jaring pengaman saat validasi
+    # propertyOrdering: Gemini menulis field sesuai urutan model (penting saat streaming)
+    return {"type": "OBJECT", "properties": properties, "required": list(properties),
+            "propertyOrdering": list(properties)}
+
+def build_payload(parts: list, model: Type[BaseModel], max_output_tokens: int,
+                  many: bool = False, categories: list = None) -> dict:
+    schema = response_schema(model, categories)
+    return {
+        "contents": [{"parts": parts}],
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": {"type": "ARRAY", "items": schema} if many else schema,
+            "maxOutputTokens": max_output_tokens,
+            "temperature": 0
+        }
+    }
+
+def parse_response(text: str, model: Type[BaseModel], many: bool = False, categories: list = None):
+    """Validate the JSON text into `model` (or a list of it); raises ValueError when invalid."""
+    context = {"categories": categories}
+    try:
+        if many:
+            return TypeAdapter(List[model]).validate_json(text, context=context)
+        return model.model_validate_json(text, context=context)
+    except ValueError:
+        metrics.increment("structured_output.invalid")
+        raise
+
+async def generate_structured(parts: list, model: Type[BaseModel], max_output_tokens: int,
+                              many: bool = False, categories: list = None, label: str = "Gemini"):
+    """
+    One structured generateContent call with the shared key scheduler.
+    `parts` are the Gemini content parts (prompt text, inline image).
+    """
+    payload = build_payload(parts, model, max_output_tokens, many, categories)
+
+    async def _call(api_key: str) -> dict:
+        return await gemini_client.generate_content(payload, api_key)
+
+    metrics.increment("structured_output.calls")
+    response_json = await call_with_key(_call, label=label)
+    text = gemini_client.extract_text(response_json)
+    if text is None:
+        raise ValueError(f"No response from {label} API")
+
+    candidate = response_json["candidates"][0]
+    usage = response_json.get("usageMetadata", {})
+    logger.info({
+        "event": "structured_output_received",
+        "model": model.__name__,
+        "finish_reason": candidate.get("finishReason"),
+        "prompt_tokens": usage.get("promptTokenCount"),
+        "output_tokens": usage.get("candidatesTokenCount")
+    })
+    if candidate.get("finishReason") == "MAX_TOKENS":
+        # JSON terpotong: validasi di bawah akan gagal
+        metrics.increment("structured_output.truncated")
+        logger.warning({"event": "structured_output_truncated", "model": model.__name__, "max_output_tokens": max_output_tokens})
+    return parse_response(text, model, many, categories)
+
+async def stream_structured_items(parts: list, model: Type[BaseModel], field: str, item_model: Type[BaseModel],
+                                  max_output_tokens: int, categories: list = None, label: str = "Gemini",
+                                  gate: str = None, status: dict = None):
+    """
+    Like `generate_structured`, over streamGenerateContent: yields
+    (index, item) for every element of the array `field` of `model`,
+    validated into `item_model`, as soon as its object is complete; `index`
+    is its position in the array. Invalid elements are skipped and counted
+    in `status["dropped"]`; a truncated array raises ValueError after the
+    complete elements.
+
+    `gate` names a boolean field of `model` (e.g. is_receipt): elements are
+    held until it has been streamed and dropped when it is false. Its value
+    is stored in `status[gate]`.
+    """
+    payload = build_payload(parts, model, max_output_tokens, categories=categories)
+    status = {} if status is None else status
+    status["dropped"] = 0
+
+    async def _open(api_key: str):
+        return await gemini_client.stream_generate_content(payload, api_key)
+
+    metrics.increment("structured_output.streams")
+    start = time.perf_counter()
+    response = await call_with_key(_open, label=label)
+    parser = JsonArrayItems(field)
+    finish_reason, first_item_ms, count, index, held = None, None, 0, 0, []
+    async for chunk in gemini_client.iter_stream_chunks(response):
+        candidate = (chunk.get("candidates") or [{}])[0]
+        finish_reason = candidate.get("finishReason") or finish_reason
+        text = "".join(part.get("text", "") for part in candidate.get("content", {}).get("parts", []))
+        for raw in parser.feed(text):
+            index += 1
+            try:
+                held.append((index - 1, item_model.model_validate(raw, context={"categories": categories})))
+            except ValueError as e:
+                status["dropped"] += 1
+                metrics.increment("structured_output.invalid")
+                logger.warning({"event": "structured_output_item_invalid", "model": item_model.__name__, "error": str(e)})
+        if gate:
+            status[gate] = parser.value(gate)
+            if status[gate] is None:
+                continue  # belum tahu apakah item boleh dikirim
+            if status[gate] is False:
+                held = []
+        for position, item in held:
+            if first_item_ms is None:
+                first_item_ms = round((time.perf_counter() - start) * 1000, 1)
+            count += 1
+            yield position, item
+        held = []
+
+    logger.info({
+        "event": "structured_output_stream_done",
+        "model": model.__name__,
+        "items": count,
+        "dropped": status["dropped"],
+        "finish_reason": finish_reason,
+        "first_item_ms": first_item_ms,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+    })
+    if finish_reason == "MAX_TOKENS" or not parser.finished or (gate and status[gate] is None):
+        # Item yang sudah terkirim tetap berlaku, tapi hasilnya tidak lengkap
+        metrics.increment("structured_output.truncated")
+        logger.warning({"event": "structured_output_truncated", "model": model.__name__, "max_output_tokens": max_output_tokens})
+        raise ValueError(f"{label} output ended before the {field} array was complete ({count} items)")
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import logging
+from config.config import TEXT_CACHE_ENABLED, TEXT_CACHE_MAX_ITEMS, TEXT_CACHE_TTL
+from logic.text_normalize import normalize_text, has_absolute_date, resolve_relative_date
+from utils import metrics
+from utils.lru import LRUCache
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_memory = LRUCache("text_cache", TEXT_CACHE_MAX_ITEMS, TEXT_CACHE_TTL)
+
+def cache_key(text: str, categories: list) -> str:
+    """Key on normalized text plus the (order independent) category set."""
+    raw = normalize_text(text) + "|" + ",".join(sorted(c.lower() for c in categories))
+    return "textx:v1:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _restore(text: str, entry: dict) -> dict:
+    data = dict(entry)
+    if not data.get("date"):
+        # Tanggal relatif ("kemarin") dihitung ulang setiap kali, tidak pernah dari cache
+        data["date"] = resolve_relative_date(text).strftime("%Y-%m-%d")
+    return data
+
+async def get(text: str, categories: list):
+    """Return the cached extraction for `text`, or None."""
+    if not TEXT_CACHE_ENABLED:
+        return None
+    key = cache_key(text, categories)
+
+    entry = _memory.get(key)
+    if entry is None:
+        try:
+            raw = await get_redis().get(key)
+        except Exception as e:
+            logger.warning({"event": "text_cache_get_failed", "error": str(e)})
+            raw = None
+        if raw is None:
+            metrics.increment("text_cache.misses")
+            return None
+        entry = json.loads(raw)
+        _memory.set(key, entry)
+        metrics.increment("text_cache.redis_hits")
+
+    metrics.increment("text_cache.hits")
+    return _restore(text, entry)
+
+async def set(text: str, categories: list, data: dict) -> None:
+    """Cache an extraction. The date is only kept when the text names an absolute date."""
+    if not TEXT_CACHE_ENABLED:
+        return
+    entry = {k: v for k, v in data.items() if k != "date"}
+    if has_absolute_date(text):
+        entry["date"] = data.get("date")
+
+    key = cache_key(text, categories)
+    _memory.set(key, entry)
+    try:
+        await get_redis().set(key, json.dumps(entry), ex=TEXT_CACHE_TTL)
+    except Exception as e:
+        logger.warning({"event": "text_cache_set_failed", "error": str(e)})
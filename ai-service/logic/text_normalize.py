@@ -0,0 +1,98 @@
+import re
+from datetime import date, timedelta
+
+MONTHS = {
+    "jan": 1, "januari": 1, "feb": 2, "februari": 2, "mar": 3, "maret": 3,
+    "apr": 4, "april": 4, "mei": 5, "jun": 6, "juni": 6, "jul": 7, "juli": 7,
+    "agu": 8, "agt": 8, "agustus": 8, "sep": 9, "sept": 9, "september": 9,
+    "okt": 10, "oktober": 10, "nov": 11, "november": 11, "des": 12, "desember": 12
+}
+
+_MONTH_PATTERN = "|".join(sorted(MONTHS, key=len, reverse=True))
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_NUMERIC_DATE = re.compile(r"\b(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?\b")
+_TEXT_DATE = re.compile(rf"\b(?:tgl\.?\s*|tanggal\s+)?(\d{{1,2}})\s+({_MONTH_PATTERN})\b(?:\s+(\d{{4}}))?")
+_DAYS_AGO = re.compile(r"\b(\d+)\s+hari\s+(?:yang\s+)?(?:lalu|kemarin)\b")
+
+# Kata kunci tanggal relatif -> selisih hari dari hari ini (frasa terpanjang dulu)
+RELATIVE_DAYS = [
+    ("kemarin lusa", -2),
+    ("minggu lalu", -7),
+    ("hari ini", 0),
+    ("kemarin", -1),
+    ("kmrn", -1),
+    ("besok", 1),
+    ("lusa", 2),
+    ("tadi", 0),
+]
+
+_SHORTHANDS = [
+    (re.compile(r"(\d)\s*(?:ribu|rb|k)\b"), r"\1rb"),
+    (re.compile(r"(\d)\s*(?:juta|jt)\b"), r"\1jt"),
+]
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of a transaction message for cache keys:
+    lowercase, single spaces, no "Rp", no thousand separators and one
+    spelling for the amount shorthands ("25 ribu", "25k" -> "25rb").
+    """
+    normalized = text.lower().strip()
+    normalized = re.sub(r"\brp\.?\s*", "", normalized)
+    # 25.000 / 1.250.000 -> 25000 / 1250000 (titik sebagai pemisah ribuan)
+    normalized = re.sub(r"(?<=\d)\.(?=\d{3}\b)", "", normalized)
+    # 1,2jt -> 1.2jt (koma sebagai desimal)
+    normalized = re.sub(r"(?<=\d),(?=\d)", ".", normalized)
+    for pattern, replacement in _SHORTHANDS:
+        normalized = pattern.sub(replacement, normalized)
+    normalized = re.sub(r"[!?.,;]+$", "", normalized)
+    return re.sub(r"\s+", " ", normalized).strip()
+
+def has_absolute_date(text: str) -> bool:
+    """True if the message names a calendar date ("2024-03-20", "20/3", "5 maret")."""
+    lowered = text.lower()
+    return bool(_ISO_DATE.search(lowered) or _NUMERIC_DATE.search(lowered) or _TEXT_DATE.search(lowered))
+
+def parse_absolute_date(text: str, today: date = None):
+    """Parse the first calendar date in the message, or None. Day-first ("20/3")."""
+    today = today or date.today()
+    lowered = text.lower()
+    try:
+        match = _ISO_DATE.search(lowered)
+        if match:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        match = _TEXT_DATE.search(lowered)
+        if match:
+            year = int(match.group(3)) if match.group(3) else today.year
+            return date(year, MONTHS[match.group(2)], int(match.group(1)))
+        match = _NUMERIC_DATE.search(lowered)
+        if match:
+            year = match.group(3)
+            year = today.year if not year else int(year) + (2000 if len(year) == 2 else 0)
+            return date(year, int(match.group(2)), int(match.group(1)))
+    except ValueError:
+        return None
+    return None
+
+def date_spans(text: str) -> list:
+    """(start, end) of every date-like phrase, so their numbers are not read as amounts."""
+    lowered = text.lower()
+    spans = []
+    for pattern in (_ISO_DATE, _TEXT_DATE, _NUMERIC_DATE, _DAYS_AGO):
+        spans.extend(match.span() for match in pattern.finditer(lowered))
+    return spans
+
+def resolve_relative_date(text: str, today: date = None) -> date:
+    """
+    Resolve relative day words ("kemarin", "3 hari lalu", "hari ini").
+    Messages without one are dated today, like the LLM path does.
+    """
+    today = today or date.today()
+    lowered = text.lower()
+    match = _DAYS_AGO.search(lowered)
+    if match:
+        return today - timedelta(days=int(match.group(1)))
+    for phrase, offset in RELATIVE_DAYS:
+        if re.search(rf"\b{phrase}\b", lowered):
+            return today + timedelta(days=offset)
+    return today
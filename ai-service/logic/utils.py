@@ -1,11 +1,47 @@
-import redis
 import json
 from datetime import datetime
+from logic.aggregates import transaction_key, queue_increments, TRANSACTION_TTL
+from logic.answer_cache import queue_data_version_bump
+from utils.redis_client import get_redis
 
-r = redis.Redis(host='localhost', port=6379, decode_responses=True)
-
-def save_transaction(phone_number: str, data: dict):
+async def save_transactions(phone_number: str, transactions: list):
     bulan = datetime.now().strftime("%Y-%m")
-    key = f"keuangan:{phone_number}:{bulan}"
-    r.rpush(key, json.dumps(data))
-    r.expire(key, 60 * 60 * 24 * 90)  # simpan selama 3 bulan
+    key = transaction_key(phone_number, bulan)
+    # Satu MULTI: list transaksi, agregat bulanan dan versi data (cache jawaban) selalu konsisten
+    async with get_redis().pipeline(transaction=True) as pipe:
+        for data in transactions:
+            pipe.rpush(key, json.dumps(data))
+            queue_increments(pipe, phone_number, bulan, data)
+        pipe.expire(key, TRANSACTION_TTL)  # simpan selama 3 bulan
+        queue_data_version_bump(pipe, phone_number)
+        await pipe.execute()
+
+async def save_transaction(phone_number: str, data: dict):
+    await save_transactions(phone_number, [data])
+
+RECEIPT_ITEMS_TTL = 60 * 60 * 24  # retry struk yang terputus dianggap sama selama 1 hari
+
+def receipt_items_key(phone_number: str, image_sha: str) -> str:
+    return f"receipt_items:{phone_number}:{image_sha}"
+
+async def save_receipt_item(phone_number: str, image_sha: str, index: int, data: dict) -> bool:
+    """
+    Save item `index` of the receipt image `image_sha` once: a retry of a
+    stream that broke after some saves skips the items already saved.
+    Returns False when the item was saved before.
+    """
+    key = receipt_items_key(phone_number, image_sha)
+    redis = get_redis()
+    if not await redis.sadd(key, index):
+        return False
+    await redis.expire(key, RECEIPT_ITEMS_TTL)
+    try:
+        await save_transactions(phone_number, [data])
+    except Exception:
+        await redis.srem(key, index)  # belum tersimpan: retry boleh menyimpannya
+        raise
+    return True
+
+async def forget_receipt_items(phone_number: str, image_sha: str):
+    """Drop the saved-item marks once the receipt stream has completed (and is cached)."""
+    await get_redis().delete(receipt_items_key(phone_number, image_sha))
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import numpy as np
+from config.config import VECTOR_INDEX_MAX_USERS, VECTOR_INDEX_TTL
+from utils import metrics
+from utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 64
+
+def normalize_rows(vectors) -> np.ndarray:
+    """float32 matrix with unit-length rows (zero rows stay zero)."""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """
+    Exact cosine-similarity index over one user's transaction embeddings.
+    Rows are normalized on insert, so a query is a single matrix multiply.
+    Appends grow the matrix by doubling; re-adding an id overwrites its row.
+    """
+
+    def __init__(self, dim: int = None, capacity: int = INITIAL_CAPACITY):
+        self.dim = dim
+        self._capacity = capacity
+        self._matrix = None if dim is None else np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = []
+        self._metadata = []
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._rows
+
+    def _ensure_capacity(self, needed: int) -> None:
+        if self._matrix is None:
+            self._capacity = max(self._capacity, needed)
+            self._matrix = np.zeros((self._capacity, self.dim), dtype=np.float32)
+        elif needed > self._capacity:
+            while self._capacity < needed:
+                self._capacity *= 2
+            grown = np.zeros((self._capacity, self.dim), dtype=np.float32)
+            grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+            self._matrix = grown
+
+    def add(self, ids: list, vectors, metadata: list = None) -> None:
+        """Insert or overwrite rows. `metadata` is an optional dict per id."""
+        if not ids:
+            return
+        matrix = normalize_rows(vectors)
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        if matrix.shape != (len(ids), self.dim):
+            raise ValueError(f"Expected {len(ids)} vectors of dimension {self.dim}, got {matrix.shape}")
+        metadata = metadata or [{}] * len(ids)
+
+        with self._lock:
+            new_ids = [item_id for item_id in dict.fromkeys(ids) if item_id not in self._rows]
+            self._ensure_capacity(len(self._ids) + len(new_ids))
+            for item_id, vector, meta in zip(ids, matrix, metadata):
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._rows[item_id] = row
+                    self._ids.append(item_id)
+                    self._metadata.append(meta)
+                else:
+                    self._metadata[row] = meta
+                self._matrix[row] = vector
+
+    def search_many(self, queries, k: int = 5) -> list:
+        """Top-k (id, score, metadata) per query row, best first."""
+        queries = normalize_rows(queries)
+        size = len(self._ids)
+        if size == 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match index dimension {self.dim}")
+
+        k = min(k, size)
+        scores = queries @ self._matrix[:size].T
+        if k < size:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(size), (len(queries), 1))
+        results = []
+        for query_scores, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-query_scores[candidates])]
+            results.append([
+                (self._ids[row], float(query_scores[row]), self._metadata[row])
+                for row in ordered
+            ])
+        return results
+
+    def search(self, query, k: int = 5) -> list:
+        return self.search_many(query, k)[0]
+
+
+def _parse_embedding(value):
+    # pgvector dikembalikan sebagai string "[0.1,0.2,...]", kolom json/array sebagai list
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+def load_user_embeddings(user_id: str) -> tuple:
+    """(ids, vectors, metadata) of a user's embedded transactions from the database."""
+    from utils.db import execute_query
+
+    rows = execute_query(
+        "SELECT id, description, category, amount, type, transaction_date, embedding "
+        "FROM transactions WHERE user_id = :user_id AND embedding IS NOT NULL",
+        {"user_id": user_id}
+    )
+    ids, vectors, metadata = [], [], []
+    for row in rows:
+        vector = _parse_embedding(row["embedding"])
+        if not vector:
+            continue
+        ids.append(str(row["id"]))
+        vectors.append(vector)
+        metadata.append({
+            "description": row.get("description"),
+            "category": row.get("category"),
+            "amount": float(row["amount"]) if row.get("amount") is not None else None,
+            "type": row.get("type"),
+            "date": str(row["transaction_date"]) if row.get("transaction_date") else None
+        })
+    return ids, vectors, metadata
+
+
+class VectorIndexRegistry:
+    """
+    Loaded per-user indexes, evicted LRU (and after VECTOR_INDEX_TTL so
+    rows written elsewhere are picked up). A missing index is loaded from
+    the database in a worker thread.
+    """
+
+    def __init__(self, max_users: int = VECTOR_INDEX_MAX_USERS, ttl: int = VECTOR_INDEX_TTL, loader=load_user_embeddings):
+        self.loader = loader
+        self._indexes = LRUCache("vector_index", max_users, ttl)
+        self._loading = {}
+
+    async def get(self, user_id: str) -> VectorIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+
+        # Satu load per user walau ada beberapa request bersamaan
+        lock = self._loading.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                index = VectorIndex()
+                if self.loader is not None:
+                    start = time.perf_counter()
+                    ids, vectors, metadata = await asyncio.to_thread(self.loader, user_id)
+                    index.add(ids, vectors, metadata)
+                    logger.info({
+                        "event": "vector_index_loaded",
+                        "user_id": user_id,
+                        "rows": len(index),
+                        "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+                    })
+                self._indexes.set(user_id, index)
+        self._loading.pop(user_id, None)
+        return index
+
+    async def append(self, user_id: str, ids: list, vectors, metadata: list = None) -> int:
+        """Add new embeddings to the user's index. Returns the index size."""
+        index = await self.get(user_id)
+        index.add(ids, vectors, metadata)
+        return len(index)
+
+    async def search_many(self, user_id: str, queries, k: int = 5) -> list:
+        index = await self.get(user_id)
+        start = time.perf_counter()
+        results = index.search_many(queries, k)
+        metrics.observe("vector_index.search_ms", (time.perf_counter() - start) * 1000)
+        return results
+
+    async def search(self, user_id: str, query, k: int = 5) -> list:
+        return (await self.search_many(user_id, query, k))[0]
+
+    def evict(self, user_id: str) -> None:
+        self._indexes.pop(user_id)
+
+
+registry = VectorIndexRegistry()
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import logging
+from config.config import (
+    VISION_CACHE_ENABLED,
+    VISION_CACHE_MAX_ITEMS,
+    VISION_CACHE_TTL
+)
+from utils import metrics
+from utils.lru import LRUCache
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+class VisionCacheKey:
+    """
+    Exact (SHA-256) key of one uploaded image. Only byte-identical uploads
+    share a result: visually similar receipts (same store layout, other
+    items) must never be served each other's transactions.
+    """
+
+    def __init__(self, sha256: str):
+        self.sha256 = sha256
+
+def cache_key(image_bytes: bytes) -> VisionCacheKey:
+    """Compute the cache key of an upload (CPU bound, run in a threadpool)."""
+    return VisionCacheKey(hashlib.sha256(image_bytes).hexdigest())
+
+
+class VisionCache:
+    """
+    Two-tier cache for vision results: in-process LRU in front of Redis,
+    both keyed by the exact image hash.
+    """
+
+    def __init__(self, namespace: str, max_items: int = VISION_CACHE_MAX_ITEMS, ttl: int = VISION_CACHE_TTL):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._metric = f"vision_cache.{namespace}"
+        self._memory = LRUCache(self._metric, max_items, ttl)
+
+    def _redis_key(self, kind: str, value: str) -> str:
+        return f"vision:{self.namespace}:{kind}:{value}"
+
+    async def get(self, key: VisionCacheKey):
+        """Return (hit, result). `result` may be None (cached "not a receipt")."""
+        if not VISION_CACHE_ENABLED:
+            return False, None
+
+        entry = self._memory.get(key.sha256)
+        if entry is not None:
+            metrics.increment(f"{self._metric}.hits")
+            return True, entry["result"]
+
+        raw = None
+        try:
+            raw = await get_redis().get(self._redis_key("sha", key.sha256))
+        except Exception as e:
+            logger.warning({"event": "vision_cache_get_failed", "error": str(e)})
+
+        if raw is None:
+            metrics.increment(f"{self._metric}.misses")
+            return False, None
+
+        entry = json.loads(raw)
+        self._memory.set(key.sha256, entry)
+        metrics.increment(f"{self._metric}.hits")
+        metrics.increment(f"{self._metric}.redis_hits")
+        return True, entry["result"]
+
+    async def set(self, key: VisionCacheKey, result) -> None:
+        if not VISION_CACHE_ENABLED:
+            return
+        entry = {"result": result}
+        self._memory.set(key.sha256, entry)
+        try:
+            await get_redis().set(self._redis_key("sha", key.sha256), json.dumps(entry), ex=self.ttl)
+        except Exception as e:
+            logger.warning({"event": "vision_cache_set_failed", "error": str(e)})
+
+
+# Hasil /process_image (klasifikasi + ekstraksi) dan /process-image (ekstraksi saja)
+receipt_cache = VisionCache("receipt")
+extraction_cache = VisionCache("extract")
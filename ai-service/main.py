@@ -1,13 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import process_text, process_image, process_voice, consult, process_consult
 from routes import detect_intent
 from routes import dataset
 from models.ai_dataset import Base
-from database.database import engine
+from database.database import engine, async_engine
 from routes import embedding
+from routes import monitoring
+from routes import similarity
+from logic import gemini_client
+from logic.asr import whisper_model
+from logic.intent_model import intent_model
+from langchain_agent.pool import agent_pool
+from utils import redis_client
+from config.config import WHISPER_PRELOAD
 
-app = FastAPI(title="AI Agent Keuangan API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: buat koneksi bersama yang dipakai semua request
+    await gemini_client.startup()
+    await redis_client.startup()
+    # Classifier intent lokal (kalau sudah pernah dilatih)
+    intent_model.load()
+    # LLM + agent konsultasi per API key, dibangun sekali
+    agent_pool.startup()
+    if WHISPER_PRELOAD:
+        # Model Whisper dimuat sekali di sini, bukan per voice note
+        await whisper_model.load()
+    yield
+    # Shutdown: tutup koneksi
+    await gemini_client.shutdown()
+    await redis_client.close_redis()
+    await async_engine.dispose()
+    whisper_model.shutdown()
+    agent_pool.shutdown()
+
+app = FastAPI(title="AI Agent Keuangan API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -27,6 +56,8 @@ app.include_router(detect_intent.router, prefix="/api", tags=["Intent Detection"
 app.include_router(dataset.router, prefix="/api", tags=["Dataset"])
 app.include_router(process_consult.router, prefix="/api", tags=["Consultation"])
 app.include_router(embedding.router, prefix="/api", tags=["Embedding"])
+app.include_router(similarity.router, prefix="/api", tags=["Similarity"])
+app.include_router(monitoring.router, prefix="/api", tags=["Monitoring"])
 
 # Create DB tables
 Base.metadata.create_all(bind=engine)
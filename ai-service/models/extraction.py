@@ -0,0 +1,79 @@
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
+from typing import List, Optional, Union
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORIES = ["Makanan", "Transportasi", "Belanja", "Tagihan", "Hiburan", "Kesehatan", "Pendidikan", "Lainnya"]
+
+def _valid_category(value, info: ValidationInfo) -> str:
+    # Kategori di luar daftar (context "categories") menjadi "Lainnya"
+    categories = (info.context or {}).get("categories") or DEFAULT_CATEGORIES
+    if value not in categories:
+        if value:
+            logger.warning({
+                "event": "invalid_category",
+                "provided_category": value,
+                "valid_categories": categories
+            })
+        return "Lainnya"
+    return value
+
+class Expense(BaseModel):
+    """One transaction extracted from a text or voice message."""
+    amount: Union[int, float] = Field(0, description="Nominal dalam rupiah, angka saja")
+    category: str = Field("Lainnya", description="Kategori transaksi")
+    description: Optional[str] = Field(None, description="Deskripsi singkat")
+    date: Optional[str] = Field(None, description="Tanggal YYYY-MM-DD, null bila tidak disebut")
+
+    @field_validator("amount", mode="before")
+    @classmethod
+    def _amount(cls, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        logger.warning({
+            "event": "invalid_amount",
+            "amount": value,
+            "type": type(value).__name__
+        })
+        return 0
+
+    _category = field_validator("category", mode="before")(_valid_category)
+
+class BatchExpense(Expense):
+    """Expense of one message in a batch prompt; `id` is the message id."""
+    id: int = Field(..., description="Id pesan")
+
+class ReceiptItem(BaseModel):
+    """One purchased item on a receipt."""
+    amount: int = Field(..., description="Harga dalam rupiah, angka saja")
+    category: str = Field(..., description="Kategori transaksi")
+    description: str = Field(..., description="Nama item yang dibeli")
+    date: Optional[str] = Field(None, description="Tanggal struk YYYY-MM-DD, null bila tidak ada")
+
+    @field_validator("amount", mode="before")
+    @classmethod
+    def _amount(cls, value):
+        # "Rp 25.000" / "25,000" -> 25000
+        if isinstance(value, str):
+            cleaned = re.sub(r"[Rp\s.,]", "", value)
+            if not cleaned.isdigit():
+                raise ValueError(f"Invalid amount format: {value}")
+            return int(cleaned)
+        if isinstance(value, float):
+            return int(value)
+        return value
+
+    _category = field_validator("category", mode="before")(_valid_category)
+
+class Receipt(BaseModel):
+    transactions: List[ReceiptItem] = Field(..., description="Satu object per item")
+
+class FusedReceipt(BaseModel):
+    """
+    Receipt check and extraction in one call. is_receipt comes first so a
+    streamed response says whether the items may be used before they arrive.
+    """
+    is_receipt: bool = Field(..., description="true bila gambar adalah struk / bukti transaksi")
+    transactions: List[ReceiptItem] = Field(..., description="Satu object per item")
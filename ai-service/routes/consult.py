@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from models.consult_input import ConsultInput
 from models.response import ConsultResponse
-from langchain_agent.agent import run_financial_consultation
+from langchain_agent.agent import run_financial_consultation, stream_financial_consultation
 import logging
 import json
 
@@ -47,3 +48,53 @@ async def consult_keuangan(request: ConsultInput):
             "error_details": getattr(e, 'detail', None)
         })
         raise HTTPException(status_code=500, detail=f"Error during consultation: {str(e)}")
+
+def format_sse(event: dict) -> str:
+    """Satu event agent sebagai pesan server-sent events."""
+    data = {key: value for key, value in event.items() if key != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.post("/consult_keuangan/stream")
+async def consult_keuangan_stream(request: ConsultInput):
+    """
+    Streaming variant of /consult_keuangan (text/event-stream): token and
+    tool_start/tool_end events while the agent runs, then `done` with the full reply.
+    """
+    logger.info({
+        "event": "consultation_stream_request",
+        "phone_number": request.phone_number,
+        "message": request.message
+    })
+
+    async def events():
+        try:
+            async for event in stream_financial_consultation(
+                message=request.message,
+                phone_number=request.phone_number
+            ):
+                if event["event"] == "done":
+                    logger.info({
+                        "event": "consultation_success",
+                        "phone_number": request.phone_number,
+                        "reply_length": len(event["reply"]),
+                        "cached": event["cached"],
+                        "streamed": True
+                    })
+                yield format_sse(event)
+        except Exception as e:
+            # Header 200 sudah terkirim: error dilaporkan sebagai event
+            logger.error({
+                "event": "consultation_error",
+                "phone_number": request.phone_number,
+                "error_type": type(e).__name__,
+                "error_message": str(e),
+                "streamed": True
+            })
+            yield format_sse({"event": "error", "detail": f"Error during consultation: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Jangan di-buffer proxy (nginx) agar token langsung sampai ke user
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 from datetime import datetime
 from database.database import get_db
 from models.ai_dataset import AiDataset
+from logic.intent_model import intent_model, training_examples
 import uuid
 
 router = APIRouter(prefix="/dataset", tags=["Dataset"])
@@ -46,3 +47,17 @@ def get_dataset(type: Optional[str] = Query(None), db: Session = Depends(get_db)
         query = query.filter(AiDataset.type == type)
     results = query.order_by(AiDataset.generated_at.desc()).all()
     return [d.to_dict() for d in results]
+
+@router.post("/intent-model/train")
+def train_intent_model(db: Session = Depends(get_db)):
+    rows = db.query(AiDataset).filter(AiDataset.type == "intent").all()
+    texts, intents = training_examples(rows)
+    try:
+        info = intent_model.train(texts, intents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", **info}
+
+@router.get("/intent-model")
+def get_intent_model():
+    return {"loaded": intent_model.is_loaded, **intent_model.info}
@@ -18,7 +18,7 @@ class IntentResponse(BaseModel):
 async def detect_intent(request: IntentRequest):
     try:
         logger.info(f"Detecting intent for: {request.text} from {request.phone_number}")
-        result = classify_intent(request.text)
+        result = await classify_intent(request.text)
         return IntentResponse(intent=result.get("intent"), confidence=result.get("confidence"))
     except Exception as e:
         logger.exception("Intent detection failed")
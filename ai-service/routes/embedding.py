@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Body
-from logic.embedding import generate_embedding
+from logic.embedding import generate_embedding, generate_embeddings
+from config.config import EMBEDDING_BATCH_MAX_ITEMS
 
 router = APIRouter()
 
@@ -13,3 +14,19 @@ async def embed_text(data: dict = Body(...)):
         return {"embedding": embedding}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate_embeddings")
+async def embed_texts(data: dict = Body(...)):
+    texts = data.get("texts")
+    if not isinstance(texts, list) or not texts:
+        raise HTTPException(status_code=400, detail="Texts must be a non-empty list.")
+    if len(texts) > EMBEDDING_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {EMBEDDING_BATCH_MAX_ITEMS} texts per request.")
+    results = await generate_embeddings(texts)
+    items = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            items.append({"index": index, "status": "error", "error": str(result)})
+        else:
+            items.append({"index": index, "status": "success", "embedding": result})
+    return {"results": items}
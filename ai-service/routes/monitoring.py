@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from logic.key_scheduler import scheduler
+from utils import metrics
+from utils.db import pool_status
+
+router = APIRouter()
+
+@router.get("/gemini/keys")
+def gemini_key_status():
+    """Live state of every Gemini API key (token bucket, cooldown, failures)."""
+    return {"keys": scheduler.snapshot()}
+
+@router.get("/metrics")
+def metrics_snapshot():
+    """In-process counters and latency/size summaries, plus the async DB pool."""
+    return {**metrics.snapshot(), "db_pool": pool_status()}
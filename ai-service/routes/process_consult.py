@@ -1,8 +1,11 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from datetime import datetime
+from decimal import Decimal
 from logic.consult_sql_generator import generate_sql_from_question
-from utils.db import execute_query
+from utils.db import execute_read_query, QueryTimeout
+from logic import answer_cache
 import logging
 
 router = APIRouter()
@@ -12,36 +15,55 @@ class ConsultRequest(BaseModel):
     user_id: str
     question: str
 
+def format_rupiah(nilai) -> str:
+    return f"Rp {nilai:,.0f}".replace(",", ".")
+
+def format_answer(result) -> str:
+    if not (isinstance(result, list) and result and isinstance(result[0], dict)):
+        return "Saya tidak menemukan hasil apapun dari pertanyaan kamu."
+    if "category" in result[0] and "total" in result[0]:
+        # Rincian per kategori (atau kategori terbesar)
+        if len(result) == 1:
+            return f"Kategori terbesar kamu adalah {result[0]['category']} sebesar {format_rupiah(result[0]['total'] or 0)}."
+        rincian = "\n".join(f"- {row['category']}: {format_rupiah(row['total'] or 0)}" for row in result)
+        return f"Rincian per kategori:\n{rincian}"
+    first_key = next(iter(result[0]))
+    nilai = result[0][first_key]
+    if nilai is None:
+        return "Totalnya adalah Rp 0."
+    if isinstance(nilai, (int, float, Decimal)):
+        return f"Total kamu adalah {format_rupiah(nilai)}."
+    return f"Hasilnya: {nilai}."
+
 @router.post("/process_consult_keuangan")
 async def process_consult_keuangan(data: ConsultRequest):
     try:
         now = datetime.now().strftime("%Y-%m-%d")
 
-        # Step 1: Generate SQL dari pertanyaan
-        sql = generate_sql_from_question(data.question, data.user_id, now)
+        # Jawaban yang sama hari ini dan belum ada transaksi baru: langsung dari cache
+        cached, version = await answer_cache.get(data.user_id, data.question)
+        if cached is not None:
+            return cached
+
+        # Step 1: SQL berparameter dari template (LLM hanya untuk bentuk pertanyaan baru)
+        sql, params = await generate_sql_from_question(data.question, data.user_id, now)
 
-        if sql.upper().startswith("SELECT"):
-            # Step 2: Eksekusi SQL
-            result = execute_query(sql)
+        if sql.upper().startswith(("SELECT", "WITH")):
+            # Step 2: Eksekusi SQL (async, read-only, dengan statement timeout;
+            # nilai user selalu lewat bind parameter)
+            result = await execute_read_query(sql, params)
 
             # Step 3: Format hasil agar user-friendly
-            if isinstance(result, list) and result and isinstance(result[0], dict):
-                first_key = next(iter(result[0]))
-                nilai = result[0][first_key]
-                if nilai is not None:
-                    formatted = f"Rp {nilai:,.0f}".replace(",", ".")
-                    jawaban = f"Total kamu adalah {formatted}."
-                else:
-                    jawaban = "Totalnya adalah Rp 0."
-            else:
-                jawaban = "Saya tidak menemukan hasil apapun dari pertanyaan kamu."
+            jawaban = format_answer(result)
 
-            return {
+            response = jsonable_encoder({
                 "status": "success",
                 "sql": sql,
                 "result": result,
                 "message": jawaban
-            }
+            })
+            await answer_cache.set(data.user_id, data.question, version, response)
+            return response
 
         elif "UNKNOWN" in sql:
             return {
@@ -52,6 +74,9 @@ async def process_consult_keuangan(data: ConsultRequest):
         else:
             raise HTTPException(status_code=400, detail="Query tidak valid.")
 
+    except QueryTimeout as e:
+        logger.warning({"event": "consult_query_timeout", "user_id": data.user_id, "error": str(e)})
+        raise HTTPException(status_code=504, detail="Pertanyaan ini butuh waktu terlalu lama, coba persempit periodenya.")
     except Exception as e:
         logger.error(f"[ERROR] process_consult_keuangan: {e}")
         raise HTTPException(status_code=500, detail="Terjadi kesalahan pada server.")
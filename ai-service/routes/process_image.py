@@ -1,7 +1,12 @@
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from logic.gemini import extract_expense_from_image
-from logic.utils import save_transaction
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from logic.gemini import extract_expense_from_image, extract_receipt_from_image, stream_receipt_items
+from logic.utils import save_transactions, save_receipt_item, forget_receipt_items
 from logic.classifier import is_transaction_image
+from logic.image_preprocess import prepare_image
+from logic.vision_cache import cache_key, receipt_cache, extraction_cache
+from config.config import RECEIPT_FUSED_CALL
 import logging
 import json
 from pydantic import BaseModel
@@ -25,7 +30,12 @@ async def process_image(
     try:
         logger.info(f"Processing image with caption: {caption}")
         content = await image.read()
-        result = extract_expense_from_image(content, categories)
+        key = await run_in_threadpool(cache_key, content)
+        hit, result = await extraction_cache.get(key)
+        if not hit:
+            prepared = await run_in_threadpool(prepare_image, content)
+            result = await extract_expense_from_image(prepared.data, prepared.mime_type)
+            await extraction_cache.set(key, result)
         logger.info(f"Image processed: {result}")
         return {"status": "success", "data": result}
     except Exception as e:
@@ -52,20 +62,40 @@ async def process_image_expense_keuangan(
         # Log first few bytes of image for debugging
         logger.debug(f"Image bytes preview: {image_bytes[:100]}")
 
-        if not is_transaction_image(image_bytes):
-            logger.warn({
-                "event": "not_transaction_image",
-                "phone_number": phone_number
-            })
-            return {"message": "Gambar tidak terdeteksi sebagai struk transaksi."}
+        # Struk yang sama (forward ulang / retry gateway) dilayani dari cache
+        key = await run_in_threadpool(cache_key, image_bytes)
+        hit, result = await receipt_cache.get(key)
 
         logger.info({
             "event": "extracting_expense",
-            "phone_number": phone_number
+            "phone_number": phone_number,
+            "fused_call": RECEIPT_FUSED_CALL,
+            "cache_hit": hit
         })
 
         try:
-            result = extract_expense_from_image(image_bytes)
+            if not hit:
+                # Kecilkan & re-encode sebelum dikirim ke Gemini Vision
+                prepared = await run_in_threadpool(prepare_image, image_bytes)
+                if RECEIPT_FUSED_CALL:
+                    # Satu panggilan vision: klasifikasi + ekstraksi sekaligus
+                    result = await extract_receipt_from_image(prepared.data, prepared.mime_type)
+                elif await is_transaction_image(prepared.data, prepared.mime_type):
+                    result = await extract_expense_from_image(prepared.data, prepared.mime_type)
+                else:
+                    result = None
+                # Mode dua langkah mengembalikan False juga saat semua key gagal,
+                # jadi "bukan struk" hanya di-cache dari jawaban fused call
+                if result is not None or RECEIPT_FUSED_CALL:
+                    await receipt_cache.set(key, result)
+
+            if result is None:
+                logger.warn({
+                    "event": "not_transaction_image",
+                    "phone_number": phone_number
+                })
+                return {"message": "Gambar tidak terdeteksi sebagai struk transaksi."}
+
             logger.info({
                 "event": "expense_extracted",
                 "phone_number": phone_number,
@@ -75,9 +105,8 @@ async def process_image_expense_keuangan(
             # Handle both single transaction and array of transactions
             transactions = result if isinstance(result, list) else [result]
             
-            # Save each transaction
-            for transaction in transactions:
-                save_transaction(phone_number, transaction)
+            # Simpan semua transaksi dalam satu pipeline
+            await save_transactions(phone_number, transactions)
             
             logger.info({
                 "event": "transactions_saved",
@@ -108,3 +137,84 @@ async def process_image_expense_keuangan(
             "error_details": getattr(e, 'response', None) and getattr(e.response, 'text', None)
         })
         raise HTTPException(status_code=500, detail=str(e))
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+@router.post("/process_image/stream")
+async def process_image_expense_stream(
+    image: UploadFile = File(...),
+    phone_number: str = Form(...)
+):
+    """
+    Streaming variant of /process_image (application/x-ndjson): every receipt
+    item is saved and sent as a `transaction` line as soon as Gemini has
+    generated it, followed by `done` (or `not_receipt` / `error`).
+
+    Items are saved once per image and item index, so retrying a stream that
+    broke halfway does not save them twice. Only a complete result without
+    dropped (invalid) items is cached.
+    """
+    image_bytes = await image.read()
+    logger.info({
+        "event": "image_received",
+        "phone_number": phone_number,
+        "content_type": image.content_type,
+        "file_size": len(image_bytes),
+        "streamed": True
+    })
+    key = await run_in_threadpool(cache_key, image_bytes)
+    hit, cached = await receipt_cache.get(key)
+
+    async def events():
+        transactions, status = [], {"is_receipt": cached is not None, "dropped": 0}
+        try:
+            if hit:
+                transactions = [] if cached is None else cached if isinstance(cached, list) else [cached]
+                await save_transactions(phone_number, transactions)
+                for transaction in transactions:
+                    yield _ndjson({"event": "transaction", "data": transaction})
+            else:
+                prepared = await run_in_threadpool(prepare_image, image_bytes)
+                async for index, transaction in stream_receipt_items(prepared.data, prepared.mime_type, status):
+                    # Disimpan begitu item selesai, sebelum sisa struk selesai dibuat Gemini
+                    await save_receipt_item(phone_number, key.sha256, index, transaction)
+                    transactions.append(transaction)
+                    yield _ndjson({"event": "transaction", "data": transaction})
+                if not status["is_receipt"]:
+                    await receipt_cache.set(key, None)
+                elif not status["dropped"]:
+                    # Hanya struk yang utuh yang di-cache (format sama dengan /process_image)
+                    await receipt_cache.set(key, transactions[0] if len(transactions) == 1 else transactions)
+                    await forget_receipt_items(phone_number, key.sha256)
+
+            logger.info({
+                "event": "transactions_saved",
+                "phone_number": phone_number,
+                "count": len(transactions),
+                "dropped": status["dropped"],
+                "cache_hit": hit,
+                "streamed": True
+            })
+            if not status["is_receipt"]:
+                yield _ndjson({"event": "not_receipt", "message": "Gambar tidak terdeteksi sebagai struk transaksi."})
+            else:
+                yield _ndjson({
+                    "event": "done",
+                    "message": f"Berhasil memproses {len(transactions)} transaksi",
+                    "count": len(transactions),
+                    "dropped": status["dropped"]
+                })
+        except Exception as e:
+            # Header 200 sudah terkirim: item yang sudah disimpan tetap tersimpan
+            logger.error({
+                "event": "image_processing_error",
+                "phone_number": phone_number,
+                "error": str(e),
+                "error_type": type(e).__name__,
+                "saved": len(transactions),
+                "streamed": True
+            })
+            yield _ndjson({"event": "error", "detail": str(e), "saved": len(transactions)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import List
 from models.text_input import TextInput
-from logic.expense_extractor import extract_expense_from_text
+from logic.expense_extractor import extract_expense_from_text, extract_expenses_from_texts
+from config.config import TEXT_BATCH_MAX_ITEMS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,12 +13,18 @@ class TextRequest(BaseModel):
     text: str
     categories: list = None  # Optional list of categories from database
     phone_number: str = None  # Optional phone number
+    user_id: str = None  # Optional UUID user: riwayat transaksi untuk categorizer
+
+class TextBatchRequest(BaseModel):
+    texts: List[str]
+    categories: list = None  # Optional list of categories from database
+    user_id: str = None
 
 @router.post("/process-text")
 async def process_text(request: TextRequest):
     try:
         logger.info(f"Processing transaction text: {request.text}")
-        result = extract_expense_from_text(request.text, request.categories)
+        result = await extract_expense_from_text(request.text, request.categories, request.user_id)
         logger.info(f"Transaction processed: {result}")
         return {"status": "success", "data": result}
     except Exception as e:
@@ -27,9 +35,29 @@ async def process_text(request: TextRequest):
 async def process_expense_keuangan(data: TextInput):
     try:
         logger.info(f"Processing transaction text: {data.text}")
-        result = extract_expense_from_text(data.text)
+        result = await extract_expense_from_text(data.text)
         logger.info(f"Transaction saved: {result}")
         return {"message": "Transaksi berhasil diproses", "data": result}
     except Exception as e:
         logger.exception("Failed to process transaction")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/process-text/batch")
+async def process_text_batch(request: TextBatchRequest):
+    if not request.texts:
+        raise HTTPException(status_code=400, detail="texts must not be empty")
+    if len(request.texts) > TEXT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {TEXT_BATCH_MAX_ITEMS} texts per request")
+    try:
+        logger.info(f"Processing transaction batch: {len(request.texts)} texts")
+        results = await extract_expenses_from_texts(request.texts, request.categories, request.user_id)
+        items = []
+        for index, (status, value) in enumerate(results):
+            if status == "success":
+                items.append({"index": index, "status": "success", "data": value})
+            else:
+                items.append({"index": index, "status": "error", "error": value})
+        return {"status": "success", "results": items}
+    except Exception as e:
+        logger.exception("Failed to process transaction batch")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, File, UploadFile, Form
 from logic.expense_extractor import extract_expense_from_voice
+from logic.gemini import extract_expense_from_voice as transcribe_voice
 import logging
 from pydantic import BaseModel
 from typing import Optional, List
@@ -20,7 +21,9 @@ async def process_voice(
     try:
         logger.info("Processing voice message")
         content = await voice.read()
-        result = extract_expense_from_voice(content, categories)
+        transcript = await transcribe_voice(content)
+        logger.info(f"Voice transcribed: {transcript}")
+        result = await extract_expense_from_voice(transcript, categories)
         logger.info(f"Voice processed: {result}")
         return {"status": "success", "data": result}
     except Exception as e:
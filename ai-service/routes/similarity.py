@@ -0,0 +1,94 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+from logic.embedding import get_embedding_vector, generate_embeddings
+from logic.vector_index import registry
+from logic.categorizer import categorize_many
+from logic.expense_extractor import DEFAULT_CATEGORIES
+from config.config import VECTOR_INDEX_MAX_K
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+class IndexedTransaction(BaseModel):
+    id: str
+    description: str
+    embedding: Optional[List[float]] = None  # dihitung dari description jika kosong
+    category: Optional[str] = None
+    amount: Optional[float] = None
+    type: Optional[str] = None
+    date: Optional[str] = None
+
+class AppendRequest(BaseModel):
+    user_id: str
+    transactions: List[IndexedTransaction]
+
+class SimilarRequest(BaseModel):
+    user_id: str
+    texts: List[str]
+    k: int = 5
+
+class CategorizeRequest(BaseModel):
+    descriptions: List[str]
+    categories: list = None  # Optional list of categories from database
+    user_id: Optional[str] = None  # riwayat transaksi user dipakai untuk voting
+
+@router.post("/vector_index/append")
+async def append_transactions(request: AppendRequest):
+    """Add newly embedded transactions to the user's in-memory index."""
+    missing = [item for item in request.transactions if item.embedding is None]
+    if missing:
+        computed = await generate_embeddings([item.description for item in missing])
+        for item, vector in zip(missing, computed):
+            if isinstance(vector, Exception):
+                raise HTTPException(status_code=502, detail=f"Embedding failed for {item.id}: {vector}")
+            item.embedding = vector
+
+    try:
+        size = await registry.append(
+            request.user_id,
+            [item.id for item in request.transactions],
+            [item.embedding for item in request.transactions],
+            [item.model_dump(exclude={"id", "embedding"}) for item in request.transactions]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "size": size}
+
+@router.post("/similar_transactions")
+async def similar_transactions(request: SimilarRequest):
+    """Top-k most similar past transactions of the user, per query text."""
+    if not request.texts:
+        raise HTTPException(status_code=400, detail="texts must not be empty")
+    k = max(1, min(request.k, VECTOR_INDEX_MAX_K))
+    try:
+        queries = await asyncio.gather(*(get_embedding_vector(text) for text in request.texts))
+        results = await registry.search_many(request.user_id, queries, k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Similarity search failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "results": [
+            [{"id": item_id, "score": round(score, 4), **metadata} for item_id, score, metadata in matches]
+            for matches in results
+        ]
+    }
+
+@router.post("/categorize")
+async def categorize_descriptions(request: CategorizeRequest):
+    """
+    Categorize descriptions by nearest neighbours (user history, then seed
+    phrases). "category" is null when the result is not confident enough.
+    """
+    if not request.descriptions:
+        raise HTTPException(status_code=400, detail="descriptions must not be empty")
+    try:
+        results = await categorize_many(request.descriptions, request.categories or DEFAULT_CATEGORIES, request.user_id)
+    except Exception as e:
+        logger.exception("Categorization failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"results": results}
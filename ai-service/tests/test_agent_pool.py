@@ -0,0 +1,21 @@
+import asyncio
+from langchain.memory import ConversationBufferMemory
+from langchain_agent.pool import AgentPool
+
+def test_agents_are_built_once_per_key_with_their_own_client():
+    async def scenario():
+        pool = AgentPool()
+        pool.startup(["key-one-123", "key-two-456"])
+        first = pool.executor("key-one-123", ConversationBufferMemory(memory_key="chat_history", return_messages=True))
+        second = pool.executor("key-one-123", ConversationBufferMemory(memory_key="chat_history", return_messages=True))
+        other = pool.executor("key-two-456", ConversationBufferMemory(memory_key="chat_history", return_messages=True))
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    # Pydantic menyalin agent (shallow): prompt, parser dan LLM tetap objek yang sama
+    assert first.agent.llm_chain is second.agent.llm_chain
+    assert first.memory is not second.memory
+    assert first.agent.llm_chain is not other.agent.llm_chain
+    llm_one = first.agent.llm_chain.llm
+    llm_two = other.agent.llm_chain.llm
+    assert llm_one.client._async_client is not llm_two.client._async_client
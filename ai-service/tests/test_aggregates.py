@@ -0,0 +1,83 @@
+import asyncio
+from collections import defaultdict
+from logic.aggregates import queue_increments, parse_aggregates, aggregate_key
+
+class RecordingRedis:
+    """Just enough of redis-py for HINCRBY/HINCRBYFLOAT/HGETALL."""
+
+    def __init__(self):
+        self.hashes = defaultdict(dict)
+        self.ttls = {}
+
+    def hincrbyfloat(self, key, field, value):
+        self.hashes[key][field] = str(float(self.hashes[key].get(field, 0)) + value)
+
+    def hincrby(self, key, field, value):
+        self.hashes[key][field] = str(int(self.hashes[key].get(field, 0)) + value)
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        return RecordingPipeline(self)
+
+class RecordingPipeline:
+    """Async pipeline: commands are queued, HGETALLs answered on execute()."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.keys = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hgetall(self, key):
+        self.keys.append(key)
+
+    async def execute(self):
+        return [await self.redis.hgetall(key) for key in self.keys]
+
+def test_increments_are_parsed_back():
+    fake = RecordingRedis()
+    for data in [
+        {"amount": 25000, "category": "Makanan", "date": "2024-03-01", "type": "expense"},
+        {"amount": "50000", "category": "Transportasi", "date": "2024-03-01"},  # dari struk: tanpa type
+        {"amount": 15000, "category": "Makanan", "date": "2024-03-02"},
+        {"amount": 5000000, "category": "Gaji", "date": "2024-03-01", "type": "income"},
+    ]:
+        queue_increments(fake, "0812", "2024-03", data)
+
+    agg = parse_aggregates(asyncio.run(fake.hgetall(aggregate_key("0812", "2024-03"))))
+    assert agg["total"] == {"expense": 90000.0, "income": 5000000.0}
+    assert agg["count"] == {"expense": 3, "income": 1}
+    assert agg["category"]["expense"] == {"Makanan": 40000.0, "Transportasi": 50000.0}
+    assert agg["day"]["expense"] == {"2024-03-01": 75000.0, "2024-03-02": 15000.0}
+    assert fake.ttls[aggregate_key("0812", "2024-03")] > 0
+
+def test_missing_category_counts_as_lainnya():
+    fake = RecordingRedis()
+    queue_increments(fake, "0812", "2024-03", {"amount": 10000, "category": "Lainnya", "date": "2024-03-01"})
+    queue_increments(fake, "0812", "2024-03", {"amount": 5000, "date": "2024-03-01"})
+    agg = parse_aggregates(asyncio.run(fake.hgetall(aggregate_key("0812", "2024-03"))))
+    assert agg["category"]["expense"] == {"Lainnya": 15000.0}
+
+def test_tools_read_aggregates(monkeypatch):
+    from datetime import datetime
+    import langchain_agent.tools as tools
+
+    fake = RecordingRedis()
+    bulan = datetime.now().strftime("%Y-%m")
+    queue_increments(fake, "0812", bulan, {"amount": 30000, "category": "Makanan", "date": f"{bulan}-01"})
+    queue_increments(fake, "0812", bulan, {"amount": 10000, "category": "Hiburan", "date": f"{bulan}-03"})
+    monkeypatch.setattr(tools, "get_redis", lambda: fake)
+
+    assert asyncio.run(tools.total_pengeluaran_bulan_ini("0812")) == "Total pengeluaran bulan ini adalah Rp 40,000"
+    assert "'Makanan'" in asyncio.run(tools.kategori_terbesar_bulan_ini("0812"))
+    assert asyncio.run(tools.rata_rata_harian("0812")) == "Rata-rata pengeluaran harian bulan ini adalah Rp 20,000"
+    assert asyncio.run(tools.prediksi_bulan_depan("0812")) == "Prediksi pengeluaran bulan depan sekitar Rp 20,000"
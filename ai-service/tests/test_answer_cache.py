@@ -0,0 +1,82 @@
+import asyncio
+from datetime import date
+import logic.answer_cache as answer_cache
+
+class HashRedis:
+    """Just enough of redis.asyncio (strings, hashes, pipelines) for the answer cache."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = value
+
+    def pipeline(self, transaction=True):
+        return HashPipeline(self)
+
+class HashPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args) for name, args in self.calls]
+
+def test_answers_are_invalidated_by_a_write(monkeypatch):
+    fake = HashRedis()
+    monkeypatch.setattr(answer_cache, "get_redis", lambda: fake)
+    today = date(2024, 3, 20)
+
+    async def scenario():
+        miss, version = await answer_cache.get("0812", "Total bulan ini?", today)
+        await answer_cache.set("0812", "Total bulan ini?", version, "Rp 40.000", today)
+        hit, _ = await answer_cache.get("0812", "total bulan ini", today)
+        tomorrow, _ = await answer_cache.get("0812", "total bulan ini", date(2024, 3, 21))
+
+        # Transaksi baru (save_transactions memakai pipeline yang sama)
+        async with fake.pipeline() as pipe:
+            answer_cache.queue_data_version_bump(pipe, "0812")
+            await pipe.execute()
+        after_write, new_version = await answer_cache.get("0812", "total bulan ini", today)
+        return miss, hit, tomorrow, after_write, new_version
+
+    miss, hit, tomorrow, after_write, new_version = asyncio.run(scenario())
+    assert miss is None and hit == "Rp 40.000"
+    assert tomorrow is None
+    assert after_write is None and new_version == 1
+
+def test_answer_computed_during_a_write_is_never_served(monkeypatch):
+    fake = HashRedis()
+    monkeypatch.setattr(answer_cache, "get_redis", lambda: fake)
+
+    async def scenario():
+        _, version = await answer_cache.get("0812", "total bulan ini")
+        fake.incr(answer_cache.data_version_key("0812"))  # transaksi masuk saat jawaban dihitung
+        await answer_cache.set("0812", "total bulan ini", version, "jawaban lama")
+        return await answer_cache.get("0812", "total bulan ini")
+
+    assert asyncio.run(scenario()) == (None, 1)
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import time
+import logic.asr as asr
+from logic.asr import WhisperModelHolder
+
+class StubModel:
+    """Whisper model stand-in: records the thread and input of each transcribe."""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **options):
+        self.calls.append((threading.current_thread().name, len(audio), options))
+        return {"text": "  beli kopi 20rb  "}
+
+def test_model_loads_once_and_transcribes_in_the_executor(monkeypatch):
+    loads = []
+
+    def load_model(size):
+        loads.append(size)
+        time.sleep(0.05)  # beban load bersamaan tetap satu kali
+        return StubModel()
+
+    monkeypatch.setattr(asr.whisper, "load_model", load_model)
+    monkeypatch.setattr(asr, "decode_audio", lambda audio_bytes: [0.0] * len(audio_bytes))
+    holder = WhisperModelHolder(model_size="tiny", workers=2)
+
+    async def scenario():
+        await asyncio.gather(holder.load(warmup=True), holder.load(warmup=False))
+        return await asyncio.gather(holder.transcribe(b"ogg"), holder.transcribe(b"opus"))
+
+    try:
+        texts = asyncio.run(scenario())
+    finally:
+        holder.shutdown()
+
+    assert loads == ["tiny"] and holder.is_loaded
+    assert texts == ["beli kopi 20rb", "beli kopi 20rb"]
+    calls = holder._model.calls
+    # Warmup: satu detik hening; lalu dua transkrip, semuanya di thread executor
+    assert calls[0][1] == asr.SAMPLE_RATE
+    assert sorted(length for _, length, _ in calls[1:]) == [3, 4]
+    assert all(name.startswith("whisper") for name, _, _ in calls)
+    assert all(options["fp16"] is False for _, _, options in calls)
@@ -6,10 +6,13 @@ client = TestClient(app)
 
 def test_consult_endpoint_success(monkeypatch):
     # Mock Gemini result
-    def mock_generate_sql(*args, **kwargs):
-        return "SELECT SUM(amount) AS total_pengeluaran FROM transactions WHERE user_id = '1e4d3c4f-ea2e-4b70-9df0-4e317b39130b';"
+    async def mock_generate_sql(*args, **kwargs):
+        return (
+            "SELECT SUM(amount) AS total_pengeluaran FROM transactions WHERE user_id = :user_id",
+            {"user_id": "1e4d3c4f-ea2e-4b70-9df0-4e317b39130b"}
+        )
 
-    def mock_execute_query(sql):
+    async def mock_execute_query(sql, params=None):
         print("MOCK EXECUTE QUERY CALLED")
         return [{"total_pengeluaran": 15560010}]
 
@@ -17,7 +20,8 @@ def test_consult_endpoint_success(monkeypatch):
     import routes.process_consult as pc
     import utils.db as db
     monkeypatch.setattr(pc, "generate_sql_from_question", mock_generate_sql)
-    monkeypatch.setattr(db, "execute_query", mock_execute_query)
+    monkeypatch.setattr(db, "execute_read_query", mock_execute_query)
+    monkeypatch.setattr(pc, "execute_read_query", mock_execute_query)
 
     payload = {
         "user_id": "1e4d3c4f-ea2e-4b70-9df0-4e317b39130b",
@@ -30,8 +34,8 @@ def test_consult_endpoint_success(monkeypatch):
     assert response.json()["result"][0]["total_pengeluaran"] == 15560010
 
 def test_consult_endpoint_unknown(monkeypatch):
-    def mock_generate_sql(*args, **kwargs):
-        return "UNKNOWN"
+    async def mock_generate_sql(*args, **kwargs):
+        return "UNKNOWN", {}
 
     import routes.process_consult as pc
     monkeypatch.setattr(pc, "generate_sql_from_question", mock_generate_sql)
@@ -45,8 +49,23 @@ def test_consult_endpoint_unknown(monkeypatch):
     assert response.status_code == 200
     assert response.json()["status"] == "error"
 
+def test_consult_endpoint_timeout(monkeypatch):
+    async def mock_generate_sql(*args, **kwargs):
+        return "SELECT SUM(amount) AS total FROM transactions WHERE user_id = :user_id", {"user_id": "u1"}
+
+    async def slow_query(sql, params=None):
+        from utils.db import QueryTimeout
+        raise QueryTimeout("Query exceeded 5000 ms")
+
+    import routes.process_consult as pc
+    monkeypatch.setattr(pc, "generate_sql_from_question", mock_generate_sql)
+    monkeypatch.setattr(pc, "execute_read_query", slow_query)
+
+    response = client.post("/api/process_consult_keuangan", json={"user_id": "u1", "question": "total semua?"})
+    assert response.status_code == 504
+
 def test_process_text(monkeypatch):
-    def mock_extract_expense_from_text(text):
+    async def mock_extract_expense_from_text(text):
         return {
             "amount": 10000,
             "category": "makanan",
@@ -70,7 +89,7 @@ def test_process_text(monkeypatch):
     assert response.json()["data"]["category"] == "makanan"
 
 def test_detect_intent(monkeypatch):
-    def mock_classify_intent(text):
+    async def mock_classify_intent(text):
         return {"intent": "view_transaction", "confidence": 0.9}
     import logic.classifier as clf
     monkeypatch.setattr(clf, "classify_intent", mock_classify_intent)
@@ -0,0 +1,66 @@
+import asyncio
+from langchain.agents import AgentExecutor, ConversationalChatAgent
+from langchain.tools import Tool
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import langchain_agent.agent as agent_module
+from langchain_agent.streaming import FinalAnswerStream
+
+TOOL_STEP = '```json\n{"action": "total_pengeluaran", "action_input": "bulan ini"}\n```'
+FINAL_STEP = '```json\n{"action": "Final Answer", "action_input": "Total kamu \\"Rp 40.000\\"\\nHemat ya \\ud83d\\ude00"}\n```'
+REPLY = 'Total kamu "Rp 40.000"\nHemat ya \U0001F600'
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that streams canned replies a few characters at a time."""
+    replies: list
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.replies.pop(0)))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self.replies.pop(0)
+        for start in range(0, len(reply), 5):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=reply[start:start + 5]))
+
+def test_final_answer_is_decoded_across_token_boundaries():
+    tool_step = FinalAnswerStream()
+    assert "".join(tool_step.feed(TOOL_STEP[i:i + 3]) for i in range(0, len(TOOL_STEP), 3)) == ""
+
+    final = FinalAnswerStream()
+    chunks = [final.feed(FINAL_STEP[i:i + 3]) for i in range(0, len(FINAL_STEP), 3)]
+    assert "".join(chunks) == REPLY
+    # Teks keluar bertahap, bukan sekaligus di akhir
+    assert len([chunk for chunk in chunks if chunk]) > 5
+
+def test_consultation_streams_tool_steps_and_tokens(monkeypatch):
+    async def total_pengeluaran(query):
+        return "Rp 40.000"
+
+    tools = [Tool.from_function(func=None, coroutine=total_pengeluaran, name="total_pengeluaran", description="Total pengeluaran")]
+    llm = ScriptedChatModel(replies=[TOOL_STEP, FINAL_STEP])
+    executor = AgentExecutor.from_agent_and_tools(
+        agent=ConversationalChatAgent.from_llm_and_tools(llm=llm, tools=tools), tools=tools
+    )
+
+    async def acquire():
+        return "key-one-123"
+
+    monkeypatch.setattr(agent_module, "USE_REDIS_MEMORY", False)
+    monkeypatch.setattr(agent_module, "_executor", lambda memory, api_key: executor)
+    monkeypatch.setattr(agent_module.scheduler, "acquire", acquire)
+    monkeypatch.setattr(agent_module.scheduler, "report_success", lambda api_key: None)
+
+    async def scenario():
+        return [event async for event in agent_module.stream_financial_consultation("halo, gimana keuanganku?", "0812")]
+
+    events = asyncio.run(scenario())
+    kinds = [event["event"] for event in events]
+    assert kinds.index("tool_start") < kinds.index("tool_end") < kinds.index("token")
+    assert events[kinds.index("tool_end")]["output"] == "Rp 40.000"
+    assert "".join(event["text"] for event in events if event["event"] == "token") == REPLY
+    assert events[-1] == {"event": "done", "reply": REPLY, "cached": False}
@@ -0,0 +1,90 @@
+import asyncio
+import httpx
+import numpy as np
+import logic.embedding as embedding
+from logic import gemini_client, embedding_cache
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.ops = redis, []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.ops.append((key, value))
+
+    async def execute(self):
+        self.redis.data.update(self.ops)
+
+def _setup(monkeypatch, calls):
+    async def single_key(call, label="Gemini"):
+        return await call("test-key")
+
+    async def fake_batch(payload, api_key, model=gemini_client.EMBEDDING_MODEL):
+        texts = [request["content"]["parts"][0]["text"] for request in payload["requests"]]
+        calls.append(texts)
+        if "bad" in texts:
+            request = httpx.Request("POST", "https://example.test")
+            raise httpx.HTTPStatusError("400 Bad Request", request=request, response=httpx.Response(400, request=request))
+        return {"embeddings": [{"values": [float(len(text))]} for text in texts]}
+
+    async def fake_single(payload, api_key, model=gemini_client.EMBEDDING_MODEL):
+        calls.append([payload["content"]["parts"][0]["text"]])
+        return {"embedding": {"values": [0.25, -1.5, 3.0]}}
+
+    redis = FakeRedis()
+    embedding_cache._memory.clear()
+    monkeypatch.setattr(embedding, "call_with_key", single_key)
+    monkeypatch.setattr(gemini_client, "batch_embed_contents", fake_batch)
+    monkeypatch.setattr(gemini_client, "embed_content", fake_single)
+    monkeypatch.setattr(embedding_cache, "get_binary_redis", lambda: redis)
+    return redis
+
+def test_generate_embeddings_chunks_and_keeps_order(monkeypatch):
+    calls = []
+    _setup(monkeypatch, calls)
+    texts = [f"transaksi {i}" for i in range(gemini_client.EMBEDDING_BATCH_LIMIT + 5)]
+    results = asyncio.run(embedding.generate_embeddings(texts))
+    assert sorted(len(chunk) for chunk in calls) == [5, gemini_client.EMBEDDING_BATCH_LIMIT]
+    assert results == [[float(len(text))] for text in texts]
+
+def test_generate_embeddings_reports_item_errors(monkeypatch):
+    calls = []
+    _setup(monkeypatch, calls)
+    results = asyncio.run(embedding.generate_embeddings(["kopi", "", "bad", "bensin"]))
+    assert results[0] == [4.0] and results[3] == [6.0]
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], httpx.HTTPStatusError)
+
+def test_embedding_cache_serves_repeats_without_api_calls(monkeypatch):
+    calls = []
+    redis = _setup(monkeypatch, calls)
+
+    first = asyncio.run(embedding.generate_embedding("Indomaret"))
+    assert first == [0.25, -1.5, 3.0]
+    # Disimpan packed float32: 4 byte per dimensi
+    assert [len(raw) for raw in redis.data.values()] == [12]
+
+    vector = asyncio.run(embedding.get_embedding_vector("  indomaret "))
+    assert vector.dtype == np.float32 and vector.tolist() == first
+    assert len(calls) == 1
+
+    # Memori kosong (misal restart): diambil dari Redis
+    embedding_cache._memory.clear()
+    results = asyncio.run(embedding.generate_embeddings(["INDOMARET", "gojek"]))
+    assert results[0] == first and results[1] == [5.0]
+    assert calls == [["Indomaret"], ["gojek"]]
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from logic.intent_model import IntentModel, canonical_intent, training_examples
+
+EXAMPLES = {
+    "add_transaction": ["beli kopi 25rb", "makan siang 35rb", "bayar listrik 200rb", "isi bensin 50 ribu",
+                        "parkir 5rb", "beli pulsa 100k", "jajan bakso 20rb", "belanja sayur 45rb"],
+    "consultation": ["berapa pengeluaran bulan ini", "total belanja minggu ini berapa", "kategori paling boros apa",
+                     "ringkasan keuangan bulan lalu", "pengeluaran makan bulan ini berapa", "rekap bulan ini",
+                     "berapa sisa budget", "laporan pengeluaran minggu lalu"],
+    "unknown": ["halo", "terima kasih", "selamat pagi", "apa kabar", "oke siap", "makasih ya", "hai bot", "sip"],
+}
+
+def _train(tmp_path):
+    texts = [text for examples in EXAMPLES.values() for text in examples]
+    intents = [intent for intent, examples in EXAMPLES.items() for _ in examples]
+    model = IntentModel(str(tmp_path / "intent_model.joblib"))
+    model.train(texts, intents)
+    return model
+
+def test_training_examples_accept_aliases():
+    rows = [
+        SimpleNamespace(input="hapus transaksi tadi", label="hapus_transaksi", json_data=None),
+        SimpleNamespace(input="beli kopi", label=None, json_data={"intent": "TRANSACTION"}),
+        SimpleNamespace(input="???", label="tidak_dikenal", json_data={}),
+    ]
+    assert training_examples(rows) == (["hapus transaksi tadi", "beli kopi"], ["delete_transaction", "add_transaction"])
+    assert canonical_intent("lihat transaksi") == "view_transaction"
+
+def test_intent_model_predicts_and_persists(tmp_path):
+    model = _train(tmp_path)
+    assert model.predict("beli nasi goreng 15rb")[0] == "add_transaction"
+    assert model.predict("berapa total pengeluaran bulan ini")[0] == "consultation"
+
+    reloaded = IntentModel(model.path)
+    assert reloaded.load()
+    assert reloaded.predict("beli nasi goreng 15rb") == model.predict("beli nasi goreng 15rb")
+
+    start = time.perf_counter()
+    for _ in range(200):
+        model.predict("beli nasi goreng 15rb")
+    assert (time.perf_counter() - start) / 200 < 0.001
+
+def test_classify_intent_skips_llm_when_model_is_confident(tmp_path, monkeypatch):
+    import logic.classifier as clf
+
+    calls = []
+
+    async def fake_llm(text):
+        calls.append(text)
+        return "NONE"
+
+    monkeypatch.setattr(clf, "intent_model", _train(tmp_path))
+    monkeypatch.setattr(clf, "classify_message_intent", fake_llm)
+    monkeypatch.setattr(clf, "INTENT_MODEL_MIN_CONFIDENCE", 0.5)
+
+    result = asyncio.run(clf.classify_intent("beli kopi 30rb"))
+    assert result["intent"] == "add_transaction"
+    assert calls == []
+
+    monkeypatch.setattr(clf, "INTENT_MODEL_MIN_CONFIDENCE", 1.01)
+    assert asyncio.run(clf.classify_intent("beli kopi 30rb"))["intent"] == "unknown"
+    assert calls == ["beli kopi 30rb"]
@@ -0,0 +1,70 @@
+import asyncio
+import httpx
+import pytest
+from logic.key_scheduler import KeyScheduler, NoAvailableKeyError, parse_retry_after
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def make_scheduler(clock, **kwargs):
+    options = dict(rate_per_minute=60, burst=2, cooldown_seconds=30, failure_threshold=3, disable_seconds=300)
+    options.update(kwargs)
+    return KeyScheduler(["key-aaaaaaaa", "key-bbbbbbbb"], clock=clock, **options)
+
+def test_acquire_spreads_load_across_keys():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    used = [asyncio.run(scheduler.acquire()) for _ in range(4)]
+    assert used.count("key-aaaaaaaa") == 2
+    assert used.count("key-bbbbbbbb") == 2
+
+def test_rate_limited_key_is_skipped_until_retry_after():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    scheduler.report_failure("key-aaaaaaaa", 429, retry_after=10)
+    assert asyncio.run(scheduler.acquire()) == "key-bbbbbbbb"
+    assert asyncio.run(scheduler.acquire()) == "key-bbbbbbbb"
+
+    clock.now += 11
+    assert asyncio.run(scheduler.acquire()) == "key-aaaaaaaa"
+
+def test_failing_key_is_disabled():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    for _ in range(3):
+        scheduler.report_failure("key-aaaaaaaa", 503)
+    states = {s["key"]: s for s in scheduler.snapshot()}
+    assert states["key-aaaa..."]["status"] == "disabled"
+    assert states["key-bbbb..."]["status"] == "active"
+
+def test_acquire_times_out_when_all_keys_blocked():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    scheduler.report_failure("key-aaaaaaaa", 429, retry_after=120)
+    scheduler.report_failure("key-bbbbbbbb", 429, retry_after=120)
+    with pytest.raises(NoAvailableKeyError):
+        asyncio.run(scheduler.acquire(timeout=5))
+
+def test_parse_retry_after_header_and_body():
+    response = httpx.Response(429, headers={"Retry-After": "7"})
+    assert parse_retry_after(response) == 7.0
+
+    body = {"error": {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "32s"}]}}
+    response = httpx.Response(429, json=body)
+    assert parse_retry_after(response) == 32.0
+
+def test_malformed_retry_after_falls_back_to_default_cooldown():
+    response = httpx.Response(429, headers={"Retry-After": "soon"})
+    assert parse_retry_after(response) is None
+
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    scheduler.report_failure("key-aaaaaaaa", 429, retry_after=parse_retry_after(response))
+    clock.now += 29
+    assert asyncio.run(scheduler.acquire()) == "key-bbbbbbbb"
+    clock.now += 2
+    assert asyncio.run(scheduler.acquire()) == "key-aaaaaaaa"
@@ -0,0 +1,158 @@
+import asyncio
+from langchain.schema import HumanMessage, AIMessage
+from langchain_agent.memory import RedisConversationMemory, fit_token_budget, get_memory
+
+class ListRedis:
+    """Just enough of redis.asyncio (lists, strings, pipelines) for the memory."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.round_trips = 0
+
+    def _range(self, items, start, end):
+        size = len(items)
+        start = max(start + size if start < 0 else start, 0)
+        end = end + size if end < 0 else end
+        return items[start:end + 1]
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    def lrange(self, key, start, end):
+        return self._range(self.data.get(key, []), start, end)
+
+    def ltrim(self, key, start, end):
+        self.data[key] = self._range(self.data.get(key, []), start, end)
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return ListPipeline(self)
+
+class ListPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        results = []
+        for name, args, kwargs in self.calls:
+            result = getattr(self.redis, name)(*args, **kwargs)
+            results.append(await result if asyncio.iscoroutine(result) else result)
+        return results
+
+async def _turns(memory, count):
+    for i in range(count):
+        await memory.asave_context({"input": f"tanya {i}"}, {"output": f"jawab {i}"})
+
+def _history(memory):
+    return asyncio.run(memory.aload_memory_variables({}))["chat_history"]
+
+def test_memory_keeps_only_window_and_writes_once_per_turn():
+    fake = ListRedis()
+    memory = RedisConversationMemory(phone_number="0812", redis_client=fake, max_turns=3, system_prompt="Kamu asisten.")
+    asyncio.run(_turns(memory, 10))
+    assert fake.round_trips == 10
+    assert len(fake.data[memory.key]) == 6
+    assert fake.ttls[memory.key] == memory.ttl
+
+    history = _history(memory)
+    assert fake.round_trips == 11
+    # Pasangan konteks (system prompt) + 3 giliran terakhir, tanpa duplikasi antar load
+    assert history[0].content == "Kamu asisten." and isinstance(history[1], AIMessage)
+    assert [m.content for m in history[2:]] == ["tanya 7", "jawab 7", "tanya 8", "jawab 8", "tanya 9", "jawab 9"]
+    assert _history(memory) == history
+
+def test_token_budget_drops_oldest_whole_turns():
+    messages = [HumanMessage(content="a" * 400), AIMessage(content="b" * 400),
+                HumanMessage(content="c" * 40), AIMessage(content="d" * 40)]
+    assert [m.content[0] for m in fit_token_budget(messages, 150)] == ["c", "d"]
+    assert fit_token_budget(messages, 15) == []
+
+def test_evicted_turns_are_summarized():
+    fake = ListRedis()
+    folded = []
+
+    async def summarizer(previous, messages):
+        folded.extend(m.content for m in messages)
+        return f"{previous}+{len(messages)}"
+
+    memory = RedisConversationMemory(phone_number="0812", redis_client=fake, max_turns=2, summarizer=summarizer)
+    asyncio.run(_turns(memory, 4))
+    assert folded == ["tanya 0", "jawab 0", "tanya 1", "jawab 1"]
+    assert "+2+2" in _history(memory)[0].content
+    asyncio.run(memory.aclear())
+    assert _history(memory) == []
+
+def test_buffer_memory_starts_with_context_pair():
+    memory = get_memory("buffer", system_prompt="Kamu asisten.")
+    history = memory.load_memory_variables({})["chat_history"]
+    assert [type(m) for m in history] == [HumanMessage, AIMessage]
+
+class SyncListRedis(ListRedis):
+    """The same fake for redis-py's blocking client."""
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return SyncListPipeline(self)
+
+class SyncListPipeline(ListPipeline):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self):
+        self.redis.round_trips += 1
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+def test_sync_memory_api_uses_the_blocking_client():
+    fake = SyncListRedis()
+
+    async def summarizer(previous, messages):
+        return f"{previous}+{len(messages)}"
+
+    memory = RedisConversationMemory(phone_number="0812", sync_redis_client=fake, max_turns=2, summarizer=summarizer)
+    for i in range(3):
+        memory.save_context({"input": f"tanya {i}"}, {"output": f"jawab {i}"})
+    assert fake.round_trips == 3 and len(fake.data[memory.key]) == 4
+
+    history = memory.load_memory_variables({})["chat_history"]
+    assert "+2" in history[0].content
+    assert [m.content for m in history[2:]] == ["tanya 1", "jawab 1", "tanya 2", "jawab 2"]
+    memory.clear()
+    assert memory.load_memory_variables({})["chat_history"] == []
@@ -0,0 +1,277 @@
+import json
+from logic.gemini import receipt_result
+from logic.structured_output import parse_response
+from models.extraction import DEFAULT_CATEGORIES, FusedReceipt
+
+def fused_receipt(payload: dict) -> FusedReceipt:
+    return parse_response(json.dumps(payload), FusedReceipt, categories=DEFAULT_CATEGORIES)
+
+def test_fused_response_not_receipt():
+    receipt = fused_receipt({"is_receipt": False, "transactions": []})
+    assert receipt.is_receipt is False
+
+def test_fused_response_receipt():
+    receipt = fused_receipt({
+        "is_receipt": True,
+        "transactions": [
+            {"amount": "Rp 25.000", "category": "Makanan", "description": "Nasi Goreng", "date": "2024-03-20"},
+            {"amount": 15000, "category": "Snack", "description": "Es Teh", "date": None}
+        ]
+    })
+    result = receipt_result(receipt)
+    assert [t["amount"] for t in result] == ["25000", "15000"]
+    assert result[1]["category"] == "Lainnya"
+    assert result[1]["date"]
+
+def make_image_bytes(fmt: str, size=(3000, 2000), color=(250, 250, 250)) -> bytes:
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+def test_sniff_mime_type():
+    from logic.image_preprocess import sniff_mime_type
+    assert sniff_mime_type(make_image_bytes("PNG", (10, 10))) == "image/png"
+    assert sniff_mime_type(make_image_bytes("WEBP", (10, 10))) == "image/webp"
+    assert sniff_mime_type(make_image_bytes("JPEG", (10, 10))) == "image/jpeg"
+    assert sniff_mime_type(b"not an image") is None
+
+def test_prepare_image_downscales_and_converts_to_grayscale():
+    from logic.image_preprocess import prepare_image
+    from config.config import IMAGE_MAX_EDGE
+    prepared = prepare_image(make_image_bytes("PNG"))
+    assert prepared.mime_type == "image/jpeg"
+    assert max(prepared.width, prepared.height) == IMAGE_MAX_EDGE
+    assert prepared.grayscale
+    assert prepared.bytes_saved > 0
+
+def test_prepare_image_keeps_colored_small_image_format():
+    from logic.image_preprocess import prepare_image
+    original = make_image_bytes("PNG", (40, 40), (200, 30, 30))
+    prepared = prepare_image(original)
+    assert not prepared.grayscale
+    assert len(prepared.data) <= len(original)
+
+def test_vision_cache_memory_hit(monkeypatch):
+    import asyncio
+    import logic.vision_cache as vc
+
+    class BrokenRedis:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+        async def set(self, *args, **kwargs):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(vc, "get_redis", lambda: BrokenRedis())
+    cache = vc.VisionCache("test")
+    key = vc.cache_key(make_image_bytes("PNG", (40, 40), (250, 250, 250)))
+    # Struk lain dengan tata letak mirip: hanya gambar yang identik yang boleh berbagi hasil
+    similar_key = vc.cache_key(make_image_bytes("PNG", (40, 40), (249, 250, 250)))
+
+    assert asyncio.run(cache.get(key)) == (False, None)
+    asyncio.run(cache.set(key, {"amount": "5000"}))
+    assert asyncio.run(cache.get(key)) == (True, {"amount": "5000"})
+    assert asyncio.run(cache.get(similar_key)) == (False, None)
+
+def test_json_array_items_are_emitted_as_soon_as_they_close():
+    from logic.json_stream import JsonArrayItems
+    text = json.dumps({"is_receipt": True, "transactions": [
+        {"amount": 25000, "description": "Nasi {goreng} \"spesial\"", "tags": [1, 2]},
+        {"amount": 15000, "description": "Es Teh ]"},
+    ]})
+    parser = JsonArrayItems("transactions")
+    emitted = [(position, item) for position in range(0, len(text), 4) for item in parser.feed(text[position:position + 4])]
+
+    assert [item["amount"] for _, item in emitted] == [25000, 15000]
+    assert emitted[0][1]["description"] == 'Nasi {goreng} "spesial"'
+    assert emitted[0][0] < text.index("Es Teh")
+    assert parser.finished
+
+def test_receipt_items_stream_before_the_response_ends(monkeypatch):
+    import asyncio
+    import httpx
+    import logic.gemini as gemini
+    import logic.structured_output as structured_output
+
+    text = json.dumps({"is_receipt": True, "transactions": [
+        {"amount": 25000, "category": "Makanan", "description": "Nasi Goreng", "date": "2024-03-20"},
+        {"amount": "abc", "category": "Makanan", "description": "Rusak", "date": None},
+        {"amount": 15000, "category": "Snack", "description": "Es Teh", "date": None},
+    ]})
+    chunks = [text[position:position + 40] for position in range(0, len(text), 40)]
+    sent = []
+
+    async def sse_body():
+        for index, chunk in enumerate(chunks):
+            sent.append(index)
+            finish = {"finishReason": "STOP"} if index == len(chunks) - 1 else {}
+            event = {"candidates": [{"content": {"parts": [{"text": chunk}]}, **finish}]}
+            yield f"data: {json.dumps(event)}\r\n\r\n".encode()
+
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=sse_body(), headers={"Content-Type": "text/event-stream"})
+
+    async def call_with_key(call, label=None):
+        return await call("key-one-123")
+
+    monkeypatch.setattr(structured_output, "call_with_key", call_with_key)
+
+    async def scenario():
+        client = httpx.AsyncClient(base_url=gemini.gemini_client.GEMINI_BASE_URL, transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(gemini.gemini_client, "_client", client)
+        received = []
+        async for index, item in gemini.stream_receipt_items(b"image", status=status):
+            received.append((len(sent), index, item))
+        await client.aclose()
+        return received
+
+    status = {}
+    received = asyncio.run(scenario())
+    assert requests[0].url.path.endswith(":streamGenerateContent") and requests[0].url.params["alt"] == "sse"
+    assert [item["amount"] for _, _, item in received] == ["25000", "15000"]
+    # Indeks = posisi di struk, termasuk item yang gagal validasi
+    assert [index for _, index, _ in received] == [0, 2]
+    assert received[1][2]["category"] == "Lainnya"
+    assert status == {"is_receipt": True, "dropped": 1}
+    # Item pertama keluar sebelum seluruh respons terkirim
+    assert received[0][0] < len(chunks)
+
+def _stream_gemini(monkeypatch, payload: dict):
+    import httpx
+    import logic.gemini as gemini
+    import logic.structured_output as structured_output
+
+    text = json.dumps(payload)
+    events = [{"candidates": [{"content": {"parts": [{"text": text[position:position + 30]}]}}]}
+              for position in range(0, len(text), 30)]
+    events[-1]["candidates"][0]["finishReason"] = "STOP"
+    body = "".join(f"data: {json.dumps(event)}\r\n\r\n" for event in events).encode()
+
+    async def call_with_key(call, label=None):
+        return await call("key-one-123")
+
+    monkeypatch.setattr(structured_output, "call_with_key", call_with_key)
+    client = httpx.AsyncClient(
+        base_url=gemini.gemini_client.GEMINI_BASE_URL,
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body)))
+    monkeypatch.setattr(gemini.gemini_client, "_client", client)
+    return gemini
+
+def test_streamed_items_are_dropped_when_the_image_is_not_a_receipt(monkeypatch):
+    import asyncio
+
+    gemini = _stream_gemini(monkeypatch, {"is_receipt": False, "transactions": [
+        {"amount": 25000, "category": "Makanan", "description": "Poster", "date": None},
+    ]})
+
+    async def scenario():
+        return [item async for item in gemini.stream_receipt_items(b"image", status=status)]
+
+    status = {}
+    assert asyncio.run(scenario()) == []
+    assert status == {"is_receipt": False, "dropped": 0}
+
+class ReceiptRoute:
+    """Drives /process_image/stream with a scripted Gemini stream, recording saves and cache writes."""
+
+    def __init__(self, monkeypatch):
+        from types import SimpleNamespace
+        import logic.utils as utils
+        import routes.process_image as route
+
+        self.route, self.saved, self.cached, self.marks, self.script = route, [], {}, {}, []
+        test = self
+
+        class SetRedis:
+            async def sadd(self, key, member):
+                members = test.marks.setdefault(key, set())
+                added = member not in members
+                members.add(member)
+                return int(added)
+
+            async def srem(self, key, member):
+                test.marks.get(key, set()).discard(member)
+
+            async def expire(self, key, ttl):
+                pass
+
+            async def delete(self, key):
+                test.marks.pop(key, None)
+
+        async def save_transactions(phone_number, transactions):
+            self.saved.extend(transactions)
+
+        async def stream_receipt_items(image_bytes, mime_type, status):
+            items, status["is_receipt"], status["dropped"], error = self.script.pop(0)
+            for index, item in items:
+                yield index, item
+            if error:
+                raise ValueError(error)
+
+        async def cache_get(key):
+            return (key.sha256 in self.cached), self.cached.get(key.sha256)
+
+        async def cache_set(key, result):
+            self.cached[key.sha256] = result
+
+        monkeypatch.setattr(utils, "get_redis", lambda: SetRedis())
+        monkeypatch.setattr(utils, "save_transactions", save_transactions)
+        monkeypatch.setattr(route, "save_transactions", save_transactions)
+        monkeypatch.setattr(route, "stream_receipt_items", stream_receipt_items)
+        monkeypatch.setattr(route, "prepare_image", lambda data: SimpleNamespace(data=data, mime_type="image/jpeg"))
+        monkeypatch.setattr(route.receipt_cache, "get", cache_get)
+        monkeypatch.setattr(route.receipt_cache, "set", cache_set)
+
+    def post(self, image: bytes = b"struk"):
+        import asyncio
+        from types import SimpleNamespace
+
+        async def read():
+            return image
+
+        async def scenario():
+            upload = SimpleNamespace(read=read, content_type="image/jpeg")
+            response = await self.route.process_image_expense_stream(image=upload, phone_number="0812")
+            return [json.loads(line) async for line in response.body_iterator]
+
+        return asyncio.run(scenario())
+
+NASI = {"amount": "25000", "category": "Makanan", "description": "Nasi Goreng", "date": "2024-03-20"}
+TEH = {"amount": "15000", "category": "Makanan", "description": "Es Teh", "date": "2024-03-20"}
+
+def test_retrying_a_broken_receipt_stream_does_not_save_twice(monkeypatch):
+    app = ReceiptRoute(monkeypatch)
+    app.script = [
+        ([(0, NASI)], True, 0, "stream putus"),
+        ([(0, NASI), (1, TEH)], True, 0, None),
+    ]
+    first = app.post()
+    assert first[-1]["event"] == "error" and not app.cached
+
+    second = app.post()
+    assert second[-1]["event"] == "done" and second[-1]["count"] == 2
+    assert app.saved == [NASI, TEH]
+    assert app.cached == {next(iter(app.cached)): [NASI, TEH]}
+    # Tanda item tersimpan dihapus setelah hasilnya di-cache
+    assert app.marks == {}
+
+def test_receipt_stream_with_dropped_items_is_not_cached(monkeypatch):
+    app = ReceiptRoute(monkeypatch)
+    app.script = [([], True, 2, None)]
+    events = app.post()
+    # Struk asli yang itemnya gagal divalidasi bukan "bukan struk"
+    assert events == [{"event": "done", "message": "Berhasil memproses 0 transaksi", "count": 0, "dropped": 2}]
+    assert app.cached == {}
+
+def test_not_a_receipt_is_reported_and_cached(monkeypatch):
+    app = ReceiptRoute(monkeypatch)
+    app.script = [([], False, 0, None)]
+    assert app.post()[-1]["event"] == "not_receipt"
+    assert list(app.cached.values()) == [None]
+    # Kiriman ulang dilayani cache, tanpa panggilan Gemini
+    assert app.post()[-1]["event"] == "not_receipt"
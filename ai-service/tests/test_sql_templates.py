@@ -0,0 +1,148 @@
+import asyncio
+from datetime import date
+import logic.consult_sql_generator as generator
+import logic.sql_templates as templates
+from logic.sql_templates import parse_question, builtin_sql, validate_template
+
+TODAY = date(2024, 3, 20)
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+def test_questions_are_reduced_to_shapes_and_params():
+    first = parse_question("Berapa pengeluaran makan bulan ini?", TODAY)
+    second = parse_question("berapa pengeluaran transport bulan lalu", TODAY)
+    assert first["shape"] == second["shape"] == "berapa {type} {category} {period}"
+    assert first["kind"] == "total"
+    assert first["params"] == {"start_date": date(2024, 3, 1), "end_date": TODAY, "category": "Makanan", "type": "expense"}
+    assert second["params"]["end_date"] == date(2024, 2, 29)
+
+    by_category = parse_question("total pengeluaran per kategori dari 1 maret sampai 10 maret", TODAY)
+    assert by_category["kind"] == "by_category"
+    assert (by_category["params"]["start_date"], by_category["params"]["end_date"]) == (date(2024, 3, 1), date(2024, 3, 10))
+    assert parse_question("kategori apa yang paling boros minggu ini", TODAY)["kind"] == "top_category"
+    # Kata kunci dicari di deskripsi, bukan diperluas ke seluruh kategori
+    assert parse_question("habis berapa buat kopi", TODAY)["params"]["keyword"] == "%kopi%"
+    assert parse_question("berapa kali saya beli kopi bulan ini", TODAY)["kind"] is None
+
+def test_builtin_sql_binds_every_value():
+    parsed = parse_question("berapa pemasukan bulan ini", TODAY)
+    sql = builtin_sql(parsed["kind"], parsed["params"])
+    assert "user_id = :user_id" in sql and ":start_date" in sql and ":category" not in sql
+    assert parsed["params"]["type"] == "income"
+
+def test_whole_month_questions_read_the_rollups():
+    for question in ["berapa pengeluaran makan bulan ini", "total pengeluaran per kategori bulan lalu", "total pemasukan saya"]:
+        parsed = parse_question(question, TODAY)
+        assert parsed["whole_months"]
+        assert "FROM transaction_monthly_rollups" in builtin_sql(parsed["kind"], parsed["params"], parsed["whole_months"])
+    # Rentang sebagian bulan atau kata kunci deskripsi tetap membaca tabel transaksi
+    for question in ["total pengeluaran 7 hari terakhir", "habis berapa buat kopi bulan ini"]:
+        parsed = parse_question(question, TODAY)
+        assert "FROM transactions" in builtin_sql(parsed["kind"], parsed["params"], parsed["whole_months"])
+
+def test_llm_sql_is_validated_and_learned(monkeypatch):
+    calls = []
+
+    async def fake_gemini(prompt):
+        calls.append(prompt)
+        return "```sql\nSELECT COUNT(*) AS jumlah FROM transactions WHERE user_id = :user_id AND description ILIKE :keyword AND transaction_date BETWEEN :start_date AND :end_date;\n```"
+
+    monkeypatch.setattr(generator, "call_gemini", fake_gemini)
+    monkeypatch.setattr(templates, "get_redis", lambda: DictRedis())
+    monkeypatch.setattr(generator, "template_store", templates.TemplateStore())
+
+    sql, params = asyncio.run(generator.generate_sql_from_question("berapa kali beli kopi bulan ini", "user-1", "2024-03-20"))
+    again, other = asyncio.run(generator.generate_sql_from_question("berapa kali beli bensin bulan lalu", "user-2", "2024-03-20"))
+    assert len(calls) == 1
+    assert sql == again and sql.startswith("SELECT COUNT(*)")
+    assert params == {"user_id": "user-1", "keyword": "%kopi%", "start_date": date(2024, 3, 1), "end_date": TODAY}
+    assert other["keyword"] == "%bensin%" and other["user_id"] == "user-2"
+
+def test_unsafe_llm_sql_is_rejected():
+    assert validate_template("SELECT 1 FROM transactions WHERE user_id = :user_id; DROP TABLE transactions", {}) is None
+    assert validate_template("DELETE FROM transactions WHERE user_id = :user_id", {}) is None
+    assert validate_template("SELECT SUM(amount) FROM transactions", {}) is None
+    assert validate_template("SELECT SUM(amount) FROM transactions WHERE user_id = :user_id AND category = :kategori", {}) is None
+
+def test_llm_sql_must_filter_every_table_by_user():
+    params = {"start_date": "2024-03-01", "category": "Makanan"}
+    # Filter user_id hanya dihitung bila di level teratas WHERE dan digabung AND
+    assert validate_template("SELECT SUM(amount) FROM transactions WHERE user_id = :user_id OR TRUE", params) is None
+    assert validate_template("SELECT SUM(amount) FROM transactions WHERE (user_id = :user_id OR category = :category)", params) is None
+    assert validate_template("SELECT SUM(amount) FROM transactions WHERE user_id <> :user_id", params) is None
+    assert validate_template(
+        "SELECT SUM(amount) FROM transactions WHERE user_id = :user_id "
+        "UNION SELECT SUM(amount) FROM transactions WHERE category = :category", params
+    ) is None
+    assert validate_template(
+        "SELECT SUM(amount) FROM transactions t WHERE t.user_id = :user_id "
+        "AND transaction_date BETWEEN :start_date AND CURRENT_DATE AND (category = :category OR category = 'Lainnya')", params
+    )
+    assert validate_template(
+        "WITH per_kategori AS (SELECT category, SUM(amount) AS total FROM transactions "
+        "WHERE user_id = :user_id GROUP BY category) SELECT category FROM per_kategori ORDER BY total DESC LIMIT 1", {}
+    )
+
+def test_llm_sql_is_limited_to_user_filtered_transaction_tables():
+    # Setiap tabel yang dibaca butuh filter user_id miliknya sendiri
+    assert validate_template("SELECT u.* FROM transactions t JOIN users u ON true WHERE t.user_id = :user_id", {}) is None
+    assert validate_template("SELECT * FROM users WHERE user_id = :user_id", {}) is None
+    assert validate_template("SELECT a.amount FROM transactions a, transactions b WHERE a.user_id = :user_id", {}) is None
+    assert validate_template(
+        "SELECT SUM(t.amount) FROM transactions t JOIN transaction_monthly_rollups r ON r.category = t.category "
+        "WHERE user_id = :user_id", {}
+    ) is None
+    assert validate_template(
+        "SELECT SUM(t.amount) FROM transactions t JOIN transaction_monthly_rollups r ON r.category = t.category "
+        "WHERE t.user_id = :user_id AND r.user_id = :user_id", {}
+    )
+
+def test_llm_sql_must_bind_every_slot_of_the_question():
+    parsed = parse_question("berapa kali beli kopi bulan ini", TODAY)
+    params = parsed["params"]
+    # Nilai slot tertanam: template tidak berlaku untuk pertanyaan lain dengan shape sama
+    assert validate_template(
+        "SELECT COUNT(*) FROM transactions WHERE user_id = :user_id AND description ILIKE '%kopi%' "
+        "AND transaction_date >= '2024-03-01'", params
+    ) is None
+    assert validate_template(
+        "SELECT COUNT(*) FROM transactions WHERE user_id = :user_id AND description ILIKE :keyword "
+        "AND transaction_date >= '2024-03-01'", {"keyword": "%kopi%"}
+    ) is None
+    assert validate_template(
+        "SELECT COUNT(*) FROM transactions WHERE user_id = :user_id AND description ILIKE :keyword", params
+    ) is None
+    assert validate_template(
+        "SELECT COUNT(*) FROM transactions WHERE user_id = :user_id AND description ILIKE :keyword "
+        "AND transaction_date BETWEEN :start_date AND :end_date", params
+    )
+
+def test_learned_rollup_sql_is_not_reused_for_day_ranges(monkeypatch):
+    prompts = []
+    rollup_sql = "SELECT SUM(tx_count) AS jumlah FROM transaction_monthly_rollups WHERE user_id = :user_id AND type = :type AND month BETWEEN :start_date AND :end_date"
+
+    async def fake_gemini(prompt):
+        prompts.append(prompt)
+        return rollup_sql
+
+    monkeypatch.setattr(generator, "call_gemini", fake_gemini)
+    monkeypatch.setattr(templates, "get_redis", lambda: DictRedis())
+    monkeypatch.setattr(generator, "template_store", templates.TemplateStore())
+
+    month_question, day_question = "berapa kali transaksi bulan lalu", "berapa kali transaksi kemarin"
+    assert parse_question(month_question, TODAY)["shape"] == parse_question(day_question, TODAY)["shape"]
+
+    sql, _ = asyncio.run(generator.generate_sql_from_question(month_question, "user-1", "2024-03-20"))
+    assert sql == rollup_sql
+    # Shape sama, periode harian: template bulanan tidak dipakai, rollup SQL ditolak
+    sql, params = asyncio.run(generator.generate_sql_from_question(day_question, "user-1", "2024-03-20"))
+    assert len(prompts) == 2 and "transaction_monthly_rollups" not in prompts[1]
+    assert (sql, params) == ("UNKNOWN", {})
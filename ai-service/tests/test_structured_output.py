@@ -0,0 +1,55 @@
+import asyncio
+import json
+import logic.structured_output as structured_output
+import logic.expense_extractor as extractor
+
+CATEGORIES = ["Makanan", "Transportasi", "Lainnya"]
+
+def gemini_response(payload, finish_reason="STOP") -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": json.dumps(payload)}]}, "finishReason": finish_reason}]}
+
+def test_text_extraction_requests_schema_and_tight_output(monkeypatch):
+    payloads = []
+
+    async def fake_generate_content(payload, api_key):
+        payloads.append(payload)
+        return gemini_response({"amount": 20000, "category": "Makanan", "description": "Kopi di Indomaret", "date": None})
+
+    async def call_with_key(call, label=None):
+        return await call("key-one-123")
+
+    async def no_cache(*args):
+        return None
+
+    monkeypatch.setattr(extractor, "RULE_PARSER_ENABLED", False)
+    monkeypatch.setattr(structured_output.gemini_client, "generate_content", fake_generate_content)
+    monkeypatch.setattr(structured_output, "call_with_key", call_with_key)
+    monkeypatch.setattr(extractor.text_cache, "get", no_cache)
+    monkeypatch.setattr(extractor.text_cache, "set", no_cache)
+
+    data = asyncio.run(extractor.extract_expense_from_text("kopi di indomaret 20rb", CATEGORIES))
+    assert data["amount"] == 20000 and data["category"] == "Makanan" and data["date"]
+
+    config = payloads[0]["generationConfig"]
+    assert config["responseMimeType"] == "application/json"
+    assert config["maxOutputTokens"] == extractor.EXTRACT_MAX_OUTPUT_TOKENS
+    schema = config["responseSchema"]
+    assert schema["properties"]["category"]["enum"] == CATEGORIES
+    assert schema["properties"]["date"]["nullable"] is True
+    assert "JSON" not in payloads[0]["contents"][0]["parts"][0]["text"]
+
+def test_truncated_output_falls_back_to_rule_parser(monkeypatch):
+    async def truncated(call, label=None):
+        response = gemini_response({"amount": 150000})
+        response["candidates"][0]["content"]["parts"][0]["text"] = '{"amount": 150000, "categ'
+        response["candidates"][0]["finishReason"] = "MAX_TOKENS"
+        return response
+
+    async def no_cache(*args):
+        return None
+
+    monkeypatch.setattr(structured_output, "call_with_key", truncated)
+    monkeypatch.setattr(extractor.text_cache, "get", no_cache)
+
+    data = asyncio.run(extractor.extract_expense_from_text("hadiah ultah 150rb", CATEGORIES))
+    assert data["amount"] == 150000 and data["category"] == "Lainnya"
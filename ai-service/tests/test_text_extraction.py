@@ -0,0 +1,194 @@
+from datetime import date
+from logic.text_normalize import normalize_text, has_absolute_date, resolve_relative_date
+
+def test_normalize_text_variants_share_a_key():
+    assert normalize_text("Beli Kopi  25rb") == "beli kopi 25rb"
+    assert normalize_text("beli kopi 25 ribu") == "beli kopi 25rb"
+    assert normalize_text("beli kopi Rp 25.000") == normalize_text("beli kopi rp25000")
+    assert normalize_text("bayar listrik 1,2 jt") == "bayar listrik 1.2jt"
+
+def test_relative_dates():
+    today = date(2024, 3, 20)
+    assert resolve_relative_date("makan kemarin 30rb", today) == date(2024, 3, 19)
+    assert resolve_relative_date("parkir 3 hari lalu 5rb", today) == date(2024, 3, 17)
+    assert resolve_relative_date("bensin 50rb", today) == today
+
+def test_absolute_date_detection():
+    assert has_absolute_date("bayar kos 5 maret 1jt")
+    assert has_absolute_date("belanja 2024-03-01 200rb")
+    assert not has_absolute_date("beli kopi kemarin 25rb")
+
+def test_text_cache_recomputes_relative_date(monkeypatch):
+    import asyncio
+    import logic.text_cache as tc
+
+    class BrokenRedis:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+        async def set(self, *args, **kwargs):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(tc, "get_redis", lambda: BrokenRedis())
+    categories = ["Makanan", "Lainnya"]
+    data = {"amount": 25000, "category": "Makanan", "description": "kopi", "date": "2020-01-01"}
+    asyncio.run(tc.set("kopi kemarin 25rb", categories, data))
+
+    cached = asyncio.run(tc.get("Kopi kemarin 25 ribu", list(reversed(categories))))
+    assert cached["amount"] == 25000
+    assert cached["date"] == resolve_relative_date("kemarin").strftime("%Y-%m-%d")
+
+CATEGORIES = ["Makanan", "Transportasi", "Belanja", "Tagihan", "Hiburan", "Kesehatan", "Pendidikan", "Lainnya"]
+
+def test_rule_parser_amount_shorthands():
+    from logic.rule_parser import parse_amounts
+    assert parse_amounts("makan siang 35rb") == [35000]
+    assert parse_amounts("bayar listrik 1,2jt") == [1200000]
+    assert parse_amounts("beli kopi Rp 25.000") == [25000]
+    assert parse_amounts("bensin 50k") == [50000]
+    assert parse_amounts("sewa 1.500.000 tgl 5 maret") == [1500000]
+    assert parse_amounts("beli 2 porsi bakso 30 ribu") == [30000]
+
+def test_rule_parser_confident_on_simple_messages():
+    from logic.rule_parser import parse_expense
+    today = date(2024, 3, 20)
+    data, confidence = parse_expense("Bayar listrik 1,2jt kemarin", CATEGORIES, today)
+    assert confidence >= 0.8
+    assert data == {"amount": 1200000, "category": "Tagihan", "description": "Bayar listrik", "date": "2024-03-19"}
+
+    # Kategori tidak jelas, beberapa nominal, atau pemasukan: serahkan ke LLM
+    assert parse_expense("kopi di indomaret 20rb", CATEGORIES, today)[1] < 0.8
+    assert parse_expense("makan 35rb parkir 5rb", CATEGORIES, today)[1] < 0.8
+    assert parse_expense("gaji 5jt", CATEGORIES, today)[1] < 0.8
+    assert parse_expense("berapa pengeluaran bulan ini?", CATEGORIES, today) == (None, 0.0)
+
+def test_rule_parser_strips_dotted_thousands_from_the_description():
+    from logic.rule_parser import parse_expense
+    today = date(2024, 3, 20)
+    # Grup depan 1-2 digit ("15.500", "1.000.000") tidak boleh tertinggal di deskripsi
+    for text, amount, description in [
+        ("grab 15.500", 15500, "Grab"),
+        ("bayar kos 1.000.000", 1000000, "Bayar kos"),
+        ("makan siang 25.000", 25000, "Makan siang"),
+    ]:
+        data, _ = parse_expense(text, CATEGORIES, today)
+        assert (data["amount"], data["description"]) == (amount, description)
+
+def test_rule_parser_skips_gemini_and_covers_failures(monkeypatch):
+    import asyncio
+    import logic.expense_extractor as extractor
+
+    calls = []
+
+    async def failing_gemini(parts, *args, **kwargs):
+        calls.append(parts)
+        raise Exception("All Gemini API keys failed")
+
+    async def no_cache(*args):
+        return None
+
+    monkeypatch.setattr(extractor, "generate_structured", failing_gemini)
+    monkeypatch.setattr(extractor.text_cache, "get", no_cache)
+
+    data = asyncio.run(extractor.extract_expense_from_text("makan siang 35rb", CATEGORIES))
+    assert data["category"] == "Makanan" and data["amount"] == 35000
+    assert calls == []
+
+    # Confidence rendah tetap ke Gemini; kalau gagal, hasil parser dipakai
+    data = asyncio.run(extractor.extract_expense_from_text("hadiah ultah 150rb", CATEGORIES))
+    assert len(calls) == 1
+    assert data["amount"] == 150000 and data["category"] == "Lainnya"
+
+def test_pack_batches_respects_token_budget():
+    from logic.expense_extractor import pack_batches
+    texts = ["x" * 400] * 5 + ["short"]
+    batches = pack_batches(texts, prompt_tokens=250, max_items=10)
+    assert batches == [[0, 1], [2, 3], [4, 5]]
+    assert pack_batches(["a"] * 5, prompt_tokens=10_000, max_items=2) == [[0, 1], [2, 3], [4]]
+
+def test_batch_extraction_keeps_input_order_and_item_errors(monkeypatch):
+    import asyncio
+    import json
+    import logic.expense_extractor as extractor
+    import logic.structured_output as structured_output
+
+    prompts = []
+
+    async def fake_gemini(call, label=None):
+        prompts.append(label)
+        # Item 2 hilang dari respons, id item 1 dikembalikan sebagai string
+        text = json.dumps([
+            {"id": "1", "amount": 150000, "category": "Hiburan", "description": "Tiket konser", "date": "2024-03-01"},
+            {"id": 3, "amount": "abc", "category": "Tidak Ada", "description": "", "date": None},
+        ])
+        return {"candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+    async def no_cache(*args):
+        return None
+
+    async def skip_set(*args):
+        return None
+
+    monkeypatch.setattr(structured_output, "call_with_key", fake_gemini)
+    monkeypatch.setattr(extractor.text_cache, "get", no_cache)
+    monkeypatch.setattr(extractor.text_cache, "set", skip_set)
+
+    texts = ["makan siang 35rb", "tiket konser band", "halo apa kabar semua", "sesuatu yang aneh"]
+    results = asyncio.run(extractor.extract_expenses_from_texts(texts, CATEGORIES))
+
+    assert len(prompts) == 1
+    assert results[0] == ("success", {"amount": 35000, "category": "Makanan", "description": "Makan siang", "date": results[0][1]["date"]})
+    assert results[1][1]["amount"] == 150000 and results[1][1]["category"] == "Hiburan"
+    assert results[2] == ("error", "Message missing from Gemini response")
+    status, data = results[3]
+    assert status == "success" and data["amount"] == 0 and data["category"] == "Lainnya"
+    assert data["description"] == "sesuatu yang aneh"
+
+def test_categorizer_fills_missing_category_without_gemini(monkeypatch):
+    import asyncio
+    import logic.expense_extractor as extractor
+
+    async def unexpected_gemini(*args, **kwargs):
+        raise AssertionError("Gemini should not be called")
+
+    async def fake_categorize(description, categories, user_id=None):
+        return {"category": "Hiburan", "confidence": 0.9, "source": "seed"}
+
+    monkeypatch.setattr(extractor, "generate_structured", unexpected_gemini)
+    monkeypatch.setattr(extractor, "categorize", fake_categorize)
+
+    data = asyncio.run(extractor.extract_expense_from_text("tiket ultraman fest 150rb", CATEGORIES))
+    assert data["amount"] == 150000 and data["category"] == "Hiburan"
+
+def test_income_messages_skip_the_categorizer(monkeypatch):
+    import asyncio
+    import logic.expense_extractor as extractor
+    from models.extraction import Expense
+
+    categorized, gemini_calls = [], []
+
+    async def fake_categorize(description, categories, user_id=None):
+        categorized.append((description, user_id))
+        return {"category": "Belanja", "confidence": 0.9, "source": "history"}
+
+    async def fake_gemini(parts, *args, **kwargs):
+        gemini_calls.append(parts)
+        return Expense(amount=5000000, category="Lainnya", description="Gaji bulan ini", date="2024-03-25")
+
+    async def no_cache(*args):
+        return None
+
+    monkeypatch.setattr(extractor, "categorize", fake_categorize)
+    monkeypatch.setattr(extractor, "generate_structured", fake_gemini)
+    monkeypatch.setattr(extractor.text_cache, "get", no_cache)
+    monkeypatch.setattr(extractor.text_cache, "set", no_cache)
+
+    # Pemasukan (rule parser membatasi confidence-nya) harus sampai ke Gemini
+    data = asyncio.run(extractor.extract_expense_from_text("gaji 5jt", CATEGORIES, user_id="user-1"))
+    assert len(gemini_calls) == 1 and categorized == []
+    assert data["category"] == "Lainnya"
+
+    # Pengeluaran tunggal tanpa kategori: categorizer dengan riwayat user
+    data = asyncio.run(extractor.extract_expense_from_text("tiket ultraman fest 150rb", CATEGORIES, user_id="user-1"))
+    assert categorized == [("Tiket ultraman fest", "user-1")]
+    assert data["category"] == "Belanja" and len(gemini_calls) == 1
@@ -0,0 +1,74 @@
+import asyncio
+import time
+import numpy as np
+from logic.vector_index import VectorIndex, VectorIndexRegistry
+
+def test_vector_index_top_k_and_appends():
+    index = VectorIndex(capacity=2)
+    index.add(["a", "b"], [[1, 0, 0], [0, 1, 0]], [{"category": "Makanan"}, {"category": "Transportasi"}])
+    # Melebihi kapasitas awal -> matrix diperbesar
+    index.add(["c", "a"], [[1, 1, 0], [0, 0, 2]], [{"category": "Belanja"}, {"category": "Tagihan"}])
+    assert len(index) == 3
+
+    results = index.search_many([[0, 1, 0], [0, 0, 1]], k=2)
+    assert [item_id for item_id, _, _ in results[0]] == ["b", "c"]
+    assert results[1][0][0] == "a" and results[1][0][2] == {"category": "Tagihan"}
+    assert abs(results[1][0][1] - 1.0) < 1e-6
+
+def test_vector_index_query_is_fast():
+    rng = np.random.default_rng(0)
+    index = VectorIndex()
+    index.add([str(i) for i in range(2000)], rng.standard_normal((2000, 768)))
+    query = rng.standard_normal(768)
+    index.search(query, k=5)
+    start = time.perf_counter()
+    for _ in range(50):
+        index.search(query, k=5)
+    assert (time.perf_counter() - start) / 50 < 0.005
+
+def test_registry_loads_once_and_evicts_lru():
+    loads = []
+
+    def loader(user_id):
+        loads.append(user_id)
+        return ["t1"], [[1.0, 0.0]], [{"description": f"kopi {user_id}"}]
+
+    registry = VectorIndexRegistry(max_users=1, ttl=None, loader=loader)
+
+    async def scenario():
+        await asyncio.gather(registry.get("u1"), registry.get("u1"))
+        assert await registry.append("u1", ["t2"], [[0.0, 1.0]]) == 2
+        match = await registry.search("u1", [0.1, 1.0], k=1)
+        assert match[0][0] == "t2"
+        await registry.get("u2")
+        await registry.get("u1")
+
+    asyncio.run(scenario())
+    assert loads == ["u1", "u2", "u1"]
+
+def test_categorizer_votes_history_then_seeds(monkeypatch):
+    import logic.categorizer as categorizer
+
+    # Embedding palsu: satu dimensi per "topik" kata kunci
+    topics = ["kopi", "bensin", "listrik"]
+
+    async def fake_embeddings(texts):
+        return [[1.0 if topic in text else 0.0 for topic in topics] + [0.01] for text in texts]
+
+    history = VectorIndexRegistry(loader=lambda user_id: (
+        ["t1", "t2", "t3"],
+        [[1, 0, 0, 0], [0.9, 0.1, 0, 0], [0, 1, 0, 0]],
+        [{"category": "Jajan"}, {"category": "Jajan"}, {"category": "Transportasi"}]
+    ))
+    monkeypatch.setattr(categorizer, "generate_embeddings", fake_embeddings)
+    monkeypatch.setattr(categorizer, "registry", history)
+    monkeypatch.setattr(categorizer, "seed_index", categorizer.SeedIndex())
+    monkeypatch.setattr(categorizer, "SEED_PHRASES", {"Makanan": ["beli kopi"], "Tagihan": ["bayar listrik"]})
+
+    categories = ["Jajan", "Makanan", "Transportasi", "Tagihan", "Lainnya"]
+    results = asyncio.run(categorizer.categorize_many(
+        ["kopi susu", "token listrik", "hadiah ultah"], categories, user_id="u1", k=2
+    ))
+    assert results[0]["category"] == "Jajan" and results[0]["source"] == "history"
+    assert results[1] == {"category": "Tagihan", "confidence": 1.0, "source": "seed"}
+    assert results[2]["category"] is None
@@ -1,7 +1,63 @@
+import time
 from sqlalchemy import text
-from database.database import engine
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeout
+from database.database import engine, async_engine
+from config.config import DB_STATEMENT_TIMEOUT_MS
+from utils import metrics
 
-def execute_query(sql: str):
+QUERY_CANCELED = "57014"  # SQLSTATE query_canceled (statement_timeout)
+
+class QueryTimeout(Exception):
+    """The query ran longer than its statement_timeout and was cancelled by Postgres."""
+
+def execute_query(sql: str, params: dict = None):
     with engine.connect() as conn:
-        result = conn.execute(text(sql))
+        result = conn.execute(text(sql), params or {})
         return [dict(row._mapping) for row in result]  # gunakan ._mapping agar compatible dengan SQLAlchemy 2.0
+
+async def execute_read_query(sql: str, params: dict = None, timeout_ms: int = DB_STATEMENT_TIMEOUT_MS):
+    """
+    Run one SELECT on the async pool inside a read-only transaction with
+    a transaction-local statement_timeout. Raises QueryTimeout when Postgres
+    cancels it. Pool wait and query time go to utils.metrics (db.*).
+    """
+    start = time.perf_counter()
+    try:
+        conn = await async_engine.connect()
+    except PoolTimeout:
+        # Semua koneksi terpakai lebih lama dari DB_POOL_TIMEOUT
+        metrics.increment("db.pool_timeouts")
+        raise
+    async with conn:
+        acquired = time.perf_counter()
+        metrics.observe("db.pool_wait_ms", (acquired - start) * 1000)
+        try:
+            # READ ONLY dipasang saat BEGIN (tanpa round trip tambahan)
+            readonly = await conn.execution_options(postgresql_readonly=True)
+            async with readonly.begin():
+                # is_local=true: timeout hanya berlaku di transaksi ini, aman untuk pgbouncer
+                await readonly.execute(
+                    text("SELECT set_config('statement_timeout', :timeout, true)"),
+                    {"timeout": str(int(timeout_ms))}
+                )
+                result = await readonly.execute(text(sql), params or {})
+                rows = [dict(row._mapping) for row in result]
+        except DBAPIError as e:
+            if getattr(e.orig, "sqlstate", None) == QUERY_CANCELED:
+                metrics.increment("db.statement_timeouts")
+                raise QueryTimeout(f"Query exceeded {timeout_ms} ms") from e
+            metrics.increment("db.query_errors")
+            raise
+        finally:
+            metrics.observe("db.query_ms", (time.perf_counter() - acquired) * 1000)
+    return rows
+
+def pool_status() -> dict:
+    """Live connection counts of the async pool."""
+    pool = async_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow()
+    }
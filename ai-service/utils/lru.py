@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+from utils import metrics
+
+class LRUCache:
+    """
+    Small thread-safe in-process LRU with optional per-entry TTL.
+    Hit/miss/eviction counts go to utils.metrics under `<name>.*`.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                metrics.increment(f"{self.name}.memory_misses")
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                metrics.increment(f"{self.name}.memory_misses")
+                return default
+            self._data.move_to_end(key)
+            metrics.increment(f"{self.name}.memory_hits")
+            return value
+
+    def set(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                metrics.increment(f"{self.name}.evictions")
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def items(self) -> list:
+        """Snapshot of (key, value) pairs, most recently used last."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value) for key, (value, expires_at) in self._data.items()
+                if expires_at is None or expires_at >= now
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
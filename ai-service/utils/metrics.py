@@ -0,0 +1,31 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Any
+
+# Metrik sederhana in-process (counter + ringkasan durasi/ukuran),
+# dibaca lewat endpoint /api/metrics
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_summaries: Dict[str, Dict[str, float]] = {}
+
+def increment(name: str, value: float = 1) -> None:
+    """Add `value` to a counter."""
+    with _lock:
+        _counters[name] += value
+
+def observe(name: str, value: float) -> None:
+    """Record one observation (e.g. latency in ms) into a count/sum/max summary."""
+    with _lock:
+        summary = _summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+
+def snapshot() -> Dict[str, Any]:
+    """Return a copy of all counters and summaries."""
+    with _lock:
+        summaries = {
+            name: {**summary, "avg": summary["sum"] / summary["count"] if summary["count"] else 0.0}
+            for name, summary in _summaries.items()
+        }
+        return {"counters": dict(_counters), "summaries": summaries}
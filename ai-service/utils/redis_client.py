@@ -0,0 +1,65 @@
+import redis
+import redis.asyncio as aioredis
+from config.config import REDIS_HOST, REDIS_PORT, REDIS_MAX_CONNECTIONS
+
+_client = None
+_binary_client = None
+_sync_client = None
+
+def _create_client(decode_responses: bool) -> aioredis.Redis:
+    pool = aioredis.ConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        decode_responses=decode_responses
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+async def startup() -> None:
+    """Create the shared pools (dipanggil di app lifespan)."""
+    get_redis()
+    get_binary_redis()
+
+def get_redis() -> aioredis.Redis:
+    """Shared async Redis client (string responses)."""
+    global _client
+    if _client is None:
+        # Di luar lifespan (script, test): dibuat saat pertama dipakai
+        _client = _create_client(decode_responses=True)
+    return _client
+
+def get_binary_redis() -> aioredis.Redis:
+    """Shared async Redis client returning raw bytes (packed vectors)."""
+    global _binary_client
+    if _binary_client is None:
+        _binary_client = _create_client(decode_responses=False)
+    return _binary_client
+
+def get_sync_redis() -> redis.Redis:
+    """
+    Shared blocking Redis client (string responses), only for sync code paths
+    such as LangChain's sync memory API; request handlers use `get_redis`.
+    """
+    global _sync_client
+    if _sync_client is None:
+        pool = redis.ConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            decode_responses=True
+        )
+        _sync_client = redis.Redis(connection_pool=pool)
+    return _sync_client
+
+async def close_redis() -> None:
+    global _client, _binary_client, _sync_client
+    if _client is not None:
+        await _client.aclose(close_connection_pool=True)
+        _client = None
+    if _binary_client is not None:
+        await _binary_client.aclose(close_connection_pool=True)
+        _binary_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client.connection_pool.disconnect()
+        _sync_client = None
@@ -0,0 +1,3 @@
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (~4 characters per token), good enough for budgeting prompts."""
+    return len(text) // 4 + 1
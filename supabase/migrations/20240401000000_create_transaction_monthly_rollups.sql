@@ -0,0 +1,118 @@
+-- Per-user monthly rollups of transactions for consultation queries
+-- (total per user, month, category and type), kept up to date by a trigger
+CREATE TABLE IF NOT EXISTS transaction_monthly_rollups (
+    user_id UUID NOT NULL,
+    month DATE NOT NULL,  -- selalu tanggal 1
+    category TEXT NOT NULL,
+    type TEXT NOT NULL,
+    total_amount NUMERIC NOT NULL DEFAULT 0,
+    tx_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, month, type, category)
+);
+
+-- Add RLS (Row Level Security) policies
+ALTER TABLE transaction_monthly_rollups ENABLE ROW LEVEL SECURITY;
+
+-- Create policy to allow service role to do everything
+CREATE POLICY "Service role can do everything" ON transaction_monthly_rollups
+    FOR ALL
+    TO service_role
+    USING (true)
+    WITH CHECK (true);
+
+-- Apply one transaction row to the rollups with the given sign (+1 insert, -1 delete)
+CREATE OR REPLACE FUNCTION apply_transaction_rollup(
+    p_user_id UUID,
+    p_date DATE,
+    p_category TEXT,
+    p_type TEXT,
+    p_amount NUMERIC,
+    p_sign INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO transaction_monthly_rollups AS r (user_id, month, category, type, total_amount, tx_count)
+    VALUES (
+        p_user_id,
+        date_trunc('month', p_date)::date,
+        COALESCE(p_category, 'Lainnya'),
+        COALESCE(p_type, 'expense'),
+        p_sign * COALESCE(p_amount, 0),
+        p_sign
+    )
+    ON CONFLICT (user_id, month, type, category) DO UPDATE
+    SET total_amount = r.total_amount + EXCLUDED.total_amount,
+        tx_count = r.tx_count + EXCLUDED.tx_count,
+        updated_at = CURRENT_TIMESTAMP;
+
+    -- Bulan/kategori yang sudah kosong tidak perlu disimpan
+    DELETE FROM transaction_monthly_rollups
+    WHERE user_id = p_user_id
+      AND month = date_trunc('month', p_date)::date
+      AND category = COALESCE(p_category, 'Lainnya')
+      AND type = COALESCE(p_type, 'expense')
+      AND tx_count <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_transaction_monthly_rollups()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_transaction_rollup(
+            OLD.user_id, COALESCE(OLD.transaction_date, OLD.created_at::date),
+            OLD.category, OLD.type, OLD.amount, -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_transaction_rollup(
+            NEW.user_id, COALESCE(NEW.transaction_date, NEW.created_at::date),
+            NEW.category, NEW.type, NEW.amount, 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER
+SET search_path = public, pg_temp;
+
+-- Hanya kolom yang memengaruhi rollup (update embedding tidak memicu trigger)
+CREATE TRIGGER transactions_monthly_rollups
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, transaction_date, category, type, amount ON transactions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_transaction_monthly_rollups();
+
+-- Backfill / rebuild from the raw table (all users, or one user):
+--   SELECT rebuild_transaction_monthly_rollups();
+--   SELECT rebuild_transaction_monthly_rollups('<user uuid>');
+-- Writes are blocked (SHARE lock) until the caller's transaction commits,
+-- so no row is counted twice or missed while the rollups are recomputed.
+CREATE OR REPLACE FUNCTION rebuild_transaction_monthly_rollups(p_user_id UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+    rebuilt BIGINT;
+BEGIN
+    LOCK TABLE transactions IN SHARE MODE;
+
+    DELETE FROM transaction_monthly_rollups
+    WHERE p_user_id IS NULL OR user_id = p_user_id;
+
+    INSERT INTO transaction_monthly_rollups (user_id, month, category, type, total_amount, tx_count)
+    SELECT
+        user_id,
+        date_trunc('month', COALESCE(transaction_date, created_at::date))::date,
+        COALESCE(category, 'Lainnya'),
+        COALESCE(type, 'expense'),
+        SUM(COALESCE(amount, 0)),
+        COUNT(*)
+    FROM transactions
+    WHERE p_user_id IS NULL OR user_id = p_user_id
+    GROUP BY 1, 2, 3, 4;
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER
+SET search_path = public, pg_temp;
+
+SELECT rebuild_transaction_monthly_rollups();
@@ -105,7 +105,7 @@ async function processTransaction(data, user) {
     });
     
     logger.info({ event: 'ai_service_request', text, from });
-    const result = await apiClient.processTextWithCategories(text, from, categories);
+    const result = await apiClient.processTextWithCategories(text, from, categories, user.id);
     logger.info({ event: 'ai_service_response', raw_response: result, text_input: text, from });
 
     if (result?.message?.includes('tidak terdeteksi')) {
@@ -258,6 +258,7 @@ async function handleDeleteTransaction(user, from) {
       ...parsed.result
     });
 
+    await redisClient.bumpDataVersion(user.id);
     await redisClient.deleteLastTransaction(user.phone_number);
     await redisClient.publish('whatsapp-response', JSON.stringify({
       to: from,
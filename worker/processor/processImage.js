@@ -4,8 +4,54 @@ import apiClient from '../utils/apiClient.js';
 import { saveTransactionToDB, updateEmbedding } from '../utils/db.js';
 import { appendTransactionToSheet } from '../utils/sheets.js';
 
-// Add delay function
-const delay = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+function embeddingContext(transaction) {
+  return `Deskripsi: ${transaction.description}\nKategori: ${transaction.category}\nNominal: ${transaction.amount}\nTipe: ${transaction.type}\nMerchant: ${transaction.merchant || 'Tidak ada'}\nTanggal: ${transaction.date}`;
+}
+
+// Satu request /api/generate_embeddings untuk semua item struk; item yang gagal masuk retry queue
+async function embedTransactions(saved) {
+  if (saved.length === 0) return;
+
+  let results;
+  try {
+    results = await apiClient.generateEmbeddings(saved.map((item) => item.context));
+  } catch (err) {
+    results = saved.map((_, index) => ({ index, status: 'error', error: err.message }));
+  }
+
+  for (const result of results) {
+    const { id, context } = saved[result.index];
+    try {
+      if (result.status !== 'success') {
+        throw new Error(result.error);
+      }
+      await updateEmbedding(id, result.embedding);
+    } catch (embeddingError) {
+      logger.error({
+        event: "embedding_failed",
+        id,
+        error: embeddingError.message
+      });
+
+      // Add to retry queue without crashing
+      try {
+        await redisClient.publisher.rPush('embedding:retry_queue', JSON.stringify({
+          id,
+          context,
+          retryCount: 0,
+          lastError: embeddingError.message
+        }));
+      } catch (redisError) {
+        logger.error({
+          event: "redis_retry_queue_failed",
+          id,
+          error: redisError.message
+        });
+        // Continue processing even if redis fails
+      }
+    }
+  }
+}
 
 function formatCurrency(amount) {
   const numAmount = Number(amount);
@@ -112,6 +158,7 @@ export default async function processImage(data) {
       validated: validatedTransactions
     });
 
+    const saved = [];
     for (const transaction of validatedTransactions) {
       await redisClient.setLastTransaction(phoneNumber, {
         type: 'image',
@@ -168,41 +215,8 @@ export default async function processImage(data) {
           });
         }
 
-        // Generate embedding
-        try {
-          // Add delay before generating embedding
-          await delay(1000); // 1 second delay
-          
-          const embeddingContext = `Deskripsi: ${transaction.description}\nKategori: ${transaction.category}\nNominal: ${transaction.amount}\nTipe: ${transaction.type}\nMerchant: ${transaction.merchant || 'Tidak ada'}\nTanggal: ${transaction.date}`;
-          const embedding = await apiClient.generateEmbedding(embeddingContext);
-          console.log('embedding', embedding);
-          if (embedding) {
-            await updateEmbedding(savedTransaction.id, embedding);
-          }
-        } catch (embeddingError) {
-          logger.error({
-            event: "embedding_failed",
-            id: savedTransaction.id,
-            error: embeddingError.message
-          });
-          
-          // Add to retry queue without crashing
-          try {
-            await redisClient.lPush('embedding:retry_queue', JSON.stringify({
-              id: savedTransaction.id,
-              context: `Deskripsi: ${transaction.description}\nKategori: ${transaction.category}\nNominal: ${transaction.amount}\nTipe: ${transaction.type}\nMerchant: ${transaction.merchant || 'Tidak ada'}\nTanggal: ${transaction.date}`,
-              retryCount: 0,
-              lastError: embeddingError.message
-            }));
-          } catch (redisError) {
-            logger.error({
-              event: "redis_retry_queue_failed",
-              id: savedTransaction.id,
-              error: redisError.message
-            });
-            // Continue processing even if redis fails
-          }
-        }
+        // Embedding dibuat sekaligus untuk semua item struk setelah loop
+        saved.push({ id: savedTransaction.id, context: embeddingContext(transaction) });
       } catch (dbError) {
         logger.error({
           event: 'db_save_error',
@@ -221,6 +235,8 @@ export default async function processImage(data) {
       }
     }
 
+    await embedTransactions(saved);
+
     const responseMessage = `✅ Transaksi dicatat!\n\n${validatedTransactions.map(formatTransactionMessage).join('\n\n')}`;
 
     logger.info({
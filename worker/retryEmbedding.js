@@ -3,26 +3,71 @@ import apiClient from './utils/apiClient.js';
 import { updateEmbedding } from './utils/db.js';
 import { logger } from './utils/logger.js';
 
+// Satu request /api/generate_embeddings per batch (maks EMBEDDING_BATCH_MAX_ITEMS di ai-service)
+const BATCH_SIZE = Number(process.env.EMBEDDING_RETRY_BATCH_SIZE || 100);
+
+// Producer lama/baru memakai nama field berbeda: { transactionId | id, description | context }
+function parseRetryItem(item) {
+  const parsed = JSON.parse(item);
+  return {
+    transactionId: parsed.transactionId ?? parsed.id,
+    description: parsed.description ?? parsed.context
+  };
+}
+
 async function processRetryQueue() {
-  while (true) {
-    const item = await redisClient.lPop('embedding:retry_queue');
-    if (!item) break;
+  await redisClient.ensureConnection();
+  const redis = redisClient.publisher;
 
-    const { transactionId, description } = JSON.parse(item);
+  // Hanya item yang ada saat mulai: yang gagal dikembalikan ke queue untuk sweep berikutnya
+  let remaining = await redis.lLen('embedding:retry_queue');
+
+  while (remaining > 0) {
+    const batch = [];
+    while (batch.length < BATCH_SIZE && remaining > 0) {
+      const item = await redis.lPop('embedding:retry_queue');
+      remaining -= 1;
+      if (!item) {
+        remaining = 0;
+        break;
+      }
+      batch.push(item);
+    }
+    if (batch.length === 0) break;
 
+    const entries = batch.map(parseRetryItem);
+    let results;
     try {
-      const embedding = await apiClient.generateEmbedding(description);
-      await updateEmbedding(transactionId, embedding);
-      logger.info({ event: 'embedding_retry_success', transactionId });
+      results = await apiClient.generateEmbeddings(entries.map((entry) => entry.description));
     } catch (err) {
       logger.error({
-        event: 'embedding_retry_failed',
-        transactionId,
+        event: 'embedding_retry_batch_failed',
+        count: batch.length,
         error: err.message
       });
-
       // Kembalikan ke queue untuk retry berikutnya
-      await redisClient.rPush('embedding:retry_queue', item);
+      await redis.rPush('embedding:retry_queue', batch);
+      break;
+    }
+
+    for (const result of results) {
+      const { transactionId } = entries[result.index];
+      try {
+        if (result.status !== 'success') {
+          throw new Error(result.error);
+        }
+        await updateEmbedding(transactionId, result.embedding);
+        logger.info({ event: 'embedding_retry_success', transactionId });
+      } catch (err) {
+        logger.error({
+          event: 'embedding_retry_failed',
+          transactionId,
+          error: err.message
+        });
+
+        // Kembalikan ke queue untuk retry berikutnya
+        await redis.rPush('embedding:retry_queue', batch[result.index]);
+      }
     }
   }
 }
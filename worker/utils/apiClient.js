@@ -344,7 +344,46 @@ class ApiClient {
     });
   }
 
-  async processTextWithCategories(text, from, categories = null) {
+  async generateEmbeddings(descriptions) {
+    return this.retry(async () => {
+      const url = `${this.baseUrl}/api/generate_embeddings`;
+      logger.info({
+        event: 'api_request',
+        method: 'POST',
+        url,
+        endpoint: '/api/generate_embeddings',
+        count: descriptions.length
+      });
+
+      const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ texts: descriptions })
+      });
+
+      if (!response.ok) {
+        const errorText = await response.text();
+        logger.error({
+          event: 'embedding_batch_request_failed',
+          status: response.status,
+          error: errorText
+        });
+        throw new Error(`HTTP ${response.status}: ${errorText}`);
+      }
+
+      // Satu entri per deskripsi (urutan sama): { index, status, embedding | error }
+      const result = await response.json();
+      logger.info({
+        event: 'embeddings_generated',
+        count: result.results.length,
+        failed: result.results.filter((item) => item.status === 'error').length
+      });
+
+      return result.results;
+    });
+  }
+
+  async processTextWithCategories(text, from, categories = null, userId = null) {
     return this.retry(async () => {
       try {
         const url = `${this.baseUrl}/api/process-text`;
@@ -363,7 +402,8 @@ class ApiClient {
           body: JSON.stringify({
             text,
             categories,
-            phone_number: from
+            phone_number: from,
+            user_id: userId // riwayat transaksi user untuk categorizer
           })
         });
 
@@ -1,6 +1,7 @@
 import { createClient } from '@supabase/supabase-js';
 import dotenv from 'dotenv';
 import { logger } from './logger.js';
+import redisClient from './redis.js';
 import db from './db.js'; // jika file koneksi ada di lokasi yang sama
 
 dotenv.config();
@@ -235,6 +236,9 @@ export async function saveTransactionToDB({ user_id, account_id, source, data })
     inserted
   });
 
+  // Cache jawaban konsultasi user ini tidak berlaku lagi
+  await redisClient.bumpDataVersion(user_id);
+
   return inserted[0];
 }
 
@@ -412,6 +412,46 @@ class RedisClient {
     }
   }
 
+  /**
+   * Naikkan versi data user (datav:{id}) setiap ada transaksi baru/dihapus,
+   * sehingga cache jawaban konsultasi di ai-service untuk user itu tidak terpakai lagi.
+   * @param {...string} userKeys - user id (UUID) dan/atau nomor telepon
+   */
+  async bumpDataVersion(...userKeys) {
+    const keys = userKeys.filter(Boolean).map((userKey) => `datav:${userKey}`);
+    if (keys.length === 0) return;
+
+    try {
+      if (!await this.ensureConnection()) {
+        throw new Error('Redis not connected');
+      }
+
+      const timeout = new Promise((_, reject) =>
+        setTimeout(() => reject(new Error('Redis operation timeout')), 5000)
+      );
+
+      await Promise.race([
+        this.circuitBreaker.execute(async () => {
+          const multi = this.publisher.multi();
+          for (const key of keys) {
+            multi.incr(key);
+            multi.expire(key, 60 * 60 * 24 * 90); // TTL 90 hari
+            multi.del(key.replace(/^datav:/, 'answers:'));
+          }
+          return multi.exec();
+        }),
+        timeout
+      ]);
+
+      logger.debug(`Bumped data version for ${keys.join(', ')}`);
+    } catch (err) {
+      // Cache jawaban tetap kedaluwarsa sendiri (ANSWER_CACHE_TTL)
+      logger.warn(`Failed to bump data version for ${keys.join(', ')}:`, {
+        message: err.message
+      });
+    }
+  }
+
   getStatus() {
     return {
       isConnected: this.isConnected,